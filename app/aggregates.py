@@ -0,0 +1,189 @@
+"""
+Single-Statement Budget Aggregates
+
+Query layer shared by the amount-question helpers in app.qa and app.rag.
+Each helper gets everything it needs in one statement, and so one round
+trip:
+
+  - totals_with_evidence: SUM/COUNT over the filtered rows via window
+    aggregates, plus the top-N rows by amount joined to documents
+  - year_pair_totals: current and previous year totals for a department
+    via SUM(...) FILTER (WHERE ...)
+
+Both run as prepared statements (app/statements.py); totals_with_evidence
+has one registered statement per combination of filters.
+
+Usage:
+    from app.aggregates import totals_with_evidence, year_pair_totals
+"""
+
+from itertools import combinations
+from typing import Any, Dict, List, Optional, Tuple
+
+from .db import read_connection
+from .statements import statements
+
+# Kept as constants so benchmarks/check_query_plans.py can EXPLAIN the exact
+# statements; the indexes serving them are in db/migrations/004_*.sql
+TOTALS_WITH_EVIDENCE_SQL = """
+SELECT
+    top.id,
+    top.fiscal_year,
+    top.department,
+    top.line_item,
+    top.amount,
+    top.total,
+    top.count,
+    d.file_name
+FROM (
+    SELECT
+        bf.id,
+        bf.fiscal_year,
+        bf.department,
+        bf.line_item,
+        bf.amount,
+        bf.document_id,
+        SUM(bf.amount) OVER () AS total,
+        COUNT(*) OVER () AS count
+    FROM budget_facts bf
+    {where_clause}
+    ORDER BY bf.amount DESC
+    LIMIT :top_n
+) top
+LEFT JOIN documents d ON top.document_id = d.id
+ORDER BY top.amount DESC
+"""
+
+YEAR_PAIR_TOTALS_SQL = """
+SELECT
+    SUM(amount) FILTER (WHERE fiscal_year = :fiscal_year) AS current_total,
+    SUM(amount) FILTER (WHERE fiscal_year = :previous_year) AS previous_total
+FROM budget_facts
+WHERE department = :department
+  AND fiscal_year IN (:fiscal_year, :previous_year)
+"""
+
+statements.register("year_pair_totals", YEAR_PAIR_TOTALS_SQL,
+                    types={"department": "text", "fiscal_year": "int", "previous_year": "int"})
+
+# Filter -> (condition, parameter type), in the order conditions are joined
+FILTER_CONDITIONS = {
+    "fiscal_year": ("bf.fiscal_year = :fiscal_year", "int"),
+    "department": ("UPPER(bf.department) = UPPER(:department)", "text"),
+    "line_item": ("LOWER(bf.line_item) LIKE :line_item", "text"),
+}
+
+
+def _where_clause(names) -> str:
+    conditions = [condition for name, (condition, _) in FILTER_CONDITIONS.items() if name in names]
+    return ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+
+def _totals_statement_name(names) -> str:
+    return "totals_with_evidence_" + ("_".join(sorted(names)) or "all")
+
+
+# One statement per combination of filters, registered up front
+for _count in range(len(FILTER_CONDITIONS) + 1):
+    for _names in combinations(FILTER_CONDITIONS, _count):
+        statements.register(
+            _totals_statement_name(_names),
+            TOTALS_WITH_EVIDENCE_SQL.format(where_clause=_where_clause(_names)),
+            types={**{name: FILTER_CONDITIONS[name][1] for name in _names}, "top_n": "int"},
+        )
+
+
+def filter_clause(filters: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    WHERE clause and bind parameters for parsed question filters.
+
+    Args:
+        filters: fiscal_year / department / line_item, any of them None
+
+    Returns:
+        ("WHERE ..." or "", params)
+    """
+    params: Dict[str, Any] = {}
+
+    if filters.get("fiscal_year"):
+        params["fiscal_year"] = filters["fiscal_year"]
+
+    if filters.get("department"):
+        params["department"] = filters["department"]
+
+    if filters.get("line_item"):
+        params["line_item"] = f"%{filters['line_item'].lower()}%"
+
+    return _where_clause(params), params
+
+
+def totals_statement(filters: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    The registered TOTALS_WITH_EVIDENCE_SQL statement for these filters.
+
+    The WHERE clause depends only on which filters are set, so there is one
+    statement per combination (totals_with_evidence_department_fiscal_year, ...).
+
+    Returns:
+        (statement name, params without top_n)
+    """
+    _, params = filter_clause(filters)
+    return _totals_statement_name(params), params
+
+
+def totals_with_evidence(filters: Dict[str, Any], top_n: int = 5) -> Optional[Dict[str, Any]]:
+    """
+    Total, row count and the largest matching line items in one query.
+
+    The window aggregates are computed over every matching row before the
+    LIMIT applies, and documents is only joined for the top_n rows kept.
+
+    Args:
+        filters: fiscal_year / department / line_item filters
+        top_n: Number of evidence rows to return
+
+    Returns:
+        {"total", "count", "evidence"}, or None if nothing matches
+    """
+    name, params = totals_statement(filters)
+    params["top_n"] = top_n
+
+    with read_connection() as conn:
+        rows = statements.execute(conn, name, params).mappings().all()
+
+    if not rows or rows[0]["total"] is None:
+        return None
+
+    evidence: List[Dict[str, Any]] = [
+        {
+            "id": row["id"],
+            "fiscal_year": row["fiscal_year"],
+            "department": row["department"],
+            "line_item": row["line_item"],
+            "amount": float(row["amount"]),
+            "file_name": row["file_name"],
+        }
+        for row in rows
+    ]
+    return {"total": float(rows[0]["total"]), "count": rows[0]["count"], "evidence": evidence}
+
+
+def year_pair_totals(department: str, fiscal_year: int) -> Tuple[Optional[float], Optional[float]]:
+    """
+    A department's total for fiscal_year and the year before, in one query.
+
+    Returns:
+        (current_total, previous_total); either is None if that year has no rows
+    """
+    with read_connection() as conn:
+        row = statements.execute(conn, "year_pair_totals", {
+            "department": department,
+            "fiscal_year": fiscal_year,
+            "previous_year": fiscal_year - 1,
+        }).mappings().first()
+
+    current_total, previous_total = row["current_total"], row["previous_total"]
+    return (
+        float(current_total) if current_total is not None else None,
+        float(previous_total) if previous_total is not None else None,
+    )
@@ -0,0 +1,195 @@
+"""
+Answer Cache for /ask and /insights
+
+Most dashboard traffic is the same few questions phrased slightly
+differently. Finished responses are cached so a repeat skips the SQL and
+the LLM call entirely.
+
+Two tiers:
+  - exact: keyed by the normalised structured intent from the question
+    parser (question class, matched keywords, fiscal year, every department
+    and line item named, in question order, percentage and the numbers in
+    the question), so "Police budget FY25?" and "whats the police
+    department budget in fy25" share an entry while "Taxes and Police" and
+    "Police" do not.
+    Questions with no recognisable intent fall back to their normalised
+    text.
+  - semantic (optional, ANSWER_CACHE_SEMANTIC=1): on an exact miss the
+    question is embedded and compared with cached questions that have the
+    same entities (year, departments, line items, numbers); a cosine
+    similarity of at least ANSWER_CACHE_SIMILARITY counts as a hit. The
+    question embedding goes through the embedding cache, so the retrieval
+    path reuses it on a miss.
+
+Entries expire after ANSWER_CACHE_TTL seconds and the whole cache is
+dropped when the data version changes (see app/db.current_data_version).
+
+Usage:
+    from app.answer_cache import answer_cache
+    response = answer_cache.get(version, "ask", question)
+    answer_cache.put(version, "ask", question, response)
+"""
+
+import copy
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .log import get_logger
+from .question_parser import normalize_year, parse_question
+from .vocabulary import normalize_name
+
+logger = get_logger(__name__)
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SEMANTIC = os.getenv("ANSWER_CACHE_SEMANTIC", "0") == "1"
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))
+
+_NUMBER_RE = re.compile(r"(fy\s*)?(\d+(?:\.\d+)?)")
+
+
+def _numbers(text: str) -> Tuple[str, ...]:
+    """Numbers in the question, with "fy25" and "2025" normalised alike."""
+    found = set()
+    for prefix, digits in _NUMBER_RE.findall(text):
+        if prefix and len(digits) == 2:
+            digits = str(normalize_year(int(digits)))
+        found.add(digits)
+    return tuple(sorted(found))
+
+
+def intent_key(kind: str, question: str) -> Tuple[tuple, tuple]:
+    """
+    Cache keys for a question.
+
+    Args:
+        kind: Endpoint namespace ("ask" or "insights")
+        question: The user's question
+
+    Returns:
+        (key, entities): the exact-tier key, and the entity part of it that
+        semantic matches must agree on
+    """
+    parsed = parse_question(question)
+    entities = (
+        parsed.fiscal_year, tuple(parsed.fy_labels), parsed.percent,
+        parsed.departments, parsed.line_items, _numbers(parsed.text),
+    )
+    if parsed.question_class == "general" and not (parsed.departments or parsed.line_items or parsed.fiscal_year):
+        # Nothing structured to go on; only identical wording may share an answer
+        return (kind, "text", normalize_name(question)), (kind,) + entities
+    return (kind, "intent", parsed.question_class, tuple(sorted(parsed.keywords)), entities), (kind,) + entities
+
+
+class AnswerEntry:
+    """A cached response plus what the semantic tier needs to match it."""
+
+    __slots__ = ("response", "expires_at", "entities", "vector")
+
+    def __init__(self, response: Dict, entities: tuple, vector: Optional[np.ndarray]):
+        self.response = response
+        self.expires_at = time.monotonic() + ANSWER_CACHE_TTL
+        self.entities = entities
+        self.vector = vector
+
+
+class AnswerCache:
+    """Bounded LRU of finished responses for a single data version."""
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, semantic: bool = ANSWER_CACHE_SEMANTIC):
+        self.max_entries = max_entries
+        self.semantic = semantic
+        self.version: Optional[str] = None
+        self._entries: "OrderedDict[tuple, AnswerEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _check_version(self, version: str):
+        if version != self.version:
+            # New data: every cached answer is stale
+            self._entries.clear()
+            self.version = version
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        """Unit-length question embedding, or None if embeddings are unavailable."""
+        from .llm import embed_texts
+
+        try:
+            vector = np.asarray(embed_texts([question])[0], dtype=np.float32)
+        except Exception as e:
+            logger.warning("Answer cache semantic lookup skipped: %s", e)
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def get(self, version: str, kind: str, question: str) -> Optional[Dict]:
+        """
+        Cached response for question, or None.
+
+        The semantic tier may call the embeddings API, so call this off the
+        event loop when it is enabled.
+        """
+        key, entities = intent_key(kind, question)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return copy.deepcopy(entry.response)
+            candidates = [
+                (k, e) for k, e in self._entries.items()
+                if e.vector is not None and e.entities == entities and e.expires_at > now
+            ] if self.semantic else []
+
+        if candidates:
+            vector = self._embed(question)
+            if vector is not None:
+                best_key, best_entry = max(candidates, key=lambda item: float(item[1].vector @ vector))
+                if float(best_entry.vector @ vector) >= ANSWER_CACHE_SIMILARITY:
+                    with self._lock:
+                        if self.version == version and best_key in self._entries:
+                            self._entries.move_to_end(best_key)
+                            self.semantic_hits += 1
+                            return copy.deepcopy(best_entry.response)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, version: str, kind: str, question: str, response: Dict):
+        """Cache a finished response for question under the given data version."""
+        key, entities = intent_key(kind, question)
+        vector = self._embed(question) if self.semantic else None
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[key] = AnswerEntry(copy.deepcopy(response), entities, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "semantic": self.semantic,
+            }
+
+
+answer_cache = AnswerCache()
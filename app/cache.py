@@ -0,0 +1,147 @@
+"""
+Response Cache for the Budget View Endpoints
+
+The budget views only change when an upload script runs, so GET responses
+for those routes are cached in memory keyed by route, normalized query
+string and the current data version token (see app/db.current_data_version).
+
+Every cached response carries a strong ETag (hash of the body) and a
+Cache-Control header; requests with a matching If-None-Match get a 304.
+
+Usage:
+    from app.cache import response_cache_middleware
+    app.middleware("http")(response_cache_middleware)
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .db import run_in_db_thread, current_data_version
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# Routes whose responses depend only on the budget data. /stats is not one:
+# it also counts documents, and document ingestion doesn't bump the data version.
+CACHED_PATHS = {
+    "/api/budget/year-totals",
+    "/api/budget/yoy",
+    "/api/budget/category",
+    "/api/budget/shares",
+    "/api/budget/line-item",
+    "/api/budget/category-yoy",
+    "/departments",
+    "/years",
+}
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_MAX_AGE = int(os.getenv("RESPONSE_CACHE_MAX_AGE", "60"))
+
+
+class CachedResponse:
+    """Body, media type and strong ETag of a cached 200 response."""
+
+    __slots__ = ("body", "media_type", "etag")
+
+    def __init__(self, body: bytes, media_type: Optional[str]):
+        self.body = body
+        self.media_type = media_type
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+class ResponseCache:
+    """Bounded LRU of responses for a single data version."""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.version: Optional[str] = None
+        self._entries: "OrderedDict[Tuple[str, str], CachedResponse]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, version: str, key: Tuple[str, str]) -> Optional[CachedResponse]:
+        if version != self.version:
+            # New data: everything cached so far is stale
+            self._entries.clear()
+            self.version = version
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, version: str, key: Tuple[str, str], entry: CachedResponse):
+        if version != self.version:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, object]:
+        return {"version": self.version, "entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+response_cache = ResponseCache()
+
+
+def normalize_query(request: Request) -> str:
+    """Sorted query string without empty values, so equivalent URLs share a key."""
+    items = sorted((k, v) for k, v in request.query_params.multi_items() if v != "")
+    return "&".join(f"{k}={v}" for k, v in items)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _cache_headers(entry: CachedResponse, version: str, status: str) -> Dict[str, str]:
+    return {
+        "ETag": entry.etag,
+        "Cache-Control": f"public, max-age={RESPONSE_CACHE_MAX_AGE}",
+        "X-Data-Version": version,
+        "X-Cache": status,
+    }
+
+
+async def response_cache_middleware(request: Request, call_next):
+    """Serve cached budget view responses and answer conditional GETs with 304."""
+    if request.method != "GET" or request.url.path not in CACHED_PATHS:
+        return await call_next(request)
+
+    try:
+        version = await run_in_db_thread(current_data_version)
+    except Exception as e:
+        logger.warning("Response cache bypassed, data version unavailable: %s", e)
+        return await call_next(request)
+
+    key = (request.url.path, normalize_query(request))
+    entry = response_cache.get(version, key)
+    status = "HIT"
+
+    if entry is None:
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        entry = CachedResponse(body, response.headers.get("content-type"))
+        response_cache.put(version, key, entry)
+        status = "MISS"
+
+    headers = _cache_headers(entry, version, status)
+    if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type=entry.media_type, headers=headers)
@@ -0,0 +1,246 @@
+"""
+In-memory Budget Cube
+
+Columnar, NumPy-backed snapshot of the v_line_items view
+(fiscal_year x category x line_item) used to answer deterministic /ask
+intents without a Postgres round trip per question.
+
+Strings are interned into integer codes once at load time; year, category
+and line-item totals are pre-aggregated with np.bincount so every lookup is
+a dict probe plus an array index. The snapshot is immutable: a refresh
+builds a new cube and swaps the module-level reference, so readers always
+see either the old or the new data set, never a mix.
+
+Usage:
+    from app.cube import get_cube
+    cube = get_cube()
+    cube.year_total("FY25")
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Any
+
+import numpy as np
+from sqlalchemy import text
+
+from .db import engine, get_data_version, current_data_version
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# How often the background refresher checks whether the data version changed
+CUBE_REFRESH_SECONDS = float(os.getenv("CUBE_REFRESH_SECONDS", "60"))
+
+_cube = None
+_cube_lock = threading.Lock()
+_refresher = None
+# Extra version-keyed caches (e.g. the question vocabulary) refreshed by the same thread
+_refresh_hooks: List[Callable[[], bool]] = []
+
+
+def _money(value: float):
+    """Round to cents and return an int when the amount is whole dollars."""
+    value = round(float(value), 2)
+    return int(value) if value.is_integer() else value
+
+
+class BudgetCube:
+    """Immutable fiscal_year x category x line_item totals."""
+
+    def __init__(self, rows: List[Tuple[str, str, str, Any]], version: Optional[str] = None):
+        """
+        Build the cube from (fiscal_year, category, line_item, total) rows.
+
+        Args:
+            rows: Rows shaped like v_line_items
+            version: Data version token the rows were read at
+        """
+        self.version = version
+        self.loaded_at = time.time()
+
+        years: Dict[str, int] = {}
+        categories: Dict[str, int] = {}
+        line_items: Dict[str, int] = {}
+
+        n = len(rows)
+        y_codes = np.empty(n, dtype=np.int32)
+        c_codes = np.empty(n, dtype=np.int32)
+        i_codes = np.empty(n, dtype=np.int32)
+        amounts = np.empty(n, dtype=np.float64)
+
+        for pos, (fiscal_year, category, line_item, total) in enumerate(rows):
+            y_codes[pos] = years.setdefault(fiscal_year, len(years))
+            c_codes[pos] = categories.setdefault(category, len(categories))
+            i_codes[pos] = line_items.setdefault(line_item, len(line_items))
+            amounts[pos] = float(total or 0)
+
+        self.years = list(years)
+        self.categories = list(categories)
+        self.line_items = list(line_items)
+
+        # Case-insensitive lookups (first spelling wins, like fetchone() did)
+        self._year_index = {y.upper(): code for y, code in reversed(list(years.items()))}
+        self._category_index = {c.upper(): code for c, code in reversed(list(categories.items()))}
+        self._line_item_index = {i.upper(): code for i, code in reversed(list(line_items.items()))}
+
+        n_years, n_cats, n_items = len(years), len(categories), len(line_items)
+        self._n_cats = n_cats
+        self._n_items = n_items
+
+        self._year_totals = np.bincount(y_codes, weights=amounts, minlength=n_years)
+
+        yc = y_codes.astype(np.int64) * n_cats + c_codes
+        self._category_totals = np.bincount(yc, weights=amounts, minlength=n_years * n_cats).reshape(n_years, n_cats)
+        self._category_present = (np.bincount(yc, minlength=n_years * n_cats) > 0).reshape(n_years, n_cats)
+
+        yci = yc * n_items + i_codes
+        self._item_keys, inverse = np.unique(yci, return_inverse=True)
+        self._item_totals = np.bincount(inverse, weights=amounts, minlength=len(self._item_keys))
+
+        # Year order matches ORDER BY fiscal_year on the views
+        self._year_order = sorted(range(n_years), key=lambda code: self.years[code])
+
+    def __len__(self) -> int:
+        return len(self._item_keys)
+
+    def _year_code(self, year: str) -> Optional[int]:
+        return self._year_index.get((year or "").upper())
+
+    def _category_code(self, category: str) -> Optional[int]:
+        return self._category_index.get((category or "").strip().upper())
+
+    def year_total(self, year: str):
+        """Total for a fiscal year (v_year_totals), or None if the year is unknown."""
+        y = self._year_code(year)
+        if y is None:
+            return None
+        return _money(self._year_totals[y])
+
+    def year_totals(self) -> List[Tuple[str, Any]]:
+        """All (fiscal_year, total) pairs ordered by fiscal year."""
+        return [(self.years[y], _money(self._year_totals[y])) for y in self._year_order]
+
+    def year_yoy(self) -> List[Tuple[str, Any, Any]]:
+        """(fiscal_year, total, yoy_change) rows matching v_year_yoy."""
+        rows = []
+        prev = None
+        for fiscal_year, total in self.year_totals():
+            rows.append((fiscal_year, total, None if prev is None else _money(total - prev)))
+            prev = total
+        return rows
+
+    def category_total(self, year: str, category: str):
+        """Total for one category in a year (v_category_totals), or None."""
+        y = self._year_code(year)
+        c = self._category_code(category)
+        if y is None or c is None or not self._category_present[y, c]:
+            return None
+        return _money(self._category_totals[y, c])
+
+    def category_totals(self, year: str, limit: Optional[int] = None) -> List[Tuple[str, Any]]:
+        """(category, total) pairs for a year, largest first."""
+        y = self._year_code(year)
+        if y is None:
+            return []
+        present = np.flatnonzero(self._category_present[y])
+        totals = self._category_totals[y, present]
+        order = present[np.argsort(-totals, kind="stable")]
+        if limit is not None:
+            order = order[:int(limit)]
+        return [(self.categories[c], _money(self._category_totals[y, c])) for c in order]
+
+    def category_share(self, year: str, category: str) -> Optional[Tuple[float, Any]]:
+        """(pct_of_year, total) for a category, matching v_category_shares."""
+        total = self.category_total(year, category)
+        year_total = self.year_total(year)
+        if total is None or not year_total:
+            return None
+        return round(total / year_total * 100, 2), total
+
+    def line_item_total(self, year: str, category: str, line_item: str):
+        """Total for a line item within a category and year (v_line_items), or None."""
+        y = self._year_code(year)
+        c = self._category_code(category)
+        i = self._line_item_index.get((line_item or "").strip().upper())
+        if y is None or c is None or i is None:
+            return None
+        key = (y * self._n_cats + c) * self._n_items + i
+        pos = int(np.searchsorted(self._item_keys, key))
+        if pos >= len(self._item_keys) or self._item_keys[pos] != key:
+            return None
+        return _money(self._item_totals[pos])
+
+
+def load_cube() -> BudgetCube:
+    """Read v_line_items and build a fresh cube, then publish it."""
+    global _cube
+    with engine.begin() as conn:
+        version = get_data_version(conn)
+        rows = conn.execute(text("""
+            SELECT fiscal_year, category, line_item, total
+            FROM v_line_items
+        """)).fetchall()
+
+    cube = BudgetCube([tuple(row) for row in rows], version=version)
+    with _cube_lock:
+        _cube = cube
+    return cube
+
+
+def get_cube() -> BudgetCube:
+    """Return the current cube, loading it on first use."""
+    cube = _cube
+    if cube is None:
+        with _cube_lock:
+            cube = _cube
+        if cube is None:
+            cube = load_cube()
+    return cube
+
+
+def refresh_cube_if_stale() -> bool:
+    """
+    Reload the cube if the data version moved since it was built.
+
+    Returns:
+        True if a new cube was published
+    """
+    cube = _cube
+    version = current_data_version(max_age=0)
+    if cube is not None and cube.version == version:
+        return False
+    load_cube()
+    return True
+
+
+def _refresh_loop(interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            if refresh_cube_if_stale():
+                logger.info("Budget cube refreshed", extra={"version": _cube.version, "cells": len(_cube)})
+        except Exception as e:
+            # Keep serving the previous snapshot
+            logger.warning("Budget cube refresh failed: %s", e)
+        for hook in list(_refresh_hooks):
+            try:
+                hook()
+            except Exception as e:
+                logger.warning("Refresh hook %s failed: %s", hook.__name__, e)
+
+
+def register_refresh_hook(hook: Callable[[], bool]):
+    """Run hook after every cube refresh check; it should reload itself if the data version moved."""
+    if hook not in _refresh_hooks:
+        _refresh_hooks.append(hook)
+
+
+def start_cube_refresher(interval: float = CUBE_REFRESH_SECONDS):
+    """Start the daemon thread that keeps the cube in sync with the data version."""
+    global _refresher
+    if _refresher is not None or interval <= 0:
+        return
+    _refresher = threading.Thread(target=_refresh_loop, args=(interval,), name="budget-cube-refresh", daemon=True)
+    _refresher.start()
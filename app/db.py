@@ -1,20 +1,329 @@
 # app/db.py
 import os
-from sqlalchemy import create_engine, event
+import time
+import functools
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+import anyio
+import anyio.to_thread
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.pool import QueuePool
 from dotenv import load_dotenv
 
+from .log import get_logger
+from .metrics import POOL_CHECKOUT_WAIT, LatencyStats, observe_stage, register_callback
+
+try:
+    from pgvector.psycopg2 import register_vector as _register_vector
+except ImportError:  # optional
+    _register_vector = None
+
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+logger = get_logger(__name__)
+
+# Connection pool. Size it so pool_size + max_overflow covers
+# DB_THREADPOOL_SIZE plus the sync routes and the cube refresher.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Replace connections older than this (seconds) before server/proxy idle limits close them
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Ping a connection on checkout only if it sat idle longer than this (seconds);
+# 0 pings on every checkout, -1 never pings
+DB_PRE_PING_INTERVAL = float(os.getenv("DB_PRE_PING_INTERVAL", "30"))
+# Server-side statement_timeout in ms (0 disables)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+# PgBouncer in transaction mode rejects startup options, so statement_timeout
+# must then be set on the database role instead (see README)
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "0") == "1"
+# statement_timeout (ms) for the read-only transaction shared by one /ask or /insights request
+DB_REQUEST_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_REQUEST_STATEMENT_TIMEOUT_MS", "10000"))
+
+_checkout_wait = LatencyStats()
+_checkout_timeouts = 0
+
+class ObservedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        global _checkout_timeouts
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            _checkout_timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            _checkout_wait.observe(waited)
+            POOL_CHECKOUT_WAIT.observe(waited)
+
+def _connect_args() -> Dict[str, Any]:
+    if DB_PGBOUNCER or DB_STATEMENT_TIMEOUT_MS <= 0 or not (DATABASE_URL or "").startswith("postgres"):
+        return {}
+    return {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+
+engine = create_engine(
+    DATABASE_URL,
+    poolclass=ObservedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_PRE_PING_INTERVAL == 0,
+    connect_args=_connect_args(),
+)
+
+# Register pgvector for psycopg2 so lists/tuples map to 'vector'. The type
+# is registered process-wide from the first connection; pgvector versions
+# without globally= fall back to registering on each new connection.
+_vector_registered = False
 
-# Register pgvector for psycopg2 so lists/tuples map to 'vector'
 @event.listens_for(engine, "connect")
 def register_vector(dbapi_conn, conn_record):
+    global _vector_registered
+    if _register_vector is None or _vector_registered:
+        return
     try:
-        from pgvector.psycopg2 import register_vector
-        register_vector(dbapi_conn)
+        try:
+            _register_vector(dbapi_conn, globally=True)
+            _vector_registered = True
+        except TypeError:
+            _register_vector(dbapi_conn)
     except Exception as e:
-        # Don't crash app if adapter missing; just log
-        print("pgvector register warning:", e)
+        # Don't crash app if the vector type is missing; just log
+        logger.warning("pgvector register warning: %s", e)
+
+# Interval-based pre-ping: only connections idle longer than
+# DB_PRE_PING_INTERVAL pay a round trip on checkout
+@event.listens_for(engine, "checkin")
+def _mark_idle(dbapi_conn, conn_record):
+    conn_record.info["idle_since"] = time.monotonic()
+
+@event.listens_for(engine, "checkout")
+def _ping_if_idle(dbapi_conn, conn_record, conn_proxy):
+    if DB_PRE_PING_INTERVAL <= 0:
+        return
+    idle_since = conn_record.info.get("idle_since")
+    if idle_since is None or time.monotonic() - idle_since < DB_PRE_PING_INTERVAL:
+        return
+    try:
+        cursor = dbapi_conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
+        dbapi_conn.rollback()
+    except Exception as e:
+        # The pool discards this connection and retries with a fresh one
+        raise exc.DisconnectionError() from e
+
+def pool_stats() -> Dict[str, Any]:
+    """Pool configuration, connections in use / idle / overflow and checkout wait times."""
+    pool = engine.pool
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "checkout_timeouts": _checkout_timeouts,
+        "checkout_wait": _checkout_wait.snapshot(),
+        "pgbouncer": DB_PGBOUNCER,
+    }
+
+register_callback("db_pool_checked_out", "Pooled database connections currently in use.", lambda: engine.pool.checkedout())
+register_callback("db_pool_checked_in", "Idle pooled database connections.", lambda: engine.pool.checkedin())
+register_callback("db_pool_overflow", "Connections open beyond pool_size (negative while the pool is still filling).", lambda: engine.pool.overflow())
+register_callback("db_pool_checkout_timeouts_total", "Checkouts that gave up after DB_POOL_TIMEOUT.", lambda: _checkout_timeouts, kind="counter")
+
+# Per-statement timing for the "sql" stage on /metrics
+@event.listens_for(engine, "before_cursor_execute")
+def _start_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    context._sql_started = time.perf_counter()
+
+@event.listens_for(engine, "after_cursor_execute")
+def _observe_sql_time(conn, cursor, statement, parameters, context, executemany):
+    observe_stage("sql", time.perf_counter() - context._sql_started)
+
+
+_fallback_warned = False
+
+def get_data_version(conn) -> str:
+    """
+    Token identifying the currently loaded budget data.
+
+    Uses the counter in data_version (bumped by app/loader.py via
+    bump_data_version). Databases that have never been loaded through the
+    loader fall back to budget_facts' catalog entry: its OID (which changes
+    when a table is swapped in) and its write counters from
+    pg_stat_user_tables. That never scans the table, and at worst a stats
+    reset causes one extra reload.
+    """
+    global _fallback_warned
+    has_table = conn.execute(text("SELECT to_regclass('public.data_version') IS NOT NULL")).scalar()
+    if has_table:
+        version = conn.execute(text("SELECT version FROM data_version WHERE id = 1")).scalar()
+        if version is not None:
+            return f"v{version}"
+    if not _fallback_warned:
+        logger.warning("data_version is missing; using budget_facts table statistics as the data version")
+        _fallback_warned = True
+    row = conn.execute(text("""
+        SELECT relid, n_tup_ins + n_tup_upd + n_tup_del
+        FROM pg_stat_user_tables
+        WHERE relid = to_regclass('budget_facts')
+    """)).fetchone()
+    return f"t{row[0]}:{row[1]}" if row else "t0"
+
+def bump_data_version(conn) -> int:
+    """Advance the data version after an upload so caches and the cube reload; returns the new version."""
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS data_version (
+          id INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+          version BIGINT NOT NULL DEFAULT 1,
+          updated_at TIMESTAMP DEFAULT NOW()
+        )
+    """))
+    return conn.execute(text("""
+        INSERT INTO data_version (id, version) VALUES (1, 1)
+        ON CONFLICT (id) DO UPDATE
+        SET version = data_version.version + 1, updated_at = NOW()
+        RETURNING version
+    """)).scalar()
+
+# The version is re-read at most this often; between checks callers get the
+# last value seen, so per-request cache lookups stay off the database.
+DATA_VERSION_TTL = float(os.getenv("DATA_VERSION_TTL", "5"))
+_data_version = (None, 0.0)
+
+def current_data_version(max_age: float = DATA_VERSION_TTL) -> str:
+    """Return the data version token, re-reading it once it is older than max_age seconds."""
+    global _data_version
+    version, checked_at = _data_version
+    if version is None or time.monotonic() - checked_at > max_age:
+        with engine.begin() as conn:
+            version = get_data_version(conn)
+        _data_version = (version, time.monotonic())
+    return version
+
+# Worker threads reserved for blocking queries issued from async routes.
+# Kept separate from Starlette's default threadpool (used by the sync routes)
+# and no larger than pool_size + max_overflow so threads never queue on checkout.
+DB_THREADPOOL_SIZE = int(os.getenv("DB_THREADPOOL_SIZE", str(min(10, DB_POOL_SIZE + DB_MAX_OVERFLOW))))
+_db_limiter = None
+
+async def run_in_db_thread(fn, *args, **kwargs):
+    """Run a blocking database call off the event loop, bounded by DB_THREADPOOL_SIZE."""
+    global _db_limiter
+    if _db_limiter is None:
+        _db_limiter = anyio.CapacityLimiter(DB_THREADPOOL_SIZE)
+    return await anyio.to_thread.run_sync(functools.partial(fn, *args, **kwargs), limiter=_db_limiter)
+
+class ReadUnitOfWork:
+    """
+    One read-only transaction shared by the database calls of a request.
+
+    The connection is checked out on first use, so requests answered from
+    the cube or a cache never touch the pool. Calls must be sequential (as
+    the awaited run_in_db_thread calls of one request are); the connection
+    moves between worker threads but is never used by two at once.
+    """
+
+    def __init__(self, statement_timeout_ms: int = DB_REQUEST_STATEMENT_TIMEOUT_MS):
+        self.statement_timeout_ms = statement_timeout_ms
+        self.closed = False
+        self.checkouts = 0
+        self._conn = None
+        self._transaction = None
+
+    def connection(self):
+        if self._conn is None:
+            self._conn = engine.connect()
+            self._transaction = self._conn.begin()
+            # Must precede any query in the transaction; SET LOCAL ends with it, so
+            # this is also safe behind PgBouncer in transaction mode. Sent as
+            # one round trip.
+            setup = "SET TRANSACTION READ ONLY"
+            if self.statement_timeout_ms > 0:
+                setup += f"; SET LOCAL statement_timeout = {int(self.statement_timeout_ms)}"
+            self._conn.exec_driver_sql(setup)
+            self.checkouts += 1
+        return self._conn
+
+    def discard(self):
+        """End the transaction and return the connection; the next call starts a new one."""
+        conn, transaction = self._conn, self._transaction
+        self._conn = self._transaction = None
+        if conn is not None:
+            try:
+                # Nothing was written; rollback ends the transaction just like commit
+                transaction.rollback()
+            finally:
+                conn.close()
+
+    def close(self):
+        self.closed = True
+        self.discard()
+
+_unit_of_work: ContextVar[Optional[ReadUnitOfWork]] = ContextVar("db_unit_of_work", default=None)
+
+@asynccontextmanager
+async def request_unit_of_work():
+    """
+    Share one read-only connection between the read_connection() calls made
+    inside this block, including those in run_in_db_thread workers.
+
+    Keep LLM and embedding calls outside the block (or call
+    release_read_connection() before awaiting one) so the connection isn't
+    held while waiting on OpenAI.
+    """
+    uow = ReadUnitOfWork()
+    token = _unit_of_work.set(uow)
+    try:
+        yield uow
+    finally:
+        _unit_of_work.reset(token)
+        await run_in_db_thread(uow.close)
+
+async def release_read_connection():
+    """
+    Return the request's shared connection to the pool before a slow non-database
+    wait; the next read_connection() call checks out a fresh one.
+    """
+    uow = _unit_of_work.get()
+    if uow is not None and not uow.closed:
+        await run_in_db_thread(uow.discard)
+
+@contextmanager
+def read_connection() -> Iterator[Any]:
+    """
+    Connection for read queries: the request's shared read-only transaction
+    inside request_unit_of_work(), otherwise a transaction of its own.
+
+    A failed statement aborts a Postgres transaction, so on error the shared
+    connection is discarded and the request's next call gets a fresh one.
+    """
+    uow = _unit_of_work.get()
+    if uow is None or uow.closed:
+        with engine.begin() as conn:
+            yield conn
+        return
+    conn = uow.connection()
+    try:
+        yield conn
+    except BaseException:
+        uow.discard()
+        raise
+
+def fetch_all(sql: str, params: Optional[dict] = None) -> List[dict]:
+    """Execute a read query and return its rows as dicts."""
+    with read_connection() as conn:
+        return [dict(row) for row in conn.execute(text(sql), params or {}).mappings().all()]
 
+def fetch_one(sql: str, params: Optional[dict] = None) -> Optional[dict]:
+    """Execute a read query and return the first row as a dict, or None."""
+    with read_connection() as conn:
+        row = conn.execute(text(sql), params or {}).mappings().first()
+        return dict(row) if row else None
@@ -0,0 +1,144 @@
+"""
+Embedding Cache
+
+Content-hash keyed cache for embedding vectors so identical questions and
+chunk texts never pay for a second OpenAI round trip.
+
+Two tiers:
+  - a bounded in-memory LRU (EMBEDDING_CACHE_SIZE entries)
+  - a persistent SQLite file (EMBEDDING_CACHE_PATH) shared across restarts
+    and workers on the same host; set the path to "" to disable it
+
+Keys are sha256(model + text), values are float32 vectors.
+
+Usage:
+    from app.embedding_cache import embedding_cache
+    embedding_cache.get_many(model, texts)
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", ".embedding_cache.sqlite3")
+
+
+def content_key(model: str, text: str) -> str:
+    """Stable cache key for a text embedded with a given model."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """In-memory LRU backed by an optional SQLite file."""
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE, path: Optional[str] = EMBEDDING_CACHE_PATH):
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("""
+                    CREATE TABLE IF NOT EXISTS embeddings (
+                      key TEXT PRIMARY KEY,
+                      dim INTEGER NOT NULL,
+                      vector BLOB NOT NULL
+                    )
+                """)
+                self._db.commit()
+            except sqlite3.Error as e:
+                # Fall back to memory-only caching
+                logger.warning("Embedding cache disk tier disabled: %s", e)
+                self._db = None
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Look up several keys at once.
+
+        Returns:
+            Mapping of key -> vector for the keys that were cached
+        """
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is None:
+                    missing.append(key)
+                else:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self.memory_hits += 1
+
+            if missing and self._db is not None:
+                unique = list(dict.fromkeys(missing))
+                placeholders = ",".join("?" * len(unique))
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", unique
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    found[key] = vector
+                    self._remember(key, vector)
+                self.disk_hits += sum(1 for key in missing if key in found)
+
+            self.misses += sum(1 for key in keys if key not in found)
+
+        return {key: vector.tolist() for key, vector in found.items()}
+
+    def put_many(self, items: Dict[str, List[float]]):
+        """Store freshly computed vectors in both tiers."""
+        if not items:
+            return
+        arrays = {key: np.asarray(vector, dtype=np.float32) for key, vector in items.items()}
+        with self._lock:
+            for key, vector in arrays.items():
+                self._remember(key, vector)
+            if self._db is not None:
+                try:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)",
+                        [(key, len(vector), vector.tobytes()) for key, vector in arrays.items()],
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning("Embedding cache write failed: %s", e)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and tier sizes."""
+        with self._lock:
+            disk_entries = None
+            if self._db is not None:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+            }
+
+
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,217 @@
+"""
+Fuzzy Entity Resolution
+
+Resolves user-typed category and line-item names ("Payrol taxes", "Admin")
+to the canonical names in the budget data, so deterministic intents don't
+miss on a typo and fall through to the LLM/vector path.
+
+Scoring follows pg_trgm: names are normalised, split into words and padded
+("  w", " wo", "wor", "ord", "rd "), and two names are compared by their
+trigram sets:
+  - similarity      = shared / union            (pg_trgm similarity)
+  - word similarity = shared / query trigrams   (close to pg_trgm
+    word_similarity, so prefixes like "admin" score high)
+A name is a candidate if either score clears its threshold (defaults
+match pg_trgm's 0.3 and 0.6).
+
+Candidates only replace the user's term when the match is safe: an exact
+normalised match always resolves; otherwise the term must not itself be a
+known department or line item name (curated or in the data, e.g. "Public
+Safety" or "taxes"), the best score must reach ENTITY_REMAP_THRESHOLD and
+lead the runner-up by ENTITY_REMAP_MARGIN. Anything else keeps the user's
+term, so the intent misses and the normal fallback answers instead of a
+confident figure for a different entity.
+
+TrigramIndex keeps an inverted trigram -> names index in memory; a lookup
+only touches names sharing a trigram with the query. For vocabularies too
+large to hold per worker, PgTrgmIndex runs the same lookup in Postgres
+against the GIN trigram indexes from db/migrations/002_trgm_entity_indexes.sql.
+
+Usage:
+    from app.entity_index import get_entity_resolver
+    resolver = get_entity_resolver(get_cube())
+    resolver.category("Admin")  # "ADMINISTRATION"
+"""
+
+import os
+import threading
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+from .db import read_connection
+from .question_parser import DEPARTMENT_ALIASES, DEPT_PATTERNS, LINE_ITEM_PATTERNS
+from .vocabulary import name_forms, normalize_name
+
+SIMILARITY_THRESHOLD = float(os.getenv("ENTITY_SIMILARITY_THRESHOLD", "0.3"))
+WORD_SIMILARITY_THRESHOLD = float(os.getenv("ENTITY_WORD_SIMILARITY_THRESHOLD", "0.6"))
+# Stricter bar for replacing the user's term with a non-exact candidate
+ENTITY_REMAP_THRESHOLD = float(os.getenv("ENTITY_REMAP_THRESHOLD", "0.55"))
+ENTITY_REMAP_MARGIN = float(os.getenv("ENTITY_REMAP_MARGIN", "0.1"))
+# Vocabularies larger than this are resolved with pg_trgm instead of in memory
+ENTITY_INDEX_MEMORY_LIMIT = int(os.getenv("ENTITY_INDEX_MEMORY_LIMIT", "50000"))
+
+
+def trigrams(name: str) -> frozenset:
+    """pg_trgm-style trigram set of a normalised name."""
+    grams = set()
+    for word in normalize_name(name).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+class TrigramIndex:
+    """In-memory inverted trigram index over a fixed list of names."""
+
+    def __init__(self, names: Sequence[str]):
+        self.names: List[str] = list(dict.fromkeys(n for n in names if n))
+        # One entry per spelling (see vocabulary.name_forms), so "polise" can
+        # match "police" rather than only the full "POLICE DEPARTMENT"
+        self._owners: List[int] = []
+        self._sizes: List[int] = []
+        self._exact: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for idx, name in enumerate(self.names):
+            for form in name_forms(name):
+                self._exact.setdefault(normalize_name(form), idx)
+                grams = trigrams(form)
+                entry = len(self._owners)
+                self._owners.append(idx)
+                self._sizes.append(len(grams))
+                for gram in grams:
+                    self._postings[gram].append(entry)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def lookup(self, query: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """
+        Best matching names for query.
+
+        Returns:
+            Up to limit (name, score) pairs, best first; score is 1.0 for a
+            normalised exact match
+        """
+        exact = self._exact.get(normalize_name(query or ""))
+        if exact is not None:
+            return [(self.names[exact], 1.0)]
+
+        grams = trigrams(query or "")
+        if not grams:
+            return []
+        shared = Counter(chain.from_iterable(self._postings.get(gram, ()) for gram in grams))
+
+        best: Dict[int, Tuple[float, float]] = {}
+        for entry, count in shared.items():
+            similarity = count / (len(grams) + self._sizes[entry] - count)
+            word_similarity = count / len(grams)
+            if similarity >= SIMILARITY_THRESHOLD or word_similarity >= WORD_SIMILARITY_THRESHOLD:
+                idx = self._owners[entry]
+                score = (max(similarity, word_similarity), similarity)
+                if idx not in best or score > best[idx]:
+                    best[idx] = score
+        ranked = sorted(best.items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))
+        return [(self.names[idx], round(score[0], 3)) for idx, score in ranked[:limit]]
+
+
+class PgTrgmIndex:
+    """Same lookup as TrigramIndex, served by pg_trgm over a budget_facts column."""
+
+    def __init__(self, column: str):
+        if column not in ("department", "line_item"):
+            raise ValueError(f"Unsupported entity column: {column}")
+        self.column = column
+
+    def lookup(self, query: str, limit: int = 5) -> List[Tuple[str, float]]:
+        with read_connection() as conn:
+            conn.execute(text("""
+                SELECT set_config('pg_trgm.similarity_threshold', :sim, true),
+                       set_config('pg_trgm.word_similarity_threshold', :word_sim, true)
+            """), {"sim": str(SIMILARITY_THRESHOLD), "word_sim": str(WORD_SIMILARITY_THRESHOLD)})
+            rows = conn.execute(text(f"""
+                SELECT name, GREATEST(similarity(name, :q), word_similarity(:q, name)) AS score
+                FROM (
+                  SELECT DISTINCT {self.column} AS name
+                  FROM budget_facts
+                  WHERE {self.column} % :q OR :q <% {self.column}
+                ) candidates
+                ORDER BY score DESC, name
+                LIMIT :limit
+            """), {"q": query, "limit": limit}).fetchall()
+        return [(row[0], round(float(row[1]), 3)) for row in rows]
+
+
+def build_index(names: Sequence[str], column: str):
+    """In-memory index for normal vocabularies, pg_trgm beyond ENTITY_INDEX_MEMORY_LIMIT."""
+    if len(names) > ENTITY_INDEX_MEMORY_LIMIT:
+        return PgTrgmIndex(column)
+    return TrigramIndex(names)
+
+
+class EntityResolver:
+    """Category and line-item resolution for one budget cube snapshot."""
+
+    def __init__(self, categories: Sequence[str], line_items: Sequence[str]):
+        self.categories = build_index(categories, "department")
+        self.line_items = build_index(line_items, "line_item")
+        # Real entity names; a user's term that is one of these is never
+        # swapped for a different, merely similar name
+        self._known = {
+            normalize_name(form)
+            for name in chain(categories, line_items, DEPT_PATTERNS, DEPARTMENT_ALIASES, LINE_ITEM_PATTERNS)
+            if name
+            for form in name_forms(name)
+        }
+
+    def _resolve(self, name: str, matches: List[Tuple[str, float]]) -> str:
+        """The best match if it is safe to substitute for name (see module docstring), else name."""
+        if not matches:
+            return name
+        best, score = matches[0]
+        term = normalize_name(name or "")
+        if term in {normalize_name(form) for form in name_forms(best)}:
+            # Exact match; a word-similarity score of 1.0 ("taxes" in "Payroll Taxes") is not
+            return best
+        runner_up = matches[1][1] if len(matches) > 1 else 0.0
+        if (term in self._known
+                or score < ENTITY_REMAP_THRESHOLD
+                or score - runner_up < ENTITY_REMAP_MARGIN):
+            return name
+        return best
+
+    def category(self, name: str) -> str:
+        """Canonical category for name, or name unchanged if no match is clearly right."""
+        return self._resolve(name, self.categories.lookup(name, limit=2))
+
+    def line_item(self, name: str, accept=None) -> str:
+        """
+        Canonical line item for name, or name unchanged if no match is clearly right.
+
+        Args:
+            name: User-supplied line item
+            accept: Optional predicate; only candidates it accepts are
+                considered (e.g. ones that exist under the requested category)
+        """
+        matches = self.line_items.lookup(name, limit=5)
+        return self._resolve(name, [m for m in matches if accept is None or accept(m[0])])
+
+
+# (cube, resolver) pair; the cube is immutable, so a new cube means new names
+_resolver: Tuple[object, Optional[EntityResolver]] = (None, None)
+_resolver_lock = threading.Lock()
+
+
+def get_entity_resolver(cube) -> EntityResolver:
+    """Resolver over the cube's categories and line items, rebuilt when the cube changes."""
+    global _resolver
+    source, resolver = _resolver
+    if source is not cube:
+        with _resolver_lock:
+            source, resolver = _resolver
+            if source is not cube:
+                resolver = EntityResolver(cube.categories, cube.line_items)
+                _resolver = (cube, resolver)
+    return resolver
@@ -1,24 +1,58 @@
 # app/llm.py
 import os, re
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
 from dotenv import load_dotenv
-from openai import OpenAI
+from .embedding_cache import embedding_cache, content_key
+from .question_parser import parse_question
+from .llm_client import llm_client
+from .log import get_logger
+from .metrics import stage_timer
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+logger = get_logger(__name__)
 
 EMBED_MODEL = "text-embedding-3-small"   # 1536-dim (matches your VECTOR(1536))
 CHAT_MODEL  = "gpt-4o-mini"              # cheap/fast; change if you prefer
 
 # --- Embeddings ---
+def _embed_uncached(texts: List[str]) -> Dict[str, list]:
+    """Embed texts with one API call and store them in the embedding cache."""
+    if not os.getenv("OPENAI_API_KEY"):
+        raise RuntimeError("OPENAI_API_KEY missing in environment")
+    vectors = llm_client.embed_sync(texts, EMBED_MODEL)
+    fresh = {content_key(EMBED_MODEL, t): v for t, v in zip(texts, vectors)}
+    embedding_cache.put_many(fresh)
+    return fresh
+
 def embed_texts(texts: List[str]) -> List[list]:
     """
     Returns a 1536-dim vector per input text using OpenAI.
+    Texts already in the embedding cache are served from it; the rest are
+    embedded in a single API call and cached.
     """
-    if not os.getenv("OPENAI_API_KEY"):
-        raise RuntimeError("OPENAI_API_KEY missing in environment")
-    resp = client.embeddings.create(model=EMBED_MODEL, input=texts)
-    return [d.embedding for d in resp.data]
+    with stage_timer("embedding"):
+        keys = [content_key(EMBED_MODEL, t) for t in texts]
+        vectors = embedding_cache.get_many(keys)
+        missing = list(dict.fromkeys(t for t, k in zip(texts, keys) if k not in vectors))
+        if missing:
+            vectors.update(_embed_uncached(missing))
+        return [vectors[k] for k in keys]
+
+def prefetch_embeddings(texts: List[str], batch_size: int = 256) -> int:
+    """
+    Warm the embedding cache for a batch of texts (popular questions, chunk
+    texts, ...) so later embed_texts calls skip the API entirely.
+
+    Returns:
+        Number of texts that had to be embedded
+    """
+    texts = list(dict.fromkeys(texts))
+    cached = embedding_cache.get_many([content_key(EMBED_MODEL, t) for t in texts])
+    missing = [t for t in texts if content_key(EMBED_MODEL, t) not in cached]
+    for i in range(0, len(missing), batch_size):
+        _embed_uncached(missing[i:i + batch_size])
+    return len(missing)
 
 # --- Simple amount extractor (used in fallback + display) ---
 _AMT_RE = re.compile(r'Amount:\s*\$?([0-9,]+(?:\.[0-9]{1,2})?)', re.I)
@@ -37,49 +71,8 @@ def classify_question(question: str) -> str:
     Returns:
         Question type category
     """
-    question_lower = question.lower()
-    
-    # Totals and Aggregates
-    if any(keyword in question_lower for keyword in ['total budget', 'total', 'sum', 'aggregate', 'combined']):
-        return "totals_and_aggregates"
-    
-    # Category Comparisons
-    if any(keyword in question_lower for keyword in ['compare', 'which category', 'rank', 'most funding', 'highest', 'lowest']):
-        return "category_comparisons"
-    
-    # Line-Item Details
-    if any(keyword in question_lower for keyword in ['line item', 'allocated to', 'largest line item', 'show me all line items']):
-        return "line_item_details"
-    
-    # Over Time / Trend Analysis
-    if any(keyword in question_lower for keyword in ['change from', 'grew the most', 'decreased from', 'trend', 'over time']):
-        return "trend_analysis"
-    
-    # Cross-Year Comparisons
-    if any(keyword in question_lower for keyword in ['increased in', 'year-over-year', 'disappear', 'compared to']):
-        return "cross_year_comparisons"
-    
-    # Breakdowns & Shares
-    if any(keyword in question_lower for keyword in ['percentage', 'share', 'top 5', 'breakdown']):
-        return "breakdowns_shares"
-    
-    # Partial FY26 Data Handling
-    if any(keyword in question_lower for keyword in ['fy26', '2026', 'partial', 'currently available']):
-        return "partial_fy26_data"
-    
-    # Custom Filters
-    if any(keyword in question_lower for keyword in ['over $', 'more than', 'under $', 'list categories', 'show me all expenditures']):
-        return "custom_filters"
-    
-    # Natural-Language Trends
-    if any(keyword in question_lower for keyword in ['biggest drivers', 'summarize', 'plain english', 'why does', 'tell me']):
-        return "natural_language_trends"
-    
-    # What-If / Hypothetical
-    if any(keyword in question_lower for keyword in ['if', 'would', 'hypothetical', 'what if']):
-        return "what_if_hypothetical"
-    
-    return "general"
+    # Keyword groups live in question_parser.QUESTION_CLASS_KEYWORDS
+    return parse_question(question).question_class
 
 def get_enhanced_system_prompt(question_type: str, total: Optional[float] = None, concise: bool = True) -> str:
     """
@@ -168,8 +161,144 @@ def get_enhanced_system_prompt(question_type: str, total: Optional[float] = None
             return f"{base_prompt} {type_prompts.get(question_type, '')}"
 
 # --- Compose a final answer with the evidence (LLM, with fallback) ---
-def answer_with_citations(question: str, evidence: List[Dict], total: Optional[float] = None, 
-                         filters: Optional[Dict] = None) -> str:
+def _build_messages(question: str, evidence: List[Dict], total: Optional[float], filters: Optional[Dict],
+                    question_type: str, concise: bool) -> List[Dict[str, str]]:
+    """System and user messages for an answer (concise) or insights (detailed) completion."""
+    # Build context from evidence
+    context = "\n\n".join(
+        f"[{i+1}] FY {e.get('fiscal_year','—')} • {e.get('department','—')}\n{e.get('chunk_text','')}"
+        for i, e in enumerate(evidence[:6])
+    ) or "No evidence."
+    
+    # Get enhanced system prompt based on question type
+    sys = get_enhanced_system_prompt(question_type, total, concise=concise)
+    
+    # Build user prompt with additional context
+    user_parts = [f"Question: {question}"]
+    
+    if total is not None:
+        user_parts.append(f"Total: ${total:,.2f}")
+    
+    if filters:
+        user_parts.append(f"Filters Applied: {filters}")
+    
+    user_parts.append(f"Evidence:\n{context}")
+    
+    user = "\n\n".join(user_parts)
+    return [{"role":"system","content":sys},{"role":"user","content":user}]
+
+def _filter_parts(filters: Optional[Dict]) -> List[str]:
+    """Human-readable year / department / line item labels from filters."""
+    filter_parts = []
+    if filters:
+        if filters.get("fiscal_year"):
+            filter_parts.append(f"FY{filters['fiscal_year']}")
+        if filters.get("department"):
+            filter_parts.append(filters["department"].replace("_", " ").title())
+        if filters.get("line_item"):
+            filter_parts.append(filters["line_item"])
+    return filter_parts
+
+def fallback_answer(evidence: List[Dict], total: Optional[float] = None, filters: Optional[Dict] = None) -> str:
+    """Deterministic one-sentence answer used when the LLM is unavailable."""
+    # Enhanced fallback: natural full sentences
+    if total is not None:
+        # Create natural sentence based on question type and filters
+        filter_parts = _filter_parts(filters)
+        if len(filter_parts) == 1:
+            return f"The total budget for {filter_parts[0]} is ${total:,.2f}."
+        if len(filter_parts) == 2:
+            return f"The total budget for {filter_parts[1]} in {filter_parts[0]} is ${total:,.2f}."
+        return f"The total budget is ${total:,.2f}."
+    # Handle non-total questions
+    if evidence:
+        return "Based on the available data, here are the relevant findings for your question."
+    return "I couldn't find specific data matching your question."
+
+def fallback_insights(evidence: List[Dict], total: Optional[float] = None, filters: Optional[Dict] = None) -> str:
+    """Deterministic detailed analysis used when the LLM is unavailable."""
+    # Enhanced fallback: natural detailed response
+    answer = f"**Detailed Analysis**\n\n"
+    if total is not None:
+        filter_parts = _filter_parts(filters)
+        if len(filter_parts) == 1:
+            answer += f"The total budget for {filter_parts[0]} is **${total:,.2f}**.\n\n"
+        elif len(filter_parts) == 2:
+            answer += f"The total budget for {filter_parts[1]} in {filter_parts[0]} is **${total:,.2f}**.\n\n"
+        else:
+            answer += f"The total budget is **${total:,.2f}**.\n\n"
+        
+        # Add context about the data
+        if evidence:
+            answer += f"This total is based on {len(evidence)} budget line items. "
+            answer += "The data includes various categories such as salaries, equipment, and operational expenses.\n\n"
+            
+            # Show top categories
+            dept_counts = {}
+            for evi in evidence:
+                dept = evi.get("department", "Unknown")
+                dept_counts[dept] = dept_counts.get(dept, 0) + 1
+            
+            if dept_counts:
+                answer += "**Breakdown by Department:**\n"
+                for dept, count in sorted(dept_counts.items(), key=lambda x: x[1], reverse=True)[:5]:
+                    answer += f"- {dept.replace('_', ' ').title()}: {count} line items\n"
+    else:
+        if evidence:
+            answer += f"Based on the available data, I found {len(evidence)} relevant budget items. "
+            answer += "Here's what the data shows:\n\n"
+            
+            # Group by department
+            dept_data = {}
+            for evi in evidence:
+                dept = evi.get("department", "Unknown")
+                if dept not in dept_data:
+                    dept_data[dept] = []
+                dept_data[dept].append(evi)
+            
+            for dept, items in list(dept_data.items())[:3]:
+                answer += f"**{dept.replace('_', ' ').title()}**: {len(items)} budget items\n"
+        else:
+            answer += "I couldn't find specific data matching your question in the budget records."
+    return answer
+
+class AnswerStream:
+    """
+    Async iterator of completion tokens. `complete` turns True only once the
+    LLM stream has finished normally; it stays False when the fallback text
+    was streamed instead or the stream broke off mid-answer, so callers can
+    tell a finished answer from a degraded or truncated one.
+    """
+
+    def __init__(self, messages: List[Dict[str, str]], fallback):
+        self.complete = False
+        self._tokens = self._stream(messages, fallback)
+
+    def __aiter__(self):
+        return self._tokens
+
+    async def _stream(self, messages: List[Dict[str, str]], fallback) -> AsyncIterator[str]:
+        """
+        Yield completion tokens as they arrive. If the LLM fails before the
+        first token, yield the fallback text instead; a failure mid-stream
+        ends the stream with the text received so far.
+        """
+        streamed = False
+        try:
+            async for token in llm_client.stream_chat(messages, model=CHAT_MODEL, temperature=0.2):
+                streamed = True
+                yield token
+        except Exception as e:
+            if streamed:
+                logger.warning("LLM stream interrupted: %s", e)
+                return
+            logger.warning("LLM unavailable, streaming the fallback answer: %s", e)
+            yield fallback()
+            return
+        self.complete = True
+
+async def answer_with_citations(question: str, evidence: List[Dict], total: Optional[float] = None, 
+                               filters: Optional[Dict] = None) -> str:
     """
     Generate answer with citations, including direct totals when available.
     
@@ -183,69 +312,23 @@ def answer_with_citations(question: str, evidence: List[Dict], total: Optional[f
         Formatted answer with citations
     """
     try:
-        # Classify the question type
-        question_type = classify_question(question)
-        
-        # Build context from evidence
-        context = "\n\n".join(
-            f"[{i+1}] FY {e.get('fiscal_year','—')} • {e.get('department','—')}\n{e.get('chunk_text','')}"
-            for i, e in enumerate(evidence[:6])
-        ) or "No evidence."
-        
-        # Get enhanced system prompt based on question type (concise by default)
-        sys = get_enhanced_system_prompt(question_type, total, concise=True)
-        
-        # Build user prompt with additional context
-        user_parts = [f"Question: {question}"]
-        
-        if total is not None:
-            user_parts.append(f"Total: ${total:,.2f}")
-        
-        if filters:
-            user_parts.append(f"Filters Applied: {filters}")
-        
-        user_parts.append(f"Evidence:\n{context}")
-        
-        user = "\n\n".join(user_parts)
-        
-        chat = client.chat.completions.create(
-            model=CHAT_MODEL,
-            messages=[{"role":"system","content":sys},{"role":"user","content":user}],
-            temperature=0.2
-        )
-        return chat.choices[0].message.content.strip()
+        # Concise prompt for the question type
+        messages = _build_messages(question, evidence, total, filters, classify_question(question), concise=True)
+        # Deadline, retries and circuit breaker live in llm_client; any
+        # failure lands in the deterministic fallback below
+        return await llm_client.chat(messages, model=CHAT_MODEL, temperature=0.2)
     except Exception as e:
-        # Enhanced fallback: natural full sentences
-        if total is not None:
-            # Create natural sentence based on question type and filters
-            if filters:
-                filter_parts = []
-                if filters.get("fiscal_year"):
-                    filter_parts.append(f"FY{filters['fiscal_year']}")
-                if filters.get("department"):
-                    filter_parts.append(filters["department"].replace("_", " ").title())
-                if filters.get("line_item"):
-                    filter_parts.append(filters["line_item"])
-                
-                if len(filter_parts) == 1:
-                    answer = f"The total budget for {filter_parts[0]} is ${total:,.2f}."
-                elif len(filter_parts) == 2:
-                    answer = f"The total budget for {filter_parts[1]} in {filter_parts[0]} is ${total:,.2f}."
-                else:
-                    answer = f"The total budget is ${total:,.2f}."
-            else:
-                answer = f"The total budget is ${total:,.2f}."
-        else:
-            # Handle non-total questions
-            if evidence:
-                answer = f"Based on the available data, here are the relevant findings for your question."
-            else:
-                answer = f"I couldn't find specific data matching your question."
-        
-        return answer
+        logger.warning("LLM unavailable, using the fallback answer: %s", e)
+        return fallback_answer(evidence, total, filters)
 
-def generate_detailed_insights(question: str, evidence: List[Dict], total: Optional[float] = None, 
-                             filters: Optional[Dict] = None, question_type: str = "general") -> str:
+def stream_answer_with_citations(question: str, evidence: List[Dict], total: Optional[float] = None,
+                                 filters: Optional[Dict] = None) -> AnswerStream:
+    """Token-by-token version of answer_with_citations (same prompt and fallback)."""
+    messages = _build_messages(question, evidence, total, filters, classify_question(question), concise=True)
+    return AnswerStream(messages, lambda: fallback_answer(evidence, total, filters))
+
+async def generate_detailed_insights(question: str, evidence: List[Dict], total: Optional[float] = None, 
+                                   filters: Optional[Dict] = None, question_type: str = "general") -> str:
     """
     Generate detailed insights for expandable view.
     
@@ -260,89 +343,17 @@ def generate_detailed_insights(question: str, evidence: List[Dict], total: Optio
         Detailed insights with citations
     """
     try:
-        # Build context from evidence
-        context = "\n\n".join(
-            f"[{i+1}] FY {e.get('fiscal_year','—')} • {e.get('department','—')}\n{e.get('chunk_text','')}"
-            for i, e in enumerate(evidence[:6])
-        ) or "No evidence."
-        
-        # Get detailed system prompt
-        sys = get_enhanced_system_prompt(question_type, total, concise=False)
-        
-        # Build user prompt with additional context
-        user_parts = [f"Question: {question}"]
-        
-        if total is not None:
-            user_parts.append(f"Total: ${total:,.2f}")
-        
-        if filters:
-            user_parts.append(f"Filters Applied: {filters}")
-        
-        user_parts.append(f"Evidence:\n{context}")
-        
-        user = "\n\n".join(user_parts)
-        
-        chat = client.chat.completions.create(
-            model=CHAT_MODEL,
-            messages=[{"role":"system","content":sys},{"role":"user","content":user}],
-            temperature=0.2
-        )
-        return chat.choices[0].message.content.strip()
+        # Detailed prompt for the question type
+        messages = _build_messages(question, evidence, total, filters, question_type, concise=False)
+        # Deadline, retries and circuit breaker live in llm_client; any
+        # failure lands in the deterministic fallback below
+        return await llm_client.chat(messages, model=CHAT_MODEL, temperature=0.2)
     except Exception as e:
-        # Enhanced fallback: natural detailed response
-        if total is not None:
-            answer = f"**Detailed Analysis**\n\n"
-            
-            if filters:
-                filter_parts = []
-                if filters.get("fiscal_year"):
-                    filter_parts.append(f"FY{filters['fiscal_year']}")
-                if filters.get("department"):
-                    filter_parts.append(filters["department"].replace("_", " ").title())
-                if filters.get("line_item"):
-                    filter_parts.append(filters["line_item"])
-                
-                if len(filter_parts) == 1:
-                    answer += f"The total budget for {filter_parts[0]} is **${total:,.2f}**.\n\n"
-                elif len(filter_parts) == 2:
-                    answer += f"The total budget for {filter_parts[1]} in {filter_parts[0]} is **${total:,.2f}**.\n\n"
-                else:
-                    answer += f"The total budget is **${total:,.2f}**.\n\n"
-            else:
-                answer += f"The total budget is **${total:,.2f}**.\n\n"
-            
-            # Add context about the data
-            if evidence:
-                answer += f"This total is based on {len(evidence)} budget line items. "
-                answer += "The data includes various categories such as salaries, equipment, and operational expenses.\n\n"
-                
-                # Show top categories
-                dept_counts = {}
-                for evi in evidence:
-                    dept = evi.get("department", "Unknown")
-                    dept_counts[dept] = dept_counts.get(dept, 0) + 1
-                
-                if dept_counts:
-                    answer += "**Breakdown by Department:**\n"
-                    for dept, count in sorted(dept_counts.items(), key=lambda x: x[1], reverse=True)[:5]:
-                        answer += f"- {dept.replace('_', ' ').title()}: {count} line items\n"
-        else:
-            answer = f"**Detailed Analysis**\n\n"
-            if evidence:
-                answer += f"Based on the available data, I found {len(evidence)} relevant budget items. "
-                answer += "Here's what the data shows:\n\n"
-                
-                # Group by department
-                dept_data = {}
-                for evi in evidence:
-                    dept = evi.get("department", "Unknown")
-                    if dept not in dept_data:
-                        dept_data[dept] = []
-                    dept_data[dept].append(evi)
-                
-                for dept, items in list(dept_data.items())[:3]:
-                    answer += f"**{dept.replace('_', ' ').title()}**: {len(items)} budget items\n"
-            else:
-                answer += "I couldn't find specific data matching your question in the budget records."
-        
-        return answer
+        logger.warning("LLM unavailable, using the fallback insights: %s", e)
+        return fallback_insights(evidence, total, filters)
+
+def stream_detailed_insights(question: str, evidence: List[Dict], total: Optional[float] = None,
+                             filters: Optional[Dict] = None, question_type: str = "general") -> AnswerStream:
+    """Token-by-token version of generate_detailed_insights (same prompt and fallback)."""
+    messages = _build_messages(question, evidence, total, filters, question_type, concise=False)
+    return AnswerStream(messages, lambda: fallback_insights(evidence, total, filters))
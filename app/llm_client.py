@@ -0,0 +1,350 @@
+"""
+Resilient OpenAI Client Layer
+
+Wraps the OpenAI SDK so a slow or failing API degrades /ask and /insights
+to their deterministic fallback text instead of tying up workers:
+
+  - AsyncOpenAI for chat completions, so a completion holds no thread;
+    stream_chat yields tokens as they arrive for the streaming endpoints
+  - a per-call deadline covering queueing, retries and the model call
+  - a bounded semaphore capping concurrent OpenAI calls per process
+  - retries with exponential backoff and full jitter on timeouts,
+    connection errors, 429s and 5xx responses
+  - a circuit breaker that opens after consecutive failures, fails fast
+    while open, and lets one probe call through after a cool-down
+  - metrics separating queue time (waiting for the semaphore) from model
+    time (inside the API call), plus time to first token for streams
+
+The synchronous embedding path (app.llm._embed_uncached) shares the same
+breaker and metrics and gets a client-side timeout.
+
+Usage:
+    from app.llm_client import llm_client, LLMUnavailable
+    try:
+        text = await llm_client.chat(messages, model=CHAT_MODEL)
+    except LLMUnavailable:
+        text = fallback
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+import openai
+from openai import AsyncOpenAI, OpenAI
+
+from .metrics import LatencyStats, observe_stage
+
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class LLMUnavailable(Exception):
+    """The call could not be made in time (deadline, open circuit or exhausted retries)."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open -> closed."""
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trips = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """True if a call may go out now; in half-open state only one probe is allowed."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            # A failed probe re-opens; otherwise open once the threshold is reached
+            if self._probe_in_flight or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.trips += 1
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """Give back a half-open probe slot for a call that never reached OpenAI."""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+class LLMClient:
+    """Deadline-, concurrency- and breaker-aware facade over the OpenAI SDK."""
+
+    def __init__(
+        self,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_retries: int = LLM_MAX_RETRIES,
+    ):
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.breaker = CircuitBreaker()
+        self.queue_time = LatencyStats()
+        self.model_time = LatencyStats()
+        self.first_token_time = LatencyStats()
+        self.counters = {"calls": 0, "succeeded": 0, "failed": 0, "retries": 0, "timeouts": 0, "rejected_open": 0}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._async_client: Optional[AsyncOpenAI] = None
+        self._sync_client: Optional[OpenAI] = None
+        self._waiting = 0
+
+    # SDK clients are created lazily so importing the app needs no API key
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        if self._async_client is None:
+            # Retries and deadlines are handled here, not by the SDK
+            self._async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=self.timeout, max_retries=0)
+        return self._async_client
+
+    @property
+    def sync_client(self) -> OpenAI:
+        if self._sync_client is None:
+            self._sync_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=self.timeout, max_retries=self.max_retries)
+        return self._sync_client
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, base * 2^attempt]."""
+        return random.uniform(0, LLM_RETRY_BASE_SECONDS * (2 ** attempt))
+
+    async def _acquire(self, timeout: Optional[float]) -> float:
+        """
+        Pass the breaker and take a concurrency slot.
+
+        Returns:
+            The call's deadline (time.monotonic() based)
+
+        Raises:
+            LLMUnavailable: circuit open, or no slot before the deadline
+        """
+        self.counters["calls"] += 1
+        if not self.breaker.allow():
+            self.counters["rejected_open"] += 1
+            raise LLMUnavailable("OpenAI circuit breaker is open")
+
+        deadline = time.monotonic() + (timeout or self.timeout)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        queued_at = time.monotonic()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=max(0.0, deadline - queued_at))
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            self.counters["failed"] += 1
+            # Queueing timeouts say nothing about OpenAI's health
+            self.breaker.release_probe()
+            raise LLMUnavailable("Timed out waiting for an OpenAI slot")
+        finally:
+            self._waiting -= 1
+        self.queue_time.observe(time.monotonic() - queued_at)
+        return deadline
+
+    async def chat(self, messages: List[Dict[str, str]], model: str, timeout: Optional[float] = None, **kwargs) -> str:
+        """
+        Run a chat completion and return the message text.
+
+        Args:
+            messages: Chat messages
+            model: Model name
+            timeout: Deadline in seconds for the whole call, including queueing and retries
+
+        Raises:
+            LLMUnavailable: deadline exceeded, circuit open or retries exhausted
+        """
+        called = time.monotonic()
+        deadline = await self._acquire(timeout)
+        try:
+            attempt = 0
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.counters["timeouts"] += 1
+                    raise LLMUnavailable("OpenAI call deadline exceeded")
+                started = time.monotonic()
+                try:
+                    resp = await asyncio.wait_for(
+                        self.async_client.chat.completions.create(model=model, messages=messages, **kwargs),
+                        timeout=remaining,
+                    )
+                    self.model_time.observe(time.monotonic() - started)
+                    self.breaker.record_success()
+                    self.counters["succeeded"] += 1
+                    return resp.choices[0].message.content.strip()
+                except RETRYABLE_ERRORS as e:
+                    self.model_time.observe(time.monotonic() - started)
+                    if isinstance(e, (asyncio.TimeoutError, openai.APITimeoutError)):
+                        self.counters["timeouts"] += 1
+                    delay = self._backoff(attempt)
+                    if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                        raise LLMUnavailable(f"OpenAI call failed after {attempt + 1} attempt(s): {type(e).__name__} {e}") from e
+                    attempt += 1
+                    self.counters["retries"] += 1
+                    await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.breaker.release_probe()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            self.counters["failed"] += 1
+            raise
+        finally:
+            observe_stage("llm_completion", time.monotonic() - called)
+            self._semaphore.release()
+
+    async def stream_chat(
+        self, messages: List[Dict[str, str]], model: str, timeout: Optional[float] = None, **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Run a streaming chat completion, yielding text deltas as they arrive.
+
+        Same deadline, concurrency cap and breaker as chat(). Retries only
+        happen before the first token; once text has been yielded a failure
+        ends the stream with LLMUnavailable.
+
+        Args:
+            messages: Chat messages
+            model: Model name
+            timeout: Deadline in seconds for the whole stream, including queueing
+
+        Raises:
+            LLMUnavailable: deadline exceeded, circuit open or retries exhausted
+        """
+        called = time.monotonic()
+        deadline = await self._acquire(timeout)
+        started = time.monotonic()
+        first_token = True
+        finished = False
+        try:
+            attempt = 0
+            while True:
+                try:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    stream = await asyncio.wait_for(
+                        self.async_client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs),
+                        timeout=remaining,
+                    )
+                    async with stream:
+                        chunks = stream.__aiter__()
+                        while True:
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0:
+                                raise asyncio.TimeoutError()
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=remaining)
+                            except StopAsyncIteration:
+                                break
+                            delta = chunk.choices[0].delta.content if chunk.choices else None
+                            if delta:
+                                if first_token:
+                                    self.first_token_time.observe(time.monotonic() - started)
+                                    observe_stage("llm_first_token", time.monotonic() - called)
+                                    first_token = False
+                                yield delta
+                    finished = True
+                    break
+                except RETRYABLE_ERRORS as e:
+                    if isinstance(e, (asyncio.TimeoutError, openai.APITimeoutError)):
+                        self.counters["timeouts"] += 1
+                    delay = self._backoff(attempt)
+                    if not first_token or attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                        raise LLMUnavailable(f"OpenAI stream failed after {attempt + 1} attempt(s): {type(e).__name__} {e}") from e
+                    attempt += 1
+                    self.counters["retries"] += 1
+                    await asyncio.sleep(delay)
+        except (GeneratorExit, asyncio.CancelledError):
+            # The consumer went away (e.g. client disconnect); not OpenAI's fault
+            self.breaker.release_probe()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            self.counters["failed"] += 1
+            raise
+        else:
+            if finished:
+                self.breaker.record_success()
+                self.counters["succeeded"] += 1
+        finally:
+            self.model_time.observe(time.monotonic() - started)
+            observe_stage("llm_completion", time.monotonic() - called)
+            self._semaphore.release()
+
+    def embed_sync(self, texts: List[str], model: str) -> List[list]:
+        """Blocking embeddings call behind the shared breaker; SDK-side timeout and retries."""
+        self.counters["calls"] += 1
+        if not self.breaker.allow():
+            self.counters["rejected_open"] += 1
+            raise LLMUnavailable("OpenAI circuit breaker is open")
+        started = time.monotonic()
+        try:
+            resp = self.sync_client.embeddings.create(model=model, input=texts)
+        except Exception:
+            self.breaker.record_failure()
+            self.counters["failed"] += 1
+            raise
+        finally:
+            self.model_time.observe(time.monotonic() - started)
+        self.breaker.record_success()
+        self.counters["succeeded"] += 1
+        return [d.embedding for d in resp.data]
+
+    def stats(self) -> Dict[str, object]:
+        """Counters, breaker state and queue vs model latency."""
+        return {
+            **self.counters,
+            "in_queue": self._waiting,
+            "max_concurrency": self.max_concurrency,
+            "breaker": {"state": self.breaker.state, "failures": self.breaker.failures, "trips": self.breaker.trips},
+            "queue_time": self.queue_time.snapshot(),
+            "model_time": self.model_time.snapshot(),
+            "first_token_time": self.first_token_time.snapshot(),
+        }
+
+
+llm_client = LLMClient()
@@ -0,0 +1,463 @@
+"""
+Bulk Budget Loader
+
+Loads budget line items into budget_facts with COPY instead of one INSERT
+per row:
+
+  1. the normalized DataFrame is streamed as CSV through
+     COPY ... FROM STDIN into a temporary staging table,
+  2. the staged rows are validated in SQL,
+  3. the new dataset is built in a shadow table (budget_facts_next) with
+     the live table's defaults, constraints, indexes, grants and row-level
+     security policies, and committed,
+  4. the shadow table is swapped in by rename in a short transaction of
+     its own; dependent views are re-pointed at the new table,
+  5. the materialized v_* views (db/migrations/003_materialized_budget_views.sql)
+     are refreshed CONCURRENTLY and the data version is bumped, together.
+
+Readers keep querying the previous table, unblocked, until the swap. The
+swap transaction holds budget_facts' ACCESS EXCLUSIVE lock only for a few
+catalog updates, and waits at most SWAP_LOCK_TIMEOUT for it so it never
+queues in front of new readers behind a long one; it is retried
+SWAP_ATTEMPTS times. The replaced table is kept as budget_facts_v<version>
+and dropped lazily by later loads (RETAIN_RETIRED_TABLES most recent ones
+are kept for rollback), so a load never leaves dead tuples behind in the
+live table. The version is bumped in the refresh transaction, so nothing
+that keys off the data version (the cube, the response caches) can read
+old view contents under the new version. Between the swap and that
+commit, budget_facts already has the new rows while the views and the
+version are still the previous ones.
+
+Usage:
+    from app.loader import normalize_frame, load_budget_frame
+    stats = load_budget_frame(engine, normalize_frame(df, 2024, "Category", "Line_Item", "Amount"))
+"""
+
+import io
+import os
+import re
+import time
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from .db import bump_data_version
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+BUDGET_COLUMNS = ["fiscal_year", "department", "line_item", "amount"]
+COPY_CHUNK_ROWS = 50000
+
+LIVE_TABLE = "budget_facts"
+SHADOW_TABLE = "budget_facts_next"
+RETIRED_PREFIX = "budget_facts_v"
+RETAIN_RETIRED_TABLES = int(os.getenv("RETAIN_RETIRED_TABLES", "1"))
+# Retired tables are only dropped if no reader holds them; never wait on one
+RETIRE_LOCK_TIMEOUT = os.getenv("RETIRE_LOCK_TIMEOUT", "2s")
+# The swap gives up on budget_facts' lock after this long rather than stall
+# readers queued behind it, and is retried up to SWAP_ATTEMPTS times
+SWAP_LOCK_TIMEOUT = os.getenv("SWAP_LOCK_TIMEOUT", "3s")
+SWAP_ATTEMPTS = int(os.getenv("SWAP_ATTEMPTS", "5"))
+SWAP_RETRY_SECONDS = 1.0
+# Arbitrary key serializing concurrent loads
+LOAD_LOCK_KEY = 7245001
+
+
+class LoadError(Exception):
+    """Raised when staged rows fail validation or the swap can't get its lock; budget_facts is untouched."""
+
+
+def normalize_frame(
+    df: pd.DataFrame,
+    fiscal_year: Optional[int],
+    department_col: str,
+    line_item_col: str,
+    amount_col: str,
+    positive_only: bool = True,
+) -> pd.DataFrame:
+    """
+    Map a source CSV frame onto the budget_facts columns.
+
+    Args:
+        df: Raw frame read from a budget CSV
+        fiscal_year: Year to stamp on every row, or None if df already has fiscal_year
+        department_col: Source column holding the category/department
+        line_item_col: Source column holding the line item
+        amount_col: Source column holding the amount
+        positive_only: Drop rows whose amount is missing or not > 0
+
+    Returns:
+        Frame with exactly BUDGET_COLUMNS
+    """
+    out = pd.DataFrame({
+        "fiscal_year": fiscal_year if fiscal_year is not None else df["fiscal_year"],
+        "department": df[department_col] if department_col in df else "Unknown",
+        "line_item": df[line_item_col] if line_item_col in df else "Unknown",
+        "amount": pd.to_numeric(df[amount_col], errors="coerce"),
+    })
+    out["department"] = out["department"].fillna("Unknown")
+    out["line_item"] = out["line_item"].fillna("Unknown")
+    if positive_only:
+        out = out[out["amount"].notna() & (out["amount"] > 0)]
+    return out[BUDGET_COLUMNS]
+
+
+class _CsvStream(io.RawIOBase):
+    """File-like view over an iterator of CSV text chunks, for copy_expert."""
+
+    def __init__(self, chunks: Iterator[str]):
+        self._chunks = chunks
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks).encode("utf-8")
+            except StopIteration:
+                return 0
+        n = min(len(target), len(self._buffer))
+        target[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def _csv_chunks(df: pd.DataFrame) -> Iterator[str]:
+    for start in range(0, len(df), COPY_CHUNK_ROWS):
+        yield df.iloc[start:start + COPY_CHUNK_ROWS].to_csv(index=False, header=False)
+
+
+def copy_into_staging(conn, df: pd.DataFrame) -> None:
+    """Create the staging table on conn's transaction and COPY df into it."""
+    conn.execute(text("""
+        CREATE TEMP TABLE budget_facts_staging (
+          fiscal_year INT,
+          department TEXT,
+          line_item TEXT,
+          amount NUMERIC
+        ) ON COMMIT DROP
+    """))
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(
+            "COPY budget_facts_staging (fiscal_year, department, line_item, amount) FROM STDIN WITH (FORMAT csv)",
+            io.BufferedReader(_CsvStream(_csv_chunks(df[BUDGET_COLUMNS])), buffer_size=1 << 16),
+        )
+    finally:
+        cursor.close()
+
+
+def validate_staging(conn) -> Dict[str, int]:
+    """
+    Check the staged rows before they touch budget_facts.
+
+    Raises:
+        LoadError: if any row is missing a required value
+    """
+    row = conn.execute(text("""
+        SELECT
+          COUNT(*) AS rows,
+          COUNT(*) FILTER (WHERE fiscal_year IS NULL) AS missing_year,
+          COUNT(*) FILTER (WHERE department IS NULL OR department = '') AS missing_department,
+          COUNT(*) FILTER (WHERE line_item IS NULL OR line_item = '') AS missing_line_item,
+          COUNT(*) FILTER (WHERE amount IS NULL) AS missing_amount
+        FROM budget_facts_staging
+    """)).mappings().first()
+    problems = {k: v for k, v in row.items() if k != "rows" and v}
+    if problems:
+        raise LoadError(f"Staged budget rows failed validation: {problems}")
+    return dict(row)
+
+
+def _index_signature(indexdef: str) -> str:
+    """Index definition with its name and table removed, for matching live and shadow indexes."""
+    return re.sub(r"INDEX \S+ ON \S+", "INDEX ON", indexdef)
+
+
+def _table_indexes(conn, table: str) -> List[Dict[str, str]]:
+    return [dict(row) for row in conn.execute(text("""
+        SELECT indexrelid::regclass::text AS name, pg_get_indexdef(indexrelid) AS indexdef
+        FROM pg_index
+        WHERE indrelid = to_regclass(:table)
+        ORDER BY indexrelid
+    """), {"table": table}).mappings()]
+
+
+def _dependent_views(conn) -> List[Dict[str, str]]:
+    """Views that read budget_facts directly, with the definitions to re-create them."""
+    return [dict(row) for row in conn.execute(text("""
+        SELECT DISTINCT c.oid::regclass::text AS name,
+               pg_get_viewdef(c.oid) AS definition,
+               array_to_string(c.reloptions, ', ') AS options
+        FROM pg_depend d
+        JOIN pg_rewrite r ON r.oid = d.objid
+        JOIN pg_class c ON c.oid = r.ev_class
+        WHERE d.classid = 'pg_rewrite'::regclass
+          AND d.refobjid = to_regclass(:table)
+          AND c.relkind = 'v'
+    """), {"table": LIVE_TABLE}).mappings()]
+
+
+def build_shadow_table(conn, replace_all: bool) -> None:
+    """
+    Create budget_facts_next shaped like budget_facts and fill it from staging.
+
+    Args:
+        conn: Connection inside the load transaction, with staging populated
+        replace_all: Start empty; otherwise carry over the live rows for the
+            fiscal years that are not being replaced
+    """
+    conn.execute(text(f"DROP TABLE IF EXISTS {SHADOW_TABLE}"))
+    conn.execute(text(f"CREATE TABLE {SHADOW_TABLE} (LIKE {LIVE_TABLE} INCLUDING ALL)"))
+
+    # LIKE does not copy foreign keys
+    for (definition,) in conn.execute(text("""
+        SELECT pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = to_regclass(:table) AND contype = 'f'
+    """), {"table": LIVE_TABLE}):
+        conn.execute(text(f"ALTER TABLE {SHADOW_TABLE} ADD {definition}"))
+
+    # ...nor privileges granted to other roles (e.g. the API's read-only role)
+    for grantee, privilege in conn.execute(text("""
+        SELECT CASE WHEN grantee = 'PUBLIC' THEN 'PUBLIC' ELSE quote_ident(grantee) END,
+               privilege_type
+        FROM information_schema.role_table_grants
+        WHERE table_schema = current_schema() AND table_name = :table AND grantee <> grantor
+    """), {"table": LIVE_TABLE}):
+        conn.execute(text(f"GRANT {privilege} ON {SHADOW_TABLE} TO {grantee}"))
+
+    if not replace_all:
+        columns = ", ".join(
+            name for (name,) in conn.execute(text("""
+                SELECT quote_ident(attname) FROM pg_attribute
+                WHERE attrelid = to_regclass(:table) AND attnum > 0 AND NOT attisdropped
+                ORDER BY attnum
+            """), {"table": LIVE_TABLE})
+        )
+        conn.execute(text(f"""
+            INSERT INTO {SHADOW_TABLE} ({columns})
+            SELECT {columns} FROM {LIVE_TABLE}
+            WHERE fiscal_year IS NULL
+               OR fiscal_year NOT IN (SELECT DISTINCT fiscal_year FROM budget_facts_staging)
+        """))
+
+    conn.execute(text(f"""
+        INSERT INTO {SHADOW_TABLE} (fiscal_year, department, line_item, amount)
+        SELECT fiscal_year, department, line_item, amount
+        FROM budget_facts_staging
+    """))
+    # After the inserts: with FORCE ROW LEVEL SECURITY the policies would apply to them
+    _copy_row_security(conn)
+    conn.execute(text(f"ANALYZE {SHADOW_TABLE}"))
+
+
+def _copy_row_security(conn) -> None:
+    """
+    Give the shadow table the live table's row-level security: the
+    ENABLE / FORCE flags and every policy. LIKE ... INCLUDING ALL copies
+    neither, and a swap without them would leave budget_facts readable by
+    every role with SELECT (e.g. Supabase's anon role).
+    """
+    enabled, forced = conn.execute(text("""
+        SELECT relrowsecurity, relforcerowsecurity FROM pg_class WHERE oid = to_regclass(:table)
+    """), {"table": LIVE_TABLE}).one()
+    for name, permissive, command, roles, using, check in conn.execute(text("""
+        SELECT quote_ident(policyname), permissive, cmd,
+               (SELECT string_agg(CASE WHEN r = 'public' THEN 'PUBLIC' ELSE quote_ident(r) END, ', ')
+                FROM unnest(roles) AS r),
+               qual, with_check
+        FROM pg_policies
+        WHERE schemaname = current_schema() AND tablename = :table
+    """), {"table": LIVE_TABLE}):
+        clauses = f" USING ({using})" if using else ""
+        clauses += f" WITH CHECK ({check})" if check else ""
+        conn.execute(text(f"CREATE POLICY {name} ON {SHADOW_TABLE} AS {permissive} FOR {command} TO {roles}{clauses}"))
+    if enabled:
+        conn.execute(text(f"ALTER TABLE {SHADOW_TABLE} ENABLE ROW LEVEL SECURITY"))
+    if forced:
+        conn.execute(text(f"ALTER TABLE {SHADOW_TABLE} FORCE ROW LEVEL SECURITY"))
+
+
+def live_data_version(conn) -> int:
+    """The data version of the rows currently in budget_facts (0 if none recorded)."""
+    if not conn.execute(text("SELECT to_regclass('data_version') IS NOT NULL")).scalar():
+        return 0
+    return conn.execute(text("SELECT version FROM data_version WHERE id = 1")).scalar() or 0
+
+
+def swap_in_shadow_table(conn, live_version: int) -> str:
+    """
+    Atomically replace budget_facts with budget_facts_next.
+
+    The live table is renamed to budget_facts_v<live_version>, its index names
+    and id sequence move to the new table, and views reading budget_facts
+    are re-created so they follow the rename.
+
+    Args:
+        conn: Connection in the (short) swap transaction
+        live_version: Data version of the rows being retired
+
+    Returns:
+        Name of the retired table
+    """
+    retired = f"{RETIRED_PREFIX}{live_version}"
+    views = _dependent_views(conn)
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": LIVE_TABLE}).scalar()
+    live_indexes = _table_indexes(conn, LIVE_TABLE)
+    shadow_indexes = {_index_signature(ix["indexdef"]): ix["name"] for ix in _table_indexes(conn, SHADOW_TABLE)}
+
+    conn.execute(text(f"DROP TABLE IF EXISTS {retired}"))
+    conn.execute(text(f"ALTER TABLE {LIVE_TABLE} RENAME TO {retired}"))
+    conn.execute(text(f"ALTER TABLE {SHADOW_TABLE} RENAME TO {LIVE_TABLE}"))
+
+    # Keep the canonical index (and constraint) names on the live table
+    for i, ix in enumerate(live_indexes):
+        shadow_name = shadow_indexes.get(_index_signature(ix["indexdef"]))
+        if shadow_name is None:
+            continue
+        conn.execute(text(f"ALTER INDEX {ix['name']} RENAME TO {retired}_idx{i}"))
+        conn.execute(text(f"ALTER INDEX {shadow_name} RENAME TO {ix['name']}"))
+        shadow_indexes.pop(_index_signature(ix["indexdef"]))
+
+    # The id sequence is shared; it must outlive the retired table
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {LIVE_TABLE}.id"))
+
+    for view in views:
+        options = f" WITH ({view['options']})" if view["options"] else ""
+        conn.exec_driver_sql(f"CREATE OR REPLACE VIEW {view['name']}{options} AS {view['definition']}")
+
+    return retired
+
+
+def _is_lock_timeout(error: DBAPIError) -> bool:
+    return getattr(error.orig, "pgcode", None) == "55P03"  # lock_not_available
+
+
+def swap_with_retry(conn, attempts: int = SWAP_ATTEMPTS) -> str:
+    """
+    Run swap_in_shadow_table in its own transaction under SWAP_LOCK_TIMEOUT.
+
+    The shadow table is already committed, so a swap that times out on the
+    lock is rolled back and simply tried again.
+
+    Raises:
+        LoadError: if every attempt timed out waiting for the lock
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            with conn.begin():
+                conn.execute(text("SELECT set_config('lock_timeout', :timeout, true)"), {"timeout": SWAP_LOCK_TIMEOUT})
+                return swap_in_shadow_table(conn, live_data_version(conn))
+        except DBAPIError as e:
+            if not _is_lock_timeout(e):
+                raise
+            logger.warning("Table swap timed out waiting for budget_facts lock",
+                           extra={"attempt": attempt, "attempts": attempts})
+            time.sleep(SWAP_RETRY_SECONDS)
+    raise LoadError(f"Could not lock {LIVE_TABLE} for the swap after {attempts} attempts; "
+                    f"{SHADOW_TABLE} is left in place")
+
+
+def refresh_budget_views(conn) -> bool:
+    """
+    Refresh the materialized v_* views from the current budget_facts.
+
+    Uses refresh_budget_views() from db/migrations/003_materialized_budget_views.sql,
+    which runs REFRESH MATERIALIZED VIEW CONCURRENTLY in dependency order so
+    readers of the views are never blocked. Databases without that
+    migration still have plain views and need no refresh.
+
+    Returns:
+        True if the views were refreshed, False if the migration isn't applied
+    """
+    installed = conn.execute(text("SELECT to_regprocedure('refresh_budget_views()') IS NOT NULL")).scalar()
+    if installed:
+        conn.execute(text("SELECT refresh_budget_views()"))
+    return bool(installed)
+
+
+def drop_retired_tables(engine, keep: int = RETAIN_RETIRED_TABLES) -> List[str]:
+    """
+    Drop retired budget_facts_v<n> tables beyond the newest `keep`.
+
+    Tables still held by an in-flight reader are skipped and retried on the
+    next call, so this never blocks queries.
+
+    Returns:
+        Names of the tables that were dropped
+    """
+    with engine.connect() as conn:
+        names = [
+            name for (name,) in conn.execute(text("""
+                SELECT tablename FROM pg_tables
+                WHERE schemaname = current_schema() AND tablename ~ :pattern
+            """), {"pattern": f"^{RETIRED_PREFIX}[0-9]+$"})
+        ]
+    names.sort(key=lambda name: int(name[len(RETIRED_PREFIX):]), reverse=True)
+
+    dropped = []
+    for name in names[keep:]:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("SELECT set_config('lock_timeout', :timeout, true)"), {"timeout": RETIRE_LOCK_TIMEOUT})
+                conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+        except Exception as e:
+            logger.warning("Skipping retired table %s for now: %s", name, e)
+    return dropped
+
+
+def load_budget_frame(engine, df: pd.DataFrame, replace_all: bool = True) -> Dict[str, float]:
+    """
+    Bulk load normalized budget rows and swap them in atomically.
+
+    Args:
+        engine: SQLAlchemy engine for the target database
+        df: Frame with BUDGET_COLUMNS (see normalize_frame)
+        replace_all: Replace the whole table; otherwise only the fiscal
+            years present in df are replaced
+
+    Returns:
+        Dictionary with rows, seconds, rows_per_sec, version, the retired
+        table name and whether the materialized views were refreshed
+    """
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        # Session-level, so concurrent loads stay serialized across the three transactions
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": LOAD_LOCK_KEY})
+        conn.commit()
+        try:
+            with conn.begin():
+                copy_into_staging(conn, df)
+                checked = validate_staging(conn)
+                build_shadow_table(conn, replace_all)
+
+            retired = swap_with_retry(conn)
+
+            # Outside the swap transaction: REFRESH only needs a share lock on
+            # budget_facts, so readers are not held up while it runs
+            with conn.begin():
+                views_refreshed = refresh_budget_views(conn)
+                version = bump_data_version(conn)
+        finally:
+            conn.rollback()
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOAD_LOCK_KEY})
+            conn.commit()
+
+    seconds = time.perf_counter() - start
+    rows = checked["rows"]
+    drop_retired_tables(engine)
+    return {
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds if seconds else float(rows),
+        "version": version,
+        "retired": retired,
+        "views_refreshed": views_refreshed,
+    }
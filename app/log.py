@@ -0,0 +1,178 @@
+"""
+Structured, Non-Blocking Logging
+
+Request-path code logs through the standard logging module instead of
+print(). Records are handed to a queue in the calling thread and written
+to stdout by a single listener thread, so a request never waits on a
+stdout write or formats a record. Output is one JSON object per line, or
+plain text with LOG_FORMAT=text.
+
+  - Correlation IDs: request_id_middleware takes X-Request-ID from the
+    request (or generates one), returns it on the response, and stamps it
+    on every record logged while serving the request, including records
+    from worker threads started with run_in_db_thread.
+  - Sampling: DEBUG records are kept with probability LOG_DEBUG_SAMPLE_RATE,
+    so high-volume debug events can stay on in production. INFO and above
+    are always kept.
+  - Structured fields: keyword arguments passed via `extra=` become
+    top-level JSON keys.
+
+Usage:
+    from app.log import get_logger
+    logger = get_logger(__name__)
+    logger.debug("intent parsed", extra={"action": intent.get("action")})
+
+    # once, at startup (app/main.py does this)
+    from app.log import configure_logging, request_id_middleware
+    configure_logging()
+    app.middleware("http")(request_id_middleware)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import Request
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+# Records beyond this many waiting for the writer are dropped, not waited on
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+REQUEST_ID_HEADER = "X-Request-ID"
+ROOT_LOGGER = "app"
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the "app" hierarchy (app.main, app.rag, ...)."""
+    return logging.getLogger(name if name.startswith(ROOT_LOGGER) else f"{ROOT_LOGGER}.{name}")
+
+
+class _ContextFilter(logging.Filter):
+    """Stamp the current request's correlation ID on each record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class _DebugSampler(logging.Filter):
+    """Keep DEBUG records with probability `rate`; never drop INFO and above."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue records without formatting them and without blocking.
+
+    The stock QueueHandler formats the message in the calling thread (so the
+    record can be pickled); with an in-process queue that work can be left
+    to the listener. When the queue is full the record is dropped.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+        if fields:
+            line += " " + " ".join(f"{k}={v!r}" for k, v in fields.items())
+        return line
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, debug_sample_rate: float = LOG_DEBUG_SAMPLE_RATE):
+    """
+    Route the "app" loggers through a bounded queue to a stdout writer thread.
+
+    Safe to call more than once; later calls are no-ops.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+
+    handler = _NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(_DebugSampler(debug_sample_rate))
+    handler.addFilter(_ContextFilter())
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(level)
+    logger.handlers = [handler]
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(handler.queue, stream, respect_handler_level=False)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+async def request_id_middleware(request: Request, call_next):
+    """Bind a correlation ID to the request (from X-Request-ID or a new one) and echo it back."""
+    # Bounded so a client-supplied ID cannot bloat every log line
+    request_id = (request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex)[:128]
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    return response
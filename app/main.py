@@ -1,20 +1,56 @@
 # app/main.py
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from sqlalchemy import text
-from .rag import retrieve, get_aggregated_answer, get_comparison_data
-from .llm import answer_with_citations, classify_question, generate_detailed_insights
+from .rag import retrieve, embed_query, get_aggregated_answer, get_comparison_data
+from .llm import (
+    answer_with_citations, classify_question, generate_detailed_insights,
+    stream_answer_with_citations, stream_detailed_insights, fallback_answer, fallback_insights,
+)
+from .llm_client import llm_client
 from .qa import get_category_comparison, get_trend_analysis, get_breakdown_analysis, parse_filters
-from .db import engine
+from .question_parser import DEPARTMENT_ALIASES, parse_question
+from .db import engine, run_in_db_thread, current_data_version, pool_stats, release_read_connection, request_unit_of_work
+from .statements import statements
+from .cube import get_cube, load_cube, start_cube_refresher, register_refresh_hook
+from .vocabulary import load_vocabulary, refresh_vocabulary_if_stale
+from .entity_index import get_entity_resolver
+from .cache import response_cache_middleware, response_cache
+from .answer_cache import answer_cache
+from .result_store import result_store
+from .embedding_cache import embedding_cache
+from .log import configure_logging, get_logger, request_id_middleware
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, observe_request, render as render_metrics, stage_timer
+from . import streaming
+import asyncio
+import itertools
 import os
+import time
 import httpx
 import re
+import json
+import base64
+from decimal import Decimal
+
+configure_logging()
+logger = get_logger(__name__)
 
 app = FastAPI(title="Landover Agents API")
 
+# Precedence of the original per-branch if-chains when a question names more
+# than one of these departments (substring match, first in the tuple wins).
+# Other vocabulary departments are used only when none of these is named.
+DEPARTMENT_PRECEDENCE = ("taxes", "police", "public works", "administration", "grants")
+SCENARIO_CUT_PRECEDENCE = ("police", "taxes", "administration", "public works", "grants")
+
+def _named_department(parsed, precedence=DEPARTMENT_PRECEDENCE) -> Optional[str]:
+    named = next((phrase for phrase in precedence if parsed.has(phrase)), None)
+    return DEPARTMENT_ALIASES[named] if named else parsed.department
+
 def get_intent_from_question(question: str):
     """
     Use LLM to convert natural language question into structured intent.
@@ -84,24 +120,23 @@ ASSISTANT:
     try:
         # For now, let's use simple pattern matching as a fallback
         # This will be replaced with proper LLM intent recognition once the API is working
-        question_lower = question.lower()
+        parsed = parse_question(question)
         
         # Simple pattern matching fallback
-        if "total budget" in question_lower or "total for" in question_lower:
-            year_match = re.search(r"fy(\d{2,4})", question_lower)
-            year = f"FY{year_match.group(1)}" if year_match else "FY25"
+        if parsed.has("total budget") or parsed.has("total for"):
+            year = parsed.fy_labels[0] if parsed.fy_labels else "FY25"
             return {"action": "year_total", "year": year}
         
-        elif "difference" in question_lower:
+        elif parsed.has("difference"):
             # Extract both years from the question
-            year_matches = re.findall(r"fy(\d{2,4})", question_lower)
+            year_matches = parsed.fy_labels
             if len(year_matches) >= 2:
-                year1 = f"FY{year_matches[0]}"
-                year2 = f"FY{year_matches[1]}"
+                year1 = year_matches[0]
+                year2 = year_matches[1]
                 return {"action": "yoy_difference", "year_from": year1, "year_to": year2}
             elif len(year_matches) == 1:
                 # If only one year specified, assume comparison with previous year
-                year = f"FY{year_matches[0]}"
+                year = year_matches[0]
                 if year == "FY25":
                     return {"action": "yoy_difference", "year_from": "FY24", "year_to": "FY25"}
                 elif year == "FY26":
@@ -110,54 +145,30 @@ ASSISTANT:
                 # Default to FY24 to FY25 if no years found
                 return {"action": "yoy_difference", "year_from": "FY24", "year_to": "FY25"}
         
-        elif "percentage" in question_lower or "make up" in question_lower:
-            year_match = re.search(r"fy(\d{2,4})", question_lower)
-            year = f"FY{year_match.group(1)}" if year_match else "FY25"
-            if "taxes" in question_lower:
-                return {"action": "category_share", "year": year, "category": "TAXES"}
-            elif "police" in question_lower:
-                return {"action": "category_share", "year": year, "category": "POLICE DEPARTMENT"}
-            elif "public works" in question_lower:
-                return {"action": "category_share", "year": year, "category": "PUBLIC WORKS"}
-            elif "administration" in question_lower:
-                return {"action": "category_share", "year": year, "category": "ADMINISTRATION"}
-            elif "grants" in question_lower:
-                return {"action": "category_share", "year": year, "category": "GRANTS"}
-            else:
-                # If no specific category mentioned, default to taxes
-                return {"action": "category_share", "year": year, "category": "TAXES"}
+        elif parsed.has("percentage") or parsed.has("make up"):
+            year = parsed.fy_labels[0] if parsed.fy_labels else "FY25"
+            # Any department in the budget vocabulary; default to taxes if none is named
+            return {"action": "category_share", "year": year, "category": _named_department(parsed) or "TAXES"}
         
-        elif "most funding" in question_lower or "highest" in question_lower:
-            year_match = re.search(r"fy(\d{2,4})", question_lower)
-            year = f"FY{year_match.group(1)}" if year_match else "FY25"
+        elif parsed.has("most funding") or parsed.has("highest"):
+            year = parsed.fy_labels[0] if parsed.fy_labels else "FY25"
             return {"action": "category_rank", "year": year, "top_n": 5}
         
-        elif "show me" in question_lower or "spending" in question_lower:
-            year_match = re.search(r"fy(\d{2,4})", question_lower)
-            year = f"FY{year_match.group(1)}" if year_match else "FY25"
-            if "public works" in question_lower:
+        elif parsed.has("show me") or parsed.has("spending"):
+            year = parsed.fy_labels[0] if parsed.fy_labels else "FY25"
+            if parsed.has("public works"):
                 return {"action": "category_rank", "year": year, "top_n": 10}
         
         # Percent change questions
-        elif "percent change" in question_lower or "change from" in question_lower:
+        elif parsed.has("percent change") or parsed.has("change from"):
             # Extract both years
-            year_matches = re.findall(r"fy(\d{2,4})", question_lower)
+            year_matches = parsed.fy_labels
             if len(year_matches) >= 2:
-                year_from = f"FY{year_matches[0]}"
-                year_to = f"FY{year_matches[1]}"
+                year_from = year_matches[0]
+                year_to = year_matches[1]
                 
                 # Extract category
-                category = None
-                if "taxes" in question_lower:
-                    category = "TAXES"
-                elif "police" in question_lower:
-                    category = "POLICE DEPARTMENT"
-                elif "public works" in question_lower:
-                    category = "PUBLIC WORKS"
-                elif "administration" in question_lower:
-                    category = "ADMINISTRATION"
-                elif "grants" in question_lower:
-                    category = "GRANTS"
+                category = _named_department(parsed)
                 
                 if category:
                     return {
@@ -169,17 +180,15 @@ ASSISTANT:
                     }
         
         # Scenario cuts
-        elif any(phrase in question_lower for phrase in ["cut", "reduce", "budget cut"]):
+        elif any(parsed.has(phrase) for phrase in ["cut", "reduce", "budget cut"]):
             # Extract percentage
-            percent_match = re.search(r"(\d+)%", question_lower)
-            cut_pct = float(percent_match.group(1)) if percent_match else 0
+            cut_pct = parsed.percent or 0
             
             # Extract year
-            year_match = re.search(r"fy(\d{2,4})", question_lower)
-            year = f"FY{year_match.group(1)}" if year_match else "FY25"
+            year = parsed.fy_labels[0] if parsed.fy_labels else "FY25"
             
             # Determine scope
-            if "all departments" in question_lower or "across" in question_lower:
+            if parsed.has("all departments") or parsed.has("across"):
                 return {
                     "action": "scenario_cut",
                     "year": year,
@@ -188,17 +197,7 @@ ASSISTANT:
                 }
             else:
                 # Extract category for specific cut
-                category = None
-                if "police" in question_lower:
-                    category = "POLICE DEPARTMENT"
-                elif "taxes" in question_lower:
-                    category = "TAXES"
-                elif "administration" in question_lower:
-                    category = "ADMINISTRATION"
-                elif "public works" in question_lower:
-                    category = "PUBLIC WORKS"
-                elif "grants" in question_lower:
-                    category = "GRANTS"
+                category = _named_department(parsed, SCENARIO_CUT_PRECEDENCE)
                 
                 if category:
                     return {
@@ -210,27 +209,15 @@ ASSISTANT:
                     }
         
         # What-if / Forecasting scenarios (legacy support)
-        elif any(phrase in question_lower for phrase in ["if ", "what if", "increase", "decrease", "lose", "gain", "hypothetical"]):
+        elif any(parsed.has(phrase) for phrase in ["if ", "what if", "increase", "decrease", "lose", "gain", "hypothetical"]):
             # Extract percentage change
-            percent_match = re.search(r"(\d+)%", question_lower)
-            percentage = float(percent_match.group(1)) if percent_match else 0
+            percentage = parsed.percent or 0
             
             # Extract category
-            category = None
-            if "taxes" in question_lower:
-                category = "TAXES"
-            elif "police" in question_lower:
-                category = "POLICE DEPARTMENT"
-            elif "public works" in question_lower:
-                category = "PUBLIC WORKS"
-            elif "administration" in question_lower:
-                category = "ADMINISTRATION"
-            elif "grants" in question_lower:
-                category = "GRANTS"
+            category = _named_department(parsed)
             
             # Extract year
-            year_match = re.search(r"fy(\d{2,4})", question_lower)
-            year = f"FY{year_match.group(1)}" if year_match else "FY25"
+            year = parsed.fy_labels[0] if parsed.fy_labels else "FY25"
             
             if category and percentage:
                 return {
@@ -238,14 +225,14 @@ ASSISTANT:
                     "year": year, 
                     "category": category, 
                     "percentage_change": percentage,
-                    "scenario_type": "increase" if "increase" in question_lower or "gain" in question_lower else "decrease"
+                    "scenario_type": "increase" if parsed.has("increase") or parsed.has("gain") else "decrease"
                 }
         
         else:
             return {"action": "help", "question": "I couldn't understand your question. Could you rephrase it?"}
             
-    except Exception as e:
-        print(f"DEBUG: Error getting intent: {e}")
+    except Exception:
+        logger.warning("Intent extraction failed", exc_info=True)
         return {"action": "help", "question": "I encountered an error. Could you rephrase your question?"}
 
 def try_budget_api_answer(question: str):
@@ -254,181 +241,140 @@ def try_budget_api_answer(question: str):
     Uses LLM to parse intent, then calls deterministic APIs.
     """
     try:
-        print(f"DEBUG: try_budget_api_answer called with: {question}")
-        
         # Get structured intent from LLM
-        intent = get_intent_from_question(question)
-        print(f"DEBUG: Got intent: {intent}")
+        with stage_timer("intent_parse"):
+            intent = get_intent_from_question(question)
         
         # Handle the intent with deterministic API calls
         result = handle_intent_deterministically(intent)
-        print(f"DEBUG: Got result: {result}")
+        logger.debug("Budget API intent", extra={"intent": intent, "answered": result is not None})
         
         return result
         
-    except Exception as e:
-        print(f"Error in try_budget_api_answer: {e}")
+    except Exception:
+        logger.warning("Budget API answer failed", exc_info=True)
         return None
 
 def handle_intent_deterministically(intent):
     """
-    Handle structured intent with deterministic database queries.
+    Handle structured intent with deterministic lookups against the in-memory
+    budget cube (a snapshot of the v_* views, see app/cube.py).
     """
     try:
         action = intent.get("action")
+        cube = get_cube()
+        
+        # Map typos and abbreviations ("Payrol taxes", "Admin") onto canonical names
+        resolver = get_entity_resolver(cube)
+        if intent.get("category"):
+            intent = {**intent, "category": resolver.category(intent["category"])}
+        if intent.get("line_item"):
+            year = intent.get("year", "FY25")
+            category = intent.get("category", "")
+            intent = {**intent, "line_item": resolver.line_item(
+                intent["line_item"],
+                accept=lambda name: cube.line_item_total(year, category, name) is not None,
+            )}
         
         if action == "year_total":
             year = intent.get("year", "FY25")
-            with engine.begin() as conn:
-                result = conn.execute(text("SELECT total FROM v_year_totals WHERE fiscal_year = :year"), {"year": year})
-                row = result.fetchone()
-                if row:
-                    total = row[0]
-                    partial_note = " Note: FY26 data is partial." if year == "FY26" else ""
-                    return {
-                        "answer": f"Total {year} budget: ${total:,}. Source: v_year_totals({year}).{partial_note}",
-                        "evidence": [{"fiscal_year": year, "total": total}],
-                        "total": total,
-                        "filters": {"fiscal_year": year},
-                        "question_type": "year_total"
-                    }
+            total = cube.year_total(year)
+            if total is not None:
+                partial_note = " Note: FY26 data is partial." if year == "FY26" else ""
+                return {
+                    "answer": f"Total {year} budget: ${total:,}. Source: v_year_totals({year}).{partial_note}",
+                    "evidence": [{"fiscal_year": year, "total": total}],
+                    "total": total,
+                    "filters": {"fiscal_year": year},
+                    "question_type": "year_total"
+                }
         
         elif action == "yoy_difference":
             year_from = intent.get("year_from", "FY24")
             year_to = intent.get("year_to", "FY25")
-            with engine.begin() as conn:
-                result = conn.execute(text("""
-                    SELECT fiscal_year, total FROM v_year_totals 
-                    WHERE fiscal_year IN (:year_from, :year_to)
-                    ORDER BY fiscal_year
-                """), {"year_from": year_from, "year_to": year_to})
-                rows = result.fetchall()
-                
-                if len(rows) == 2:
-                    from_total = rows[0][1] if rows[0][0] == year_from else rows[1][1]
-                    to_total = rows[1][1] if rows[1][0] == year_to else rows[0][1]
-                    delta = to_total - from_total
-                    partial_note = " Note: FY26 data is partial." if year_to == "FY26" or year_from == "FY26" else ""
-                    return {
-                        "answer": f"Change from {year_from} to {year_to}: ${delta:,} (${from_total:,} → ${to_total:,}). Source: v_year_yoy.{partial_note}",
-                        "evidence": [
-                            {"fiscal_year": year_from, "total": from_total},
-                            {"fiscal_year": year_to, "total": to_total}
-                        ],
-                        "total": to_total,
-                        "filters": {"year_from": year_from, "year_to": year_to},
-                        "question_type": "yoy_difference"
-                    }
-        
-        elif action == "yoy_all":
-            with engine.begin() as conn:
-                result = conn.execute(text("""
-                    SELECT fiscal_year, total, yoy_change FROM v_year_yoy ORDER BY fiscal_year
-                """))
-                rows = result.fetchall()
-                
-                lines = []
-                for row in rows:
-                    fiscal_year, total, yoy_change = row
-                    if yoy_change is None:
-                        lines.append(f"{fiscal_year}: base ${total:,}")
-                    else:
-                        sign = "+" if yoy_change >= 0 else "−"
-                        lines.append(f"{fiscal_year}: {sign}${abs(yoy_change):,} (total ${total:,})")
-                
-                partial_note = " Note: FY26 data is partial." if any(row[0] == "FY26" for row in rows) else ""
+            from_total = cube.year_total(year_from)
+            to_total = cube.year_total(year_to)
+            
+            if from_total is not None and to_total is not None and year_from != year_to:
+                delta = to_total - from_total
+                partial_note = " Note: FY26 data is partial." if year_to == "FY26" or year_from == "FY26" else ""
                 return {
-                    "answer": f"Year-over-year changes:\n- " + "\n- ".join(lines) + f"\nSource: v_year_yoy.{partial_note}",
-                    "evidence": [{"fiscal_year": row[0], "total": row[1], "yoy_change": row[2]} for row in rows],
-                    "filters": {"action": "yoy_all"},
-                    "question_type": "yoy_all"
+                    "answer": f"Change from {year_from} to {year_to}: ${delta:,} (${from_total:,} → ${to_total:,}). Source: v_year_yoy.{partial_note}",
+                    "evidence": [
+                        {"fiscal_year": year_from, "total": from_total},
+                        {"fiscal_year": year_to, "total": to_total}
+                    ],
+                    "total": to_total,
+                    "filters": {"year_from": year_from, "year_to": year_to},
+                    "question_type": "yoy_difference"
                 }
         
+        elif action == "yoy_all":
+            rows = cube.year_yoy()
+            
+            lines = []
+            for row in rows:
+                fiscal_year, total, yoy_change = row
+                if yoy_change is None:
+                    lines.append(f"{fiscal_year}: base ${total:,}")
+                else:
+                    sign = "+" if yoy_change >= 0 else "−"
+                    lines.append(f"{fiscal_year}: {sign}${abs(yoy_change):,} (total ${total:,})")
+            
+            partial_note = " Note: FY26 data is partial." if any(row[0] == "FY26" for row in rows) else ""
+            return {
+                "answer": f"Year-over-year changes:\n- " + "\n- ".join(lines) + f"\nSource: v_year_yoy.{partial_note}",
+                "evidence": [{"fiscal_year": row[0], "total": row[1], "yoy_change": row[2]} for row in rows],
+                "filters": {"action": "yoy_all"},
+                "question_type": "yoy_all"
+            }
+        
         elif action == "category_rank":
             year = intent.get("year", "FY25")
             top_n = intent.get("top_n", 10)
-            with engine.begin() as conn:
-                result = conn.execute(text("""
-                    SELECT category, total FROM v_category_totals 
-                    WHERE fiscal_year = :year ORDER BY total DESC LIMIT :limit
-                """), {"year": year, "limit": top_n})
-                rows = result.fetchall()
-                
-                if rows:
-                    lines = [f"{i+1}. {row[0]}: ${row[1]:,}" for i, row in enumerate(rows)]
-                    partial_note = " Note: FY26 data is partial." if year == "FY26" else ""
-                    return {
-                        "answer": f"Top {top_n} categories in {year}:\n" + "\n".join(lines) + f"\nSource: v_category_totals({year}).{partial_note}",
-                        "evidence": [{"category": row[0], "total": row[1], "fiscal_year": year} for row in rows],
-                        "filters": {"year": year, "top_n": top_n},
-                        "question_type": "category_rank"
-                    }
+            rows = cube.category_totals(year, limit=top_n)
+            
+            if rows:
+                lines = [f"{i+1}. {row[0]}: ${row[1]:,}" for i, row in enumerate(rows)]
+                partial_note = " Note: FY26 data is partial." if year == "FY26" else ""
+                return {
+                    "answer": f"Top {top_n} categories in {year}:\n" + "\n".join(lines) + f"\nSource: v_category_totals({year}).{partial_note}",
+                    "evidence": [{"category": row[0], "total": row[1], "fiscal_year": year} for row in rows],
+                    "filters": {"year": year, "top_n": top_n},
+                    "question_type": "category_rank"
+                }
         
         elif action == "category_share":
             year = intent.get("year", "FY25")
             category = intent.get("category", "").upper()
-            with engine.begin() as conn:
-                # Try to get percentage from v_category_shares first
-                result = conn.execute(text("""
-                    SELECT pct_of_year, total FROM v_category_shares 
-                    WHERE fiscal_year = :year AND UPPER(category) = UPPER(:category)
-                """), {"year": year, "category": category})
-                row = result.fetchone()
-                
-                if row:
-                    percentage, total = row
-                    partial_note = " Note: FY26 data is partial." if year == "FY26" else ""
-                    return {
-                        "answer": f"{category} in {year}: ${total:,} ({percentage}% of total). Source: v_category_shares({year}).{partial_note}",
-                        "evidence": [{"category": category, "total": total, "percentage": percentage, "fiscal_year": year}],
-                        "total": total,
-                        "filters": {"year": year, "category": category},
-                        "question_type": "category_share"
-                    }
-                else:
-                    # Calculate percentage manually if view doesn't exist
-                    result = conn.execute(text("""
-                        SELECT c.total as category_total, y.total as year_total
-                        FROM v_category_totals c
-                        JOIN v_year_totals y ON y.fiscal_year = c.fiscal_year
-                        WHERE c.fiscal_year = :year AND UPPER(c.category) = UPPER(:category)
-                    """), {"year": year, "category": category})
-                    row = result.fetchone()
-                    
-                    if row:
-                        category_total, year_total = row
-                        percentage = round((category_total / year_total) * 100, 1)
-                        partial_note = " Note: FY26 data is partial." if year == "FY26" else ""
-                        return {
-                            "answer": f"{category} in {year}: ${category_total:,} ({percentage}% of total). Source: v_category_totals({year}).{partial_note}",
-                            "evidence": [{"category": category, "total": category_total, "percentage": percentage, "fiscal_year": year}],
-                            "total": category_total,
-                            "filters": {"year": year, "category": category},
-                            "question_type": "category_share"
-                        }
+            share = cube.category_share(year, category)
+            
+            if share:
+                percentage, total = share
+                partial_note = " Note: FY26 data is partial." if year == "FY26" else ""
+                return {
+                    "answer": f"{category} in {year}: ${total:,} ({percentage}% of total). Source: v_category_shares({year}).{partial_note}",
+                    "evidence": [{"category": category, "total": total, "percentage": percentage, "fiscal_year": year}],
+                    "total": total,
+                    "filters": {"year": year, "category": category},
+                    "question_type": "category_share"
+                }
         
         elif action == "line_item_total":
             year = intent.get("year", "FY25")
             category = intent.get("category", "").upper()
             line_item = intent.get("line_item", "")
-            with engine.begin() as conn:
-                result = conn.execute(text("""
-                    SELECT total FROM v_line_items 
-                    WHERE fiscal_year = :year AND UPPER(category) = UPPER(:category) 
-                    AND UPPER(line_item) = UPPER(:line_item)
-                """), {"year": year, "category": category, "line_item": line_item})
-                row = result.fetchone()
-                
-                if row:
-                    total = row[0]
-                    partial_note = " Note: FY26 data is partial." if year == "FY26" else ""
-                    return {
-                        "answer": f"{year} {category} → {line_item}: ${total:,}. Source: v_line_items.{partial_note}",
-                        "evidence": [{"category": category, "line_item": line_item, "total": total, "fiscal_year": year}],
-                        "total": total,
-                        "filters": {"year": year, "category": category, "line_item": line_item},
-                        "question_type": "line_item_total"
-                    }
+            total = cube.line_item_total(year, category, line_item)
+            
+            if total is not None:
+                partial_note = " Note: FY26 data is partial." if year == "FY26" else ""
+                return {
+                    "answer": f"{year} {category} → {line_item}: ${total:,}. Source: v_line_items.{partial_note}",
+                    "evidence": [{"category": category, "line_item": line_item, "total": total, "fiscal_year": year}],
+                    "total": total,
+                    "filters": {"year": year, "category": category, "line_item": line_item},
+                    "question_type": "line_item_total"
+                }
         
         elif action == "what_if_scenario":
             year = intent.get("year", "FY25")
@@ -436,135 +382,111 @@ def handle_intent_deterministically(intent):
             percentage_change = intent.get("percentage_change", 0)
             scenario_type = intent.get("scenario_type", "increase")
             
-            with engine.begin() as conn:
-                # Get current category total
-                result = conn.execute(text("""
-                    SELECT total FROM v_category_totals 
-                    WHERE fiscal_year = :year AND UPPER(category) = UPPER(:category)
-                """), {"year": year, "category": category})
-                row = result.fetchone()
+            # Get current category total
+            current_total = cube.category_total(year, category)
+            
+            if current_total is not None:
+                # Calculate new total based on scenario
+                if scenario_type == "increase":
+                    new_total = current_total * (1 + percentage_change / 100)
+                    change_amount = new_total - current_total
+                    change_text = "increased"
+                else:
+                    new_total = current_total * (1 - percentage_change / 100)
+                    change_amount = current_total - new_total
+                    change_text = "decreased"
                 
-                if row:
-                    current_total = row[0]
-                    
-                    # Calculate new total based on scenario
-                    if scenario_type == "increase":
-                        new_total = current_total * (1 + percentage_change / 100)
-                        change_amount = new_total - current_total
-                        change_text = "increased"
-                    else:
-                        new_total = current_total * (1 - percentage_change / 100)
-                        change_amount = current_total - new_total
-                        change_text = "decreased"
-                    
-                    # Get year total to calculate new percentage
-                    year_result = conn.execute(text("""
-                        SELECT total FROM v_year_totals WHERE fiscal_year = :year
-                    """), {"year": year})
-                    year_row = year_result.fetchone()
+                # Get year total to calculate new percentage
+                year_total = cube.year_total(year)
+                
+                if year_total:
+                    current_percentage = (current_total / year_total) * 100
+                    new_percentage = (new_total / year_total) * 100
                     
-                    if year_row:
-                        year_total = year_row[0]
-                        current_percentage = (current_total / year_total) * 100
-                        new_percentage = (new_total / year_total) * 100
-                        
-                        return {
-                            "answer": f"If {category} {change_text} by {percentage_change}% in {year}: "
-                                    f"New total would be ${new_total:,.0f} (change of ${change_amount:,.0f}). "
-                                    f"This would change its share from {current_percentage:.1f}% to {new_percentage:.1f}% of the total budget.",
-                            "evidence": [
-                                {
-                                    "category": category,
-                                    "fiscal_year": year,
-                                    "current_total": current_total,
-                                    "new_total": new_total,
-                                    "percentage_change": percentage_change,
-                                    "scenario_type": scenario_type,
-                                    "current_percentage": current_percentage,
-                                    "new_percentage": new_percentage
-                                }
-                            ],
-                            "total": new_total,
-                            "filters": {"year": year, "category": category, "scenario_type": scenario_type},
-                            "question_type": "what_if_scenario"
-                        }
-                    else:
-                        return {
-                            "answer": f"Could not calculate the impact because year total data for {year} is not available.",
-                            "evidence": [],
-                            "filters": {"year": year, "category": category},
-                            "question_type": "what_if_scenario"
-                        }
+                    return {
+                        "answer": f"If {category} {change_text} by {percentage_change}% in {year}: "
+                                f"New total would be ${new_total:,.0f} (change of ${change_amount:,.0f}). "
+                                f"This would change its share from {current_percentage:.1f}% to {new_percentage:.1f}% of the total budget.",
+                        "evidence": [
+                            {
+                                "category": category,
+                                "fiscal_year": year,
+                                "current_total": current_total,
+                                "new_total": new_total,
+                                "percentage_change": percentage_change,
+                                "scenario_type": scenario_type,
+                                "current_percentage": current_percentage,
+                                "new_percentage": new_percentage
+                            }
+                        ],
+                        "total": new_total,
+                        "filters": {"year": year, "category": category, "scenario_type": scenario_type},
+                        "question_type": "what_if_scenario"
+                    }
                 else:
                     return {
-                        "answer": f"Could not find {category} data for {year} to perform the scenario analysis.",
+                        "answer": f"Could not calculate the impact because year total data for {year} is not available.",
                         "evidence": [],
                         "filters": {"year": year, "category": category},
                         "question_type": "what_if_scenario"
                     }
+            else:
+                return {
+                    "answer": f"Could not find {category} data for {year} to perform the scenario analysis.",
+                    "evidence": [],
+                    "filters": {"year": year, "category": category},
+                    "question_type": "what_if_scenario"
+                }
         
         elif action == "percent_change":
             year_from = intent.get("year_from", "FY24")
             year_to = intent.get("year_to", "FY25")
             category = intent.get("category", "")
             
-            with engine.begin() as conn:
-                # Get totals for both years
-                result_from = conn.execute(text("""
-                    SELECT total FROM v_category_totals 
-                    WHERE fiscal_year = :year AND UPPER(category) = UPPER(:category)
-                """), {"year": year_from, "category": category})
-                row_from = result_from.fetchone()
-                
-                result_to = conn.execute(text("""
-                    SELECT total FROM v_category_totals 
-                    WHERE fiscal_year = :year AND UPPER(category) = UPPER(:category)
-                """), {"year": year_to, "category": category})
-                row_to = result_to.fetchone()
-                
-                if row_from and row_to:
-                    total_from = row_from[0]
-                    total_to = row_to[0]
-                    
-                    # Calculate percent change
-                    if total_from == 0:
-                        if total_to == 0:
-                            percent_change = 0.0
-                            change_text = "0.0%"
-                        else:
-                            percent_change = "not defined (no prior amount)"
-                            change_text = f"not defined (no prior amount) - absolute change: ${total_to:,.0f}"
+            # Get totals for both years
+            total_from = cube.category_total(year_from, category)
+            total_to = cube.category_total(year_to, category)
+            
+            if total_from is not None and total_to is not None:
+                # Calculate percent change
+                if total_from == 0:
+                    if total_to == 0:
+                        percent_change = 0.0
+                        change_text = "0.0%"
                     else:
-                        percent_change = ((total_to - total_from) / abs(total_from)) * 100
-                        change_text = f"{percent_change:.1f}%"
-                    
-                    abs_change = total_to - total_from
-                    partial_note = " Note: FY26 data is partial." if year_to == "FY26" else ""
-                    
-                    return {
-                        "answer": f"{category} changed by {change_text} from {year_from} to {year_to}, moving from ${total_from:,.0f} to ${total_to:,.0f} (${abs_change:,.0f}). Source: v_category_totals({year_from},{year_to}).{partial_note}",
-                        "evidence": [
-                            {
-                                "category": category,
-                                "year_from": year_from,
-                                "year_to": year_to,
-                                "total_from": total_from,
-                                "total_to": total_to,
-                                "percent_change": percent_change,
-                                "abs_change": abs_change
-                            }
-                        ],
-                        "total": total_to,
-                        "filters": {"year_from": year_from, "year_to": year_to, "category": category},
-                        "question_type": "percent_change"
-                    }
+                        percent_change = "not defined (no prior amount)"
+                        change_text = f"not defined (no prior amount) - absolute change: ${total_to:,.0f}"
                 else:
-                    return {
-                        "answer": f"Could not find {category} data for {year_from} or {year_to} to calculate percent change.",
-                        "evidence": [],
-                        "filters": {"year_from": year_from, "year_to": year_to, "category": category},
-                        "question_type": "percent_change"
-                    }
+                    percent_change = ((total_to - total_from) / abs(total_from)) * 100
+                    change_text = f"{percent_change:.1f}%"
+                
+                abs_change = total_to - total_from
+                partial_note = " Note: FY26 data is partial." if year_to == "FY26" else ""
+                
+                return {
+                    "answer": f"{category} changed by {change_text} from {year_from} to {year_to}, moving from ${total_from:,.0f} to ${total_to:,.0f} (${abs_change:,.0f}). Source: v_category_totals({year_from},{year_to}).{partial_note}",
+                    "evidence": [
+                        {
+                            "category": category,
+                            "year_from": year_from,
+                            "year_to": year_to,
+                            "total_from": total_from,
+                            "total_to": total_to,
+                            "percent_change": percent_change,
+                            "abs_change": abs_change
+                        }
+                    ],
+                    "total": total_to,
+                    "filters": {"year_from": year_from, "year_to": year_to, "category": category},
+                    "question_type": "percent_change"
+                }
+            else:
+                return {
+                    "answer": f"Could not find {category} data for {year_from} or {year_to} to calculate percent change.",
+                    "evidence": [],
+                    "filters": {"year_from": year_from, "year_to": year_to, "category": category},
+                    "question_type": "percent_change"
+                }
         
         elif action == "scenario_cut":
             year = intent.get("year", "FY25")
@@ -572,96 +494,76 @@ def handle_intent_deterministically(intent):
             scope = intent.get("scope", "all")
             category = intent.get("category", "")
             
-            with engine.begin() as conn:
-                if scope == "all":
-                    # Get all categories and year total
-                    result = conn.execute(text("""
-                        SELECT category, total FROM v_category_totals 
-                        WHERE fiscal_year = :year ORDER BY total DESC
-                    """), {"year": year})
-                    rows = result.fetchall()
+            if scope == "all":
+                # Get all categories and year total
+                rows = cube.category_totals(year)
+                old_total = cube.year_total(year)
+                
+                if rows and old_total is not None:
+                    new_totals = []
+                    new_total = 0
                     
-                    year_result = conn.execute(text("""
-                        SELECT total FROM v_year_totals WHERE fiscal_year = :year
-                    """), {"year": year})
-                    year_row = year_result.fetchone()
+                    for row in rows:
+                        category_name, old_amount = row
+                        new_amount = old_amount * (1 - cut_pct / 100)
+                        new_totals.append({
+                            "category": category_name,
+                            "old_total": old_amount,
+                            "new_total": new_amount,
+                            "savings": old_amount - new_amount
+                        })
+                        new_total += new_amount
                     
-                    if rows and year_row:
-                        old_total = year_row[0]
-                        new_totals = []
-                        new_total = 0
-                        
-                        for row in rows:
-                            category_name, old_amount = row
-                            new_amount = old_amount * (1 - cut_pct / 100)
-                            new_totals.append({
-                                "category": category_name,
-                                "old_total": old_amount,
-                                "new_total": new_amount,
-                                "savings": old_amount - new_amount
-                            })
-                            new_total += new_amount
-                        
-                        savings = old_total - new_total
-                        partial_note = " Note: FY26 data is partial." if year == "FY26" else ""
-                        
-                        # Create category list (top 5 by savings)
-                        category_list = []
-                        for i, item in enumerate(sorted(new_totals, key=lambda x: x["savings"], reverse=True)[:5]):
-                            category_list.append(f"- {item['category']}: old ${item['old_total']:,.0f}, new ${item['new_total']:,.0f}")
-                        
-                        category_text = "\n".join(category_list)
-                        if len(new_totals) > 5:
-                            category_text += "\n- Others scale similarly."
-                        
-                        return {
-                            "answer": f"A {cut_pct}% across-the-board reduction in {year} would save ${savings:,.0f} and reduce the total from ${old_total:,.0f} to ${new_total:,.0f}. By category:\n{category_text}\nSource: v_category_totals({year}).{partial_note}",
-                            "evidence": new_totals,
-                            "total": new_total,
-                            "filters": {"year": year, "cut_pct": cut_pct, "scope": scope},
-                            "question_type": "scenario_cut"
-                        }
+                    savings = old_total - new_total
+                    partial_note = " Note: FY26 data is partial." if year == "FY26" else ""
+                    
+                    # Create category list (top 5 by savings)
+                    category_list = []
+                    for i, item in enumerate(sorted(new_totals, key=lambda x: x["savings"], reverse=True)[:5]):
+                        category_list.append(f"- {item['category']}: old ${item['old_total']:,.0f}, new ${item['new_total']:,.0f}")
+                    
+                    category_text = "\n".join(category_list)
+                    if len(new_totals) > 5:
+                        category_text += "\n- Others scale similarly."
+                    
+                    return {
+                        "answer": f"A {cut_pct}% across-the-board reduction in {year} would save ${savings:,.0f} and reduce the total from ${old_total:,.0f} to ${new_total:,.0f}. By category:\n{category_text}\nSource: v_category_totals({year}).{partial_note}",
+                        "evidence": new_totals,
+                        "total": new_total,
+                        "filters": {"year": year, "cut_pct": cut_pct, "scope": scope},
+                        "question_type": "scenario_cut"
+                    }
+            
+            elif scope == "category" and category:
+                # Get category total and year total
+                old_category_total = cube.category_total(year, category)
+                old_year_total = cube.year_total(year)
                 
-                elif scope == "category" and category:
-                    # Get category total and year total
-                    result = conn.execute(text("""
-                        SELECT total FROM v_category_totals 
-                        WHERE fiscal_year = :year AND UPPER(category) = UPPER(:category)
-                    """), {"year": year, "category": category})
-                    row = result.fetchone()
+                if old_category_total is not None and old_year_total is not None:
+                    new_category_total = old_category_total * (1 - cut_pct / 100)
+                    new_year_total = old_year_total - (old_category_total - new_category_total)
+                    savings = old_category_total - new_category_total
                     
-                    year_result = conn.execute(text("""
-                        SELECT total FROM v_year_totals WHERE fiscal_year = :year
-                    """), {"year": year})
-                    year_row = year_result.fetchone()
+                    partial_note = " Note: FY26 data is partial." if year == "FY26" else ""
                     
-                    if row and year_row:
-                        old_category_total = row[0]
-                        old_year_total = year_row[0]
-                        new_category_total = old_category_total * (1 - cut_pct / 100)
-                        new_year_total = old_year_total - (old_category_total - new_category_total)
-                        savings = old_category_total - new_category_total
-                        
-                        partial_note = " Note: FY26 data is partial." if year == "FY26" else ""
-                        
-                        return {
-                            "answer": f"A {cut_pct}% cut to {category} in {year} would save ${savings:,.0f} and reduce the total budget from ${old_year_total:,.0f} to ${new_year_total:,.0f}. {category} would go from ${old_category_total:,.0f} to ${new_category_total:,.0f}. Source: v_category_totals({year}).{partial_note}",
-                            "evidence": [
-                                {
-                                    "category": category,
-                                    "year": year,
-                                    "old_category_total": old_category_total,
-                                    "new_category_total": new_category_total,
-                                    "old_year_total": old_year_total,
-                                    "new_year_total": new_year_total,
-                                    "savings": savings,
-                                    "cut_pct": cut_pct
-                                }
-                            ],
-                            "total": new_year_total,
-                            "filters": {"year": year, "cut_pct": cut_pct, "scope": scope, "category": category},
-                            "question_type": "scenario_cut"
-                        }
+                    return {
+                        "answer": f"A {cut_pct}% cut to {category} in {year} would save ${savings:,.0f} and reduce the total budget from ${old_year_total:,.0f} to ${new_year_total:,.0f}. {category} would go from ${old_category_total:,.0f} to ${new_category_total:,.0f}. Source: v_category_totals({year}).{partial_note}",
+                        "evidence": [
+                            {
+                                "category": category,
+                                "year": year,
+                                "old_category_total": old_category_total,
+                                "new_category_total": new_category_total,
+                                "old_year_total": old_year_total,
+                                "new_year_total": new_year_total,
+                                "savings": savings,
+                                "cut_pct": cut_pct
+                            }
+                        ],
+                        "total": new_year_total,
+                        "filters": {"year": year, "cut_pct": cut_pct, "scope": scope, "category": category},
+                        "question_type": "scenario_cut"
+                    }
         
         elif action == "help":
             return {
@@ -674,10 +576,17 @@ def handle_intent_deterministically(intent):
         # If no action matched, return None to fall back to LLM
         return None
         
-    except Exception as e:
-        print(f"Error in handle_intent_deterministically: {e}")
+    except Exception:
+        logger.warning("Deterministic intent handling failed", exc_info=True)
         return None
 
+# Cache budget view responses (registered before CORS so CORS stays outermost
+# and still decorates cached hits and 304s)
+app.middleware("http")(response_cache_middleware)
+
+# Correlation ID for every log line written while serving a request
+app.middleware("http")(request_id_middleware)
+
 # Add CORS middleware for local dashboard
 app.add_middleware(
     CORSMiddleware,
@@ -687,8 +596,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def warm_budget_cube():
+    """Load the budget cube and question vocabulary up front so the first /ask doesn't pay for them."""
+    try:
+        load_cube()
+    except Exception as e:
+        logger.warning("Budget cube load failed, will retry on first use: %s", e)
+    try:
+        load_vocabulary()
+    except Exception as e:
+        # The curated vocabulary in question_parser stays in use
+        logger.warning("Question vocabulary load failed, using built-in lists: %s", e)
+    register_refresh_hook(refresh_vocabulary_if_stale)
+    start_cube_refresher()
+
 class Ask(BaseModel):
     question: str
+    # /insights only: handle from the /ask response for the same question
+    insights_handle: Optional[str] = None
 
 class SummaryResponse(BaseModel):
     text: str
@@ -706,302 +632,514 @@ class FindingResponse(BaseModel):
 def health():
     return {"status": "ok"}
 
-@app.post("/ask")
-def ask(payload: Ask):
+@app.get("/llm-stats")
+def llm_stats():
+    """OpenAI call counters, circuit breaker state and queue vs model latency."""
+    return llm_client.stats()
+
+@app.get("/db-stats")
+def db_stats():
+    """Connection pool usage (in use, idle, overflow), checkout wait times and prepared statement counts."""
+    return {**pool_stats(), "prepared_statements": statements.stats()}
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus histograms: per-stage /ask pipeline timings and request latency by answering branch."""
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/cache-stats")
+def cache_stats():
+    """Hit/miss counters for the embedding, response and answer caches."""
+    return {
+        "embeddings": embedding_cache.stats(),
+        "responses": response_cache.stats(),
+        "answers": answer_cache.stats(),
+        "insights_handles": result_store.stats()
+    }
+
+def _event_stream_response(body: Dict[str, Any], field: str, tokens, event_format: str,
+                           on_done=None, headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
     """
-    Enhanced Q&A endpoint with framework-based question handling.
-    Supports all question types from the ai_assistant_budget_questions.json framework.
-    Now uses PostgreSQL views for accurate numeric answers.
+    Stream a response body as events: `meta` (body with field still null),
+    one `token` per LLM text delta, then `done` with field filled in.
+
+    Args:
+        body: Response body from the deterministic stage
+        field: Key the streamed text belongs to ("answer" or "insights")
+        tokens: Async iterator of text deltas, or None if body is complete
+        event_format: "sse" or "ndjson"
+        on_done: Optional coroutine function called with the finished body
+            and whether it may be cached (False when tokens fell back or
+            broke off mid-answer)
+        headers: Extra response headers
+    """
+    async def events():
+        yield streaming.encode_event(event_format, "meta", body)
+        if tokens is not None:
+            parts = []
+            async for token in tokens:
+                parts.append(token)
+                yield streaming.encode_event(event_format, "token", token)
+            body[field] = "".join(parts)
+        yield streaming.encode_event(event_format, "done", body)
+        if on_done is not None:
+            await on_done(body, tokens is None or tokens.complete)
+
+    return StreamingResponse(
+        events(),
+        media_type=streaming.MEDIA_TYPES[event_format],
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **(headers or {})},
+    )
+
+async def _answer_cache_lookup(kind: str, question: str):
+    """
+    Look a question up in the answer cache.
+
+    Returns:
+        (version, cached): the data version (None if it couldn't be read,
+        which disables caching for the request) and the cached body or None
     """
     try:
-        # First, try to answer with direct budget API data
-        budget_answer = try_budget_api_answer(payload.question)
-        if budget_answer:
-            # Debug logging for budget API responses
-            print(f"DEBUG budget_answer: {budget_answer}")
-            return budget_answer
-        
-        # Fall back to LLM-based approach for complex questions
-        question_type = classify_question(payload.question)
-        
-        # Handle different question types
-        if question_type == "category_comparisons":
-            comparison_data = get_category_comparison(payload.question)
-            if comparison_data:
-                evidence = comparison_data.get("evidence", [])
-                categories = comparison_data.get("categories", [])
-                
-                # Create specific responses for different comparison questions
-                if "most funding" in payload.question.lower():
-                    if categories:
-                        top_category = categories[0]
-                        dept_name = top_category["department"].replace("_", " ").title()
-                        amount = top_category["total_amount"]
-                        fiscal_year = comparison_data.get("fiscal_year")
-                        answer = f"{dept_name} received the most funding in FY{fiscal_year} with ${amount:,.2f}."
+        version = await run_in_db_thread(current_data_version)
+    except Exception as e:
+        logger.warning("Answer cache bypassed, data version unavailable: %s", e)
+        return None, None
+    if answer_cache.semantic:
+        # The semantic tier may call the embeddings API
+        return version, await run_in_db_thread(answer_cache.get, version, kind, question)
+    return version, answer_cache.get(version, kind, question)
+
+def _answer_cache_writer(version: Optional[str], kind: str, question: str, field: str, narrative: Optional[Dict]):
+    """Coroutine function that caches a finished body, skipping LLM fallback and truncated text."""
+    fallback = fallback_answer if field == "answer" else fallback_insights
+
+    async def store(body: Dict[str, Any], cacheable: bool = True):
+        if version is None or not cacheable:
+            # Caching off, or a streamed answer that fell back or broke off
+            return
+        if narrative is not None and body.get(field) == fallback(
+            narrative["evidence"], narrative.get("total"), narrative.get("filters")
+        ):
+            # The LLM was unavailable; don't pin the degraded answer
+            return
+        if answer_cache.semantic:
+            await run_in_db_thread(answer_cache.put, version, kind, question, body)
+        else:
+            answer_cache.put(version, kind, question, body)
+
+    return store
+
+def _request_done(endpoint: str, branch: str, started: float, store):
+    """Coroutine function that caches a finished body, then records the request latency for /metrics."""
+    async def done(body: Dict[str, Any], cacheable: bool = True):
+        await store(body, cacheable)
+        observe_request(endpoint, branch, time.perf_counter() - started)
+
+    return done
+
+async def _retrieve_evidence(question: str) -> List[Dict]:
+    """
+    Evidence chunks for the retrieval fallback. Only reached once every
+    deterministic branch has declined, so the other branches make no
+    embeddings call.
+    """
+    # Don't hold the shared connection while waiting on the embeddings API
+    await release_read_connection()
+    query_vector = await asyncio.to_thread(embed_query, question)
+    ev = await run_in_db_thread(retrieve, question, k=5, query_vector=query_vector, embed=False)
+    return [dict(r) for r in ev]
+
+async def _resolve_ask(question: str, version: Optional[str] = None):
+    """
+    Deterministic part of /ask: budget API, comparison, trend, breakdown and
+    aggregate lookups plus evidence retrieval.
+
+    When the answer comes from the aggregate lookup or retrieval (the same
+    work /insights does), the results are kept in the result store and the
+    body gets an `insights_handle` for /insights to reuse.
+
+    Returns:
+        (response, narrative, branch): the /ask response body, keyword
+        arguments for answer_with_citations when its "answer" still has to
+        come from the LLM (None when the answer is already complete), and
+        which branch answered (the /metrics label)
+    """
+    # First, try to answer with direct budget API data
+    budget_answer = await run_in_db_thread(try_budget_api_answer, question)
+    if budget_answer:
+        return budget_answer, None, "budget_api"
+    
+    # Fall back to LLM-based approach for complex questions
+    with stage_timer("intent_parse"):
+        question_type = classify_question(question)
+    
+    # Handle different question types
+    if question_type == "category_comparisons":
+        comparison_data = await run_in_db_thread(get_category_comparison, question)
+        if comparison_data:
+            evidence = comparison_data.get("evidence", [])
+            narrative = None
+            categories = comparison_data.get("categories", [])
+            
+            # Create specific responses for different comparison questions
+            if "most funding" in question.lower():
+                if categories:
+                    top_category = categories[0]
+                    dept_name = top_category["department"].replace("_", " ").title()
+                    amount = top_category["total_amount"]
+                    fiscal_year = comparison_data.get("fiscal_year")
+                    answer = f"{dept_name} received the most funding in FY{fiscal_year} with ${amount:,.2f}."
+                else:
+                    answer = "I couldn't determine which category received the most funding."
+            elif "compare" in question.lower():
+                # Handle comparison questions
+                filters = parse_filters(question)
+                target_dept = filters.get("department")
+                if target_dept and categories:
+                    for cat in categories:
+                        if cat["department"] == target_dept:
+                            dept_name = cat["department"].replace("_", " ").title()
+                            amount = cat["total_amount"]
+                            fiscal_year = comparison_data.get("fiscal_year")
+                            answer = f"{dept_name} had a budget of ${amount:,.2f} in FY{fiscal_year}."
+                            break
                     else:
-                        answer = "I couldn't determine which category received the most funding."
-                elif "compare" in payload.question.lower():
-                    # Handle comparison questions
-                    filters = parse_filters(payload.question)
-                    target_dept = filters.get("department")
-                    if target_dept and categories:
-                        for cat in categories:
-                            if cat["department"] == target_dept:
-                                dept_name = cat["department"].replace("_", " ").title()
-                                amount = cat["total_amount"]
-                                fiscal_year = comparison_data.get("fiscal_year")
-                                answer = f"{dept_name} had a budget of ${amount:,.2f} in FY{fiscal_year}."
-                                break
-                        else:
-                            answer = f"I couldn't find budget data for {target_dept.replace('_', ' ').title()}."
+                        answer = f"I couldn't find budget data for {target_dept.replace('_', ' ').title()}."
+                else:
+                    answer = "I found budget comparison data, but couldn't identify the specific departments to compare."
+            elif "rank" in question.lower():
+                # Handle ranking questions
+                filters = parse_filters(question)
+                target_dept = filters.get("department")
+                if target_dept and categories:
+                    for i, cat in enumerate(categories):
+                        if cat["department"] == target_dept:
+                            rank = i + 1
+                            dept_name = cat["department"].replace("_", " ").title()
+                            amount = cat["total_amount"]
+                            fiscal_year = comparison_data.get("fiscal_year")
+                            answer = f"{dept_name} ranked #{rank} in FY{fiscal_year} with ${amount:,.2f}."
+                            break
                     else:
-                        answer = "I found budget comparison data, but couldn't identify the specific departments to compare."
-                elif "rank" in payload.question.lower():
-                    # Handle ranking questions
-                    filters = parse_filters(payload.question)
-                    target_dept = filters.get("department")
-                    if target_dept and categories:
-                        for i, cat in enumerate(categories):
-                            if cat["department"] == target_dept:
-                                rank = i + 1
-                                dept_name = cat["department"].replace("_", " ").title()
-                                amount = cat["total_amount"]
-                                fiscal_year = comparison_data.get("fiscal_year")
-                                answer = f"{dept_name} ranked #{rank} in FY{fiscal_year} with ${amount:,.2f}."
-                                break
-                        else:
-                            answer = f"I couldn't find {target_dept.replace('_', ' ').title()} in the budget rankings."
+                        answer = f"I couldn't find {target_dept.replace('_', ' ').title()} in the budget rankings."
+                else:
+                    answer = "I couldn't determine the ranking for the specified department."
+            else:
+                # Default comparison response
+                answer = None
+                narrative = dict(
+                    evidence=evidence,
+                    total=comparison_data.get("total_budget"),
+                    filters={"question_type": "category_comparison"}
+                )
+            
+            return {
+                "answer": answer,
+                "evidence": evidence,
+                "comparison_data": comparison_data,
+                "question_type": question_type
+            }, narrative, "category_comparison"
+    
+    elif question_type == "trend_analysis":
+        trend_data = await run_in_db_thread(get_trend_analysis, question)
+        if trend_data:
+            evidence = trend_data.get("evidence", [])
+            narrative = None
+            changes = trend_data.get("changes", [])
+            years = trend_data.get("years", [])
+            
+            # Create specific responses for trend questions
+            if "how did" in question.lower() and "change" in question.lower():
+                # Handle specific department change questions
+                filters = parse_filters(question)
+                target_dept = filters.get("department")
+                if target_dept and changes:
+                    for change in changes:
+                        if change["department"] == target_dept:
+                            dept_name = change["department"].replace("_", " ").title()
+                            change_pct = change["change_percentage"]
+                            change_amount = change["change_amount"]
+                            old_amount = change["old_amount"]
+                            new_amount = change["new_amount"]
+                            
+                            if change_pct > 0:
+                                answer = f"{dept_name} funding increased by {change_pct:.1f}% from ${old_amount:,.2f} to ${new_amount:,.2f} between FY{years[0]} and FY{years[1]}."
+                            elif change_pct < 0:
+                                answer = f"{dept_name} funding decreased by {abs(change_pct):.1f}% from ${old_amount:,.2f} to ${new_amount:,.2f} between FY{years[0]} and FY{years[1]}."
+                            else:
+                                answer = f"{dept_name} funding remained unchanged at ${old_amount:,.2f} between FY{years[0]} and FY{years[1]}."
+                            break
                     else:
-                        answer = "I couldn't determine the ranking for the specified department."
+                        answer = f"I couldn't find trend data for {target_dept.replace('_', ' ').title()}."
                 else:
-                    # Default comparison response
-                    answer = answer_with_citations(
-                        payload.question,
-                        evidence,
-                        total=comparison_data.get("total_budget"),
-                        filters={"question_type": "category_comparison"}
-                    )
-                
-                return {
-                    "answer": answer,
-                    "evidence": evidence,
-                    "comparison_data": comparison_data,
-                    "question_type": question_type
-                }
-        
-        elif question_type == "trend_analysis":
-            trend_data = get_trend_analysis(payload.question)
-            if trend_data:
-                evidence = trend_data.get("evidence", [])
-                changes = trend_data.get("changes", [])
-                years = trend_data.get("years", [])
+                    answer = "I found trend data, but couldn't identify the specific department to analyze."
+            elif "grew the most" in question.lower():
+                # Find the department with the largest positive change
+                positive_changes = [c for c in changes if c["change_percentage"] > 0]
+                if positive_changes:
+                    top_growth = max(positive_changes, key=lambda x: x["change_percentage"])
+                    dept_name = top_growth["department"].replace("_", " ").title()
+                    growth_pct = top_growth["change_percentage"]
+                    answer = f"{dept_name} grew the most with a {growth_pct:.1f}% increase between FY{years[0]} and FY{years[1]}."
+                else:
+                    answer = f"No departments showed growth between FY{years[0]} and FY{years[1]}."
+            elif "decreased" in question.lower():
+                # Find departments with decreases
+                negative_changes = [c for c in changes if c["change_percentage"] < 0]
+                if negative_changes:
+                    largest_decrease = min(negative_changes, key=lambda x: x["change_percentage"])
+                    dept_name = largest_decrease["department"].replace("_", " ").title()
+                    decrease_pct = abs(largest_decrease["change_percentage"])
+                    answer = f"{dept_name} had the largest decrease of {decrease_pct:.1f}% between FY{years[0]} and FY{years[1]}."
+                else:
+                    answer = f"No departments showed decreases between FY{years[0]} and FY{years[1]}."
+            else:
+                # Default trend response
+                answer = None
+                narrative = dict(
+                    evidence=evidence,
+                    filters={"question_type": "trend_analysis"}
+                )
+            
+            return {
+                "answer": answer,
+                "evidence": evidence,
+                "trend_data": trend_data,
+                "question_type": question_type
+            }, narrative, "trend_analysis"
+    
+    elif question_type == "breakdowns_shares":
+        breakdown_data = await run_in_db_thread(get_breakdown_analysis, question)
+        if breakdown_data:
+            evidence = breakdown_data.get("evidence", [])
+            narrative = None
+            
+            # Create specific responses for different breakdown questions
+            if "percentage" in question.lower():
+                # Find the specific department mentioned in the question
+                filters = parse_filters(question)
+                target_dept = filters.get("department")
                 
-                # Create specific responses for trend questions
-                if "how did" in payload.question.lower() and "change" in payload.question.lower():
-                    # Handle specific department change questions
-                    filters = parse_filters(payload.question)
-                    target_dept = filters.get("department")
-                    if target_dept and changes:
-                        for change in changes:
-                            if change["department"] == target_dept:
-                                dept_name = change["department"].replace("_", " ").title()
-                                change_pct = change["change_percentage"]
-                                change_amount = change["change_amount"]
-                                old_amount = change["old_amount"]
-                                new_amount = change["new_amount"]
-                                
-                                if change_pct > 0:
-                                    answer = f"{dept_name} funding increased by {change_pct:.1f}% from ${old_amount:,.2f} to ${new_amount:,.2f} between FY{years[0]} and FY{years[1]}."
-                                elif change_pct < 0:
-                                    answer = f"{dept_name} funding decreased by {abs(change_pct):.1f}% from ${old_amount:,.2f} to ${new_amount:,.2f} between FY{years[0]} and FY{years[1]}."
-                                else:
-                                    answer = f"{dept_name} funding remained unchanged at ${old_amount:,.2f} between FY{years[0]} and FY{years[1]}."
-                                break
-                        else:
-                            answer = f"I couldn't find trend data for {target_dept.replace('_', ' ').title()}."
+                if target_dept:
+                    # Find the percentage for the target department
+                    departments = breakdown_data.get("departments", [])
+                    for dept in departments:
+                        if dept.get("department") == target_dept:
+                            percentage = dept.get("percentage", 0)
+                            answer = f"{percentage:.1f}% of the FY{breakdown_data.get('fiscal_year')} budget came from {target_dept.replace('_', ' ').title()}."
+                            break
                     else:
-                        answer = "I found trend data, but couldn't identify the specific department to analyze."
-                elif "grew the most" in payload.question.lower():
-                    # Find the department with the largest positive change
-                    positive_changes = [c for c in changes if c["change_percentage"] > 0]
-                    if positive_changes:
-                        top_growth = max(positive_changes, key=lambda x: x["change_percentage"])
-                        dept_name = top_growth["department"].replace("_", " ").title()
-                        growth_pct = top_growth["change_percentage"]
-                        answer = f"{dept_name} grew the most with a {growth_pct:.1f}% increase between FY{years[0]} and FY{years[1]}."
-                    else:
-                        answer = f"No departments showed growth between FY{years[0]} and FY{years[1]}."
-                elif "decreased" in payload.question.lower():
-                    # Find departments with decreases
-                    negative_changes = [c for c in changes if c["change_percentage"] < 0]
-                    if negative_changes:
-                        largest_decrease = min(negative_changes, key=lambda x: x["change_percentage"])
-                        dept_name = largest_decrease["department"].replace("_", " ").title()
-                        decrease_pct = abs(largest_decrease["change_percentage"])
-                        answer = f"{dept_name} had the largest decrease of {decrease_pct:.1f}% between FY{years[0]} and FY{years[1]}."
-                    else:
-                        answer = f"No departments showed decreases between FY{years[0]} and FY{years[1]}."
+                        answer = f"I couldn't find {target_dept.replace('_', ' ').title()} in the FY{breakdown_data.get('fiscal_year')} budget data."
                 else:
-                    # Default trend response
-                    answer = answer_with_citations(
-                        payload.question,
-                        evidence,
-                        filters={"question_type": "trend_analysis"}
-                    )
+                    answer = "I couldn't identify which department you're asking about for the percentage calculation."
+            elif "top 5" in question.lower():
+                # Handle top 5 questions
+                departments = breakdown_data.get("departments", [])[:5]
+                fiscal_year = breakdown_data.get("fiscal_year")
                 
-                return {
-                    "answer": answer,
-                    "evidence": evidence,
-                    "trend_data": trend_data,
-                    "question_type": question_type
-                }
-        
-        elif question_type == "breakdowns_shares":
-            breakdown_data = get_breakdown_analysis(payload.question)
-            if breakdown_data:
-                evidence = breakdown_data.get("evidence", [])
-                
-                # Create specific responses for different breakdown questions
-                if "percentage" in payload.question.lower():
-                    # Find the specific department mentioned in the question
-                    filters = parse_filters(payload.question)
-                    target_dept = filters.get("department")
-                    
-                    if target_dept:
-                        # Find the percentage for the target department
-                        departments = breakdown_data.get("departments", [])
-                        for dept in departments:
-                            if dept.get("department") == target_dept:
-                                percentage = dept.get("percentage", 0)
-                                answer = f"{percentage:.1f}% of the FY{breakdown_data.get('fiscal_year')} budget came from {target_dept.replace('_', ' ').title()}."
-                                break
-                        else:
-                            answer = f"I couldn't find {target_dept.replace('_', ' ').title()} in the FY{breakdown_data.get('fiscal_year')} budget data."
-                    else:
-                        answer = "I couldn't identify which department you're asking about for the percentage calculation."
-                elif "top 5" in payload.question.lower():
-                    # Handle top 5 questions
-                    departments = breakdown_data.get("departments", [])[:5]
-                    fiscal_year = breakdown_data.get("fiscal_year")
-                    
-                    if departments:
-                        answer = f"The top 5 categories by amount in FY{fiscal_year} are: "
-                        dept_list = []
-                        for i, dept in enumerate(departments):
-                            dept_name = dept["department"].replace("_", " ").title()
-                            amount = dept["total_amount"]
-                            dept_list.append(f"{dept_name} (${amount:,.2f})")
-                        answer += ", ".join(dept_list) + "."
-                    else:
-                        answer = f"I couldn't find budget data for FY{fiscal_year}."
-                elif "share" in payload.question.lower():
-                    # Handle share questions (like "what share of Administration went to Health Insurance")
-                    filters = parse_filters(payload.question)
-                    target_dept = filters.get("department")
-                    
-                    if target_dept:
-                        # This would need more complex logic to find line items within a department
-                        answer = f"I can see {target_dept.replace('_', ' ').title()} budget data, but I need more specific information about the line item you're asking about."
-                    else:
-                        answer = "I couldn't identify which department you're asking about for the share calculation."
+                if departments:
+                    answer = f"The top 5 categories by amount in FY{fiscal_year} are: "
+                    dept_list = []
+                    for i, dept in enumerate(departments):
+                        dept_name = dept["department"].replace("_", " ").title()
+                        amount = dept["total_amount"]
+                        dept_list.append(f"{dept_name} (${amount:,.2f})")
+                    answer += ", ".join(dept_list) + "."
                 else:
-                    # Default breakdown response
-                    answer = answer_with_citations(
-                        payload.question,
-                        evidence,
-                        total=breakdown_data.get("total_budget"),
-                        filters={"question_type": "breakdown_analysis"}
-                    )
+                    answer = f"I couldn't find budget data for FY{fiscal_year}."
+            elif "share" in question.lower():
+                # Handle share questions (like "what share of Administration went to Health Insurance")
+                filters = parse_filters(question)
+                target_dept = filters.get("department")
                 
-                return {
-                    "answer": answer,
-                    "evidence": evidence,
-                    "breakdown_data": breakdown_data,
-                    "question_type": question_type
-                }
-        
-        # Try to get direct answer for amount questions
-        direct_answer = get_aggregated_answer(payload.question)
-        
-        if direct_answer and direct_answer.get("total") is not None:
-            # Return direct answer with total
-            evidence = direct_answer.get("evidence", [])
-            answer = answer_with_citations(
-                payload.question, 
-                evidence, 
-                total=direct_answer.get("total"),
-                filters=direct_answer.get("filters")
-            )
+                if target_dept:
+                    # This would need more complex logic to find line items within a department
+                    answer = f"I can see {target_dept.replace('_', ' ').title()} budget data, but I need more specific information about the line item you're asking about."
+                else:
+                    answer = "I couldn't identify which department you're asking about for the share calculation."
+            else:
+                # Default breakdown response
+                answer = None
+                narrative = dict(
+                    evidence=evidence,
+                    total=breakdown_data.get("total_budget"),
+                    filters={"question_type": "breakdown_analysis"}
+                )
+            
             return {
                 "answer": answer,
                 "evidence": evidence,
-                "filters": direct_answer.get("filters"),
-                "total": direct_answer.get("total"),
+                "breakdown_data": breakdown_data,
                 "question_type": question_type
-            }
-        
-        # Fallback to regular retrieval
-        ev = retrieve(payload.question, k=5)
-        evidence = [dict(r) for r in ev]
-        answer = answer_with_citations(payload.question, evidence)
+            }, narrative, "breakdown"
+    
+    # Try to get direct answer for amount questions
+    direct_answer = await run_in_db_thread(get_aggregated_answer, question)
+    
+    if direct_answer and direct_answer.get("total") is not None:
+        # Return direct answer with total
+        evidence = direct_answer.get("evidence", [])
+        narrative = dict(evidence=evidence, total=direct_answer.get("total"), filters=direct_answer.get("filters"))
         return {
-            "answer": answer, 
+            "answer": None,
             "evidence": evidence,
-            "question_type": question_type
-        }
+            "filters": direct_answer.get("filters"),
+            "total": direct_answer.get("total"),
+            "question_type": question_type,
+            "insights_handle": result_store.put(version, question, narrative)
+        }, narrative, "direct_answer"
+    
+    # Fallback to regular retrieval
+    evidence = await _retrieve_evidence(question)
+    return {
+        "answer": None,
+        "evidence": evidence,
+        "question_type": question_type,
+        "insights_handle": result_store.put(version, question, dict(evidence=evidence))
+    }, dict(evidence=evidence), "retrieval"
+
+@app.post("/ask")
+async def ask(payload: Ask, request: Request, response: Response):
+    """
+    Enhanced Q&A endpoint with framework-based question handling.
+    Supports all question types from the ai_assistant_budget_questions.json framework.
+    Now uses PostgreSQL views for accurate numeric answers.
+
+    Clients sending `Accept: text/event-stream` (SSE) or
+    `Accept: application/x-ndjson` get a stream instead: a `meta` event
+    with the numbers and evidence as soon as the database work is done,
+    `token` events with the LLM answer as it is generated, and a `done`
+    event carrying the usual JSON body.
+
+    Finished answers are cached per data version (app/answer_cache.py), so
+    repeats and rephrasings of the same question skip the SQL and the LLM.
+    """
+    started = time.perf_counter()
+    try:
+        event_format = streaming.negotiate_event_format(request.headers.get("accept"))
+        version, body = await _answer_cache_lookup("ask", payload.question)
+        if body is not None:
+            observe_request("ask", "cache", time.perf_counter() - started)
+            headers = {"X-Answer-Cache": "HIT"}
+            if event_format:
+                return _event_stream_response(body, "answer", None, event_format, headers=headers)
+            response.headers.update(headers)
+            return body
+        
+        # One read-only connection for all of the lookups; released before the LLM call
+        async with request_unit_of_work():
+            body, narrative, branch = await _resolve_ask(payload.question, version)
+        done = _request_done(
+            "ask", branch, started, _answer_cache_writer(version, "ask", payload.question, "answer", narrative)
+        )
+        headers = {"X-Answer-Cache": "MISS"}
+        if event_format:
+            tokens = stream_answer_with_citations(payload.question, **narrative) if narrative else None
+            return _event_stream_response(body, "answer", tokens, event_format, on_done=done, headers=headers)
+        if narrative is not None:
+            body["answer"] = await answer_with_citations(payload.question, **narrative)
+        await done(body)
+        response.headers.update(headers)
+        return body
     
     except Exception as e:
-        # shows full error in server logs, returns a 500 with message
-        import traceback; traceback.print_exc()
+        observe_request("ask", "error", time.perf_counter() - started)
+        # full traceback in the server logs, a 500 with the message to the client
+        logger.exception("/ask failed")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _insights_result(question: str, evidence: List[Dict], total: Optional[float] = None, filters: Optional[Dict] = None):
+    """
+    /insights body and generate_detailed_insights keyword arguments for
+    already-computed evidence (and total/filters for amount questions).
+    """
+    # Classify the question type
+    with stage_timer("intent_parse"):
+        question_type = classify_question(question)
+    
+    if total is not None:
+        return {
+            "insights": None,
+            "evidence": evidence,
+            "filters": filters,
+            "total": total,
+            "question_type": question_type
+        }, dict(evidence=evidence, total=total, filters=filters, question_type=question_type)
+    return {
+        "insights": None,
+        "evidence": evidence,
+        "question_type": question_type
+    }, dict(evidence=evidence, question_type=question_type)
+
+async def _resolve_insights(question: str):
+    """
+    Deterministic part of /insights.
+
+    Returns:
+        (response, narrative, branch): the /insights response body, keyword
+        arguments for generate_detailed_insights and which branch answered
+    """
+    # Get the same data as the main endpoint but generate detailed insights
+    # Try to get direct answer first for amount questions
+    direct_answer = await run_in_db_thread(get_aggregated_answer, question)
+    
+    if direct_answer and direct_answer.get("total") is not None:
+        return (*_insights_result(
+            question,
+            direct_answer.get("evidence", []),
+            total=direct_answer.get("total"),
+            filters=direct_answer.get("filters")
+        ), "direct_answer")
+    
+    # Fallback to regular retrieval
+    evidence = await _retrieve_evidence(question)
+    return (*_insights_result(question, evidence), "retrieval")
+
 @app.post("/insights")
-def get_insights(payload: Ask):
+async def get_insights(payload: Ask, request: Request, response: Response):
     """
     Get detailed insights for a question (expandable view).
+
+    Streams like /ask when the client accepts text/event-stream or
+    application/x-ndjson. Pass the `insights_handle` from the /ask response
+    to reuse its totals and evidence instead of querying again.
     """
+    started = time.perf_counter()
     try:
-        # Classify the question type
-        question_type = classify_question(payload.question)
-        
-        # Get the same data as the main endpoint but generate detailed insights
-        # Try to get direct answer first for amount questions
-        direct_answer = get_aggregated_answer(payload.question)
-        
-        if direct_answer and direct_answer.get("total") is not None:
-            evidence = direct_answer.get("evidence", [])
-            detailed_insights = generate_detailed_insights(
-                payload.question,
-                evidence,
-                total=direct_answer.get("total"),
-                filters=direct_answer.get("filters"),
-                question_type=question_type
-            )
-            return {
-                "insights": detailed_insights,
-                "evidence": evidence,
-                "filters": direct_answer.get("filters"),
-                "total": direct_answer.get("total"),
-                "question_type": question_type
-            }
+        event_format = streaming.negotiate_event_format(request.headers.get("accept"))
+        version, body = await _answer_cache_lookup("insights", payload.question)
+        if body is not None:
+            observe_request("insights", "cache", time.perf_counter() - started)
+            headers = {"X-Answer-Cache": "HIT"}
+            if event_format:
+                return _event_stream_response(body, "insights", None, event_format, headers=headers)
+            response.headers.update(headers)
+            return body
         
-        # Fallback to regular retrieval
-        ev = retrieve(payload.question, k=5)
-        evidence = [dict(r) for r in ev]
-        detailed_insights = generate_detailed_insights(
-            payload.question,
-            evidence,
-            question_type=question_type
+        # Reuse what /ask already computed for this question when possible
+        stored = result_store.get(payload.insights_handle, version, payload.question) if payload.insights_handle else None
+        if stored is not None:
+            body, narrative = _insights_result(payload.question, **stored)
+            branch = "insights_handle"
+        else:
+            async with request_unit_of_work():
+                body, narrative, branch = await _resolve_insights(payload.question)
+        done = _request_done(
+            "insights", branch, started, _answer_cache_writer(version, "insights", payload.question, "insights", narrative)
         )
-        return {
-            "insights": detailed_insights,
-            "evidence": evidence,
-            "question_type": question_type
-        }
+        headers = {"X-Answer-Cache": "MISS"}
+        if event_format:
+            tokens = stream_detailed_insights(payload.question, **narrative)
+            return _event_stream_response(body, "insights", tokens, event_format, on_done=done, headers=headers)
+        body["insights"] = await generate_detailed_insights(payload.question, **narrative)
+        await done(body)
+        response.headers.update(headers)
+        return body
     
     except Exception as e:
-        import traceback; traceback.print_exc()
+        observe_request("insights", "error", time.perf_counter() - started)
+        logger.exception("/insights failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/summaries", response_model=SummaryResponse)
@@ -1143,35 +1281,129 @@ def get_stats():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Columns /budget-facts can project, with their Arrow types
+BUDGET_FACT_COLUMNS = {
+    "id": "int64",
+    "fiscal_year": "int64",
+    "department": "string",
+    "line_item": "string",
+    "amount": "float64",
+}
+BUDGET_FACTS_BATCH_SIZE = 2000
+
+def _encode_cursor(row) -> str:
+    raw = json.dumps([row["fiscal_year"], row["department"], str(row["amount"]), row["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        fiscal_year, department, amount, row_id = json.loads(raw)
+        return {"c_year": fiscal_year, "c_dept": department, "c_amount": Decimal(amount), "c_id": int(row_id)}
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _iter_budget_fact_batches(params: Dict[str, Any], after_cursor: bool, limit: Optional[int] = None):
+    """Yield budget_facts rows in batches from a server-side cursor."""
+    where_clause = ""
+    if after_cursor:
+        # Keyset predicate matching ORDER BY fiscal_year, department, amount DESC, id
+        where_clause = """
+            WHERE (bf.fiscal_year, bf.department) > (:c_year, :c_dept)
+               OR ((bf.fiscal_year, bf.department) = (:c_year, :c_dept)
+                   AND (bf.amount < :c_amount OR (bf.amount = :c_amount AND bf.id > :c_id)))
+        """
+    limit_clause = "LIMIT :limit" if limit else ""
+    if limit:
+        params = {**params, "limit": limit}
+
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=BUDGET_FACTS_BATCH_SIZE).execute(text(f"""
+            SELECT 
+                bf.id,
+                bf.fiscal_year,
+                bf.department,
+                bf.line_item,
+                bf.amount
+            FROM budget_facts bf
+            {where_clause}
+            ORDER BY bf.fiscal_year, bf.department, bf.amount DESC, bf.id
+            {limit_clause}
+        """), params)
+        for partition in result.mappings().partitions():
+            yield [dict(row) for row in partition]
+
 @app.get("/budget-facts")
-def get_budget_facts():
-    """Get all budget facts for the frontend dashboard."""
+def get_budget_facts(
+    request: Request,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return (default: all)"),
+    limit: Optional[int] = Query(None, ge=1, le=10000, description="Page size; returns {data, next_cursor} when set"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    format: str = Query("json", pattern="^(json|ndjson|arrow)$", description="json, ndjson or arrow"),
+):
+    """
+    Get budget facts for the frontend dashboard.
+
+    Without `limit` the whole table is streamed from a server-side cursor as
+    a JSON array (the original shape), NDJSON or an Arrow IPC stream. With
+    `limit` a single keyset-paginated page is returned. Responses are gzip or
+    brotli compressed when the client accepts it.
+    """
+    columns = list(BUDGET_FACT_COLUMNS)
+    if fields:
+        columns = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in columns if f not in BUDGET_FACT_COLUMNS]
+        if unknown or not columns:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown) or '(none)'}; allowed: {', '.join(BUDGET_FACT_COLUMNS)}")
+    if format == "arrow" and not streaming.arrow_available():
+        raise HTTPException(status_code=406, detail="Arrow output requires pyarrow on the server")
+    if limit and format != "json":
+        raise HTTPException(status_code=400, detail="Pagination (limit) is only supported with format=json")
+
+    params = _decode_cursor(cursor) if cursor else {}
+
+    def project(batches):
+        for batch in batches:
+            yield [{c: row[c] for c in columns} for row in batch]
+
     try:
-        with engine.begin() as conn:
-            results = conn.execute(text("""
-                SELECT 
-                    bf.id,
-                    bf.fiscal_year,
-                    bf.department,
-                    bf.line_item,
-                    bf.amount
-                FROM budget_facts bf
-                ORDER BY bf.fiscal_year, bf.department, bf.amount DESC
-            """)).mappings().all()
-            
-            return [dict(row) for row in results]
-    
+        if limit:
+            # Fetch one extra row to know whether another page exists
+            rows = [row for batch in _iter_budget_fact_batches(params, bool(cursor), limit + 1) for row in batch]
+            next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+            page = [{c: row[c] for c in columns} for row in rows[:limit]]
+            chunks = iter([streaming.dumps({"data": page, "next_cursor": next_cursor}).encode()])
+        else:
+            # Run the query and fetch the first batch before responding, so a
+            # connection or query failure is a 500 rather than a truncated 200
+            source = _iter_budget_fact_batches(params, bool(cursor))
+            first = next(source, [])
+            batches = project(itertools.chain([first], source))
+            chunks = streaming.encode_rows(batches, format, {c: BUDGET_FACT_COLUMNS[c] for c in columns})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    encoding = streaming.negotiate_encoding(request.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return StreamingResponse(
+        streaming.compress_chunks(chunks, encoding),
+        media_type=streaming.MEDIA_TYPES[format],
+        headers=headers
+    )
+
 # New Budget API Endpoints using Supabase Views
+# These routes are async, so every query goes through run_in_db_thread
+# instead of blocking the event loop on the synchronous engine. Their SQL
+# is fixed, so each query is a named prepared statement (app/statements.py).
 @app.get("/api/budget/year-totals")
 async def get_year_totals():
     """Get total budget amounts for all fiscal years"""
     try:
-        with engine.begin() as conn:
-            result = conn.execute(text("SELECT fiscal_year, total FROM v_year_totals ORDER BY fiscal_year"))
-            data = [dict(row) for row in result.mappings().all()]
+        data = await run_in_db_thread(statements.fetch_all, "year_totals")
         
         return {
             "success": True,
@@ -1185,9 +1417,7 @@ async def get_year_totals():
 async def get_yoy():
     """Get year-over-year budget changes"""
     try:
-        with engine.begin() as conn:
-            result = conn.execute(text("SELECT fiscal_year, total, yoy_change FROM v_year_yoy ORDER BY fiscal_year"))
-            data = [dict(row) for row in result.mappings().all()]
+        data = await run_in_db_thread(statements.fetch_all, "year_yoy")
         
         return {
             "success": True,
@@ -1201,15 +1431,7 @@ async def get_yoy():
 async def get_category_ranking(year: str = "FY25", limit: int = 10):
     """Get category rankings for a specific year"""
     try:
-        with engine.begin() as conn:
-            result = conn.execute(text("""
-                SELECT category, total 
-                FROM v_category_totals 
-                WHERE fiscal_year = :year 
-                ORDER BY total DESC 
-                LIMIT :limit
-            """), {"year": year, "limit": limit})
-            data = [dict(row) for row in result.mappings().all()]
+        data = await run_in_db_thread(statements.fetch_all, "category_ranking", {"year": year, "limit": limit})
         
         return {
             "success": True,
@@ -1225,14 +1447,7 @@ async def get_category_ranking(year: str = "FY25", limit: int = 10):
 async def get_category_shares(year: str = "FY25"):
     """Get category shares (percentages) for a specific year"""
     try:
-        with engine.begin() as conn:
-            result = conn.execute(text("""
-                SELECT category, total, pct_of_year 
-                FROM v_category_shares 
-                WHERE fiscal_year = :year 
-                ORDER BY total DESC
-            """), {"year": year})
-            data = [dict(row) for row in result.mappings().all()]
+        data = await run_in_db_thread(statements.fetch_all, "category_shares", {"year": year})
         
         return {
             "success": True,
@@ -1248,19 +1463,12 @@ async def get_category_shares(year: str = "FY25"):
 async def get_line_item_total(year: str = "FY24", category: str = "ADMINISTRATION", line_item: str = "Payroll Taxes"):
     """Get total for a specific line item"""
     try:
-        with engine.begin() as conn:
-            result = conn.execute(text("""
-                SELECT total 
-                FROM v_line_items 
-                WHERE fiscal_year = :year 
-                AND category = :category 
-                AND line_item = :line_item
-            """), {"year": year, "category": category, "line_item": line_item})
-            row = result.fetchone()
-            total = row[0] if row else 0
+        row = await run_in_db_thread(
+            statements.fetch_one, "line_item_total", {"year": year, "category": category, "line_item": line_item}
+        )
+        total = row["total"] if row else 0
         
-        # Debug logging as suggested by ChatGPT
-        print(f"DEBUG line-item API: year={year}, category={category}, line_item={line_item}, total={total}")
+        logger.debug("Line item total", extra={"year": year, "category": category, "line_item": line_item, "total": total})
         
         return {
             "success": True,
@@ -1282,25 +1490,17 @@ async def get_category_yoy(year1: str = "FY24", year2: str = "FY25", category: s
         if not category:
             raise HTTPException(status_code=400, detail="Category parameter is required")
         
-        with engine.begin() as conn:
-            result = conn.execute(text("""
-                SELECT fiscal_year, category, total, prev_total, change_amount, change_percentage
-                FROM v_category_yoy 
-                WHERE fiscal_year = :year2 AND category = :category
-            """), {"year2": year2, "category": category})
-            row = result.fetchone()
-            
-            if not row:
-                return {
-                    "success": True,
-                    "year1": year1,
-                    "year2": year2,
-                    "category": category,
-                    "data": None,
-                    "message": f"No data found for {category} in {year2}"
-                }
-            
-            data = dict(row)
+        data = await run_in_db_thread(statements.fetch_one, "category_yoy", {"year2": year2, "category": category})
+        
+        if not data:
+            return {
+                "success": True,
+                "year1": year1,
+                "year2": year2,
+                "category": category,
+                "data": None,
+                "message": f"No data found for {category} in {year2}"
+            }
         
         return {
             "success": True,
@@ -1310,6 +1510,8 @@ async def get_category_yoy(year1: str = "FY24", year2: str = "FY25", category: s
             "data": data,
             "message": f"Category YoY change for {category} from {year1} to {year2} retrieved successfully"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch category YoY: {str(e)}")
 
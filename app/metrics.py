@@ -0,0 +1,188 @@
+"""
+Pipeline Latency Metrics
+
+Per-stage timing for the /ask and /insights pipeline, exported as
+Prometheus histograms on /metrics:
+
+  - ask_stage_duration_seconds{stage}: time spent in each stage
+      intent_parse     question classification and intent extraction
+      sql              every SQL statement (timed by an engine listener in app/db.py)
+      embedding        embed_texts, including embedding cache hits
+      ann_search       the pgvector similarity query
+      fulltext_search  the tsvector fallback query
+      llm_completion   a chat completion, queueing included (streamed: until the last token)
+      llm_first_token  time to the first streamed token
+  - ask_request_duration_seconds{endpoint, branch}: whole requests, by the
+    branch that produced the answer (cache, budget_api, direct_answer,
+    retrieval, ...). The histogram's _count is the number of answers per branch.
+  - db_pool_checkout_wait_seconds and db_pool_* gauges (see app/db.py)
+
+Metrics are per process and written in the Prometheus text format directly;
+no client library is needed.
+
+Usage:
+    from app.metrics import stage_timer, observe_request, render
+    with stage_timer("embedding"):
+        vectors = embed_texts([question])
+    observe_request("ask", "retrieval", seconds)
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Seconds; spans cube lookups (~1 ms) through slow LLM completions
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_bound(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Histogram:
+    """Labelled histogram with fixed buckets, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            total[0] += seconds
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(counts), total[0]) for key, (counts, total) in self._series.items())
+        for key, counts, total in series:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_bound(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class LatencyStats:
+    """Count, mean, max and recent p50/p95 of a latency in milliseconds."""
+
+    def __init__(self, window: int = 512):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        with self._lock:
+            self.count += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+            self._recent.append(ms)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            recent = sorted(self._recent)
+
+        def pct(q: float) -> float:
+            return round(recent[min(len(recent) - 1, int(q * len(recent)))], 1) if recent else 0.0
+
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 1) if self.count else 0.0,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+class CallbackMetric:
+    """Gauge or counter whose value is read from a callback at scrape time."""
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float], kind: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", f"{self.name} {self.read()}"]
+
+
+STAGE_DURATION = Histogram(
+    "ask_stage_duration_seconds",
+    "Time spent in each stage of the question-answering pipeline.",
+    ["stage"],
+)
+REQUEST_DURATION = Histogram(
+    "ask_request_duration_seconds",
+    "End-to-end /ask and /insights latency by the branch that answered.",
+    ["endpoint", "branch"],
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled database connection, including opening overflow connections.",
+    [],
+)
+REGISTRY: list = [STAGE_DURATION, REQUEST_DURATION, POOL_CHECKOUT_WAIT]
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_DURATION.observe(seconds, stage=stage)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Time the enclosed block as one observation of stage (also when it raises)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def observe_request(endpoint: str, branch: str, seconds: float):
+    REQUEST_DURATION.observe(seconds, endpoint=endpoint, branch=branch)
+
+
+def register_callback(name: str, documentation: str, read: Callable[[], float], kind: str = "gauge"):
+    """Export a value read at scrape time (e.g. pool connections in use)."""
+    REGISTRY.append(CallbackMetric(name, documentation, read, kind))
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
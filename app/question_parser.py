@@ -0,0 +1,313 @@
+"""
+Single-Pass Question Parser
+
+Compiles the question vocabulary (departments, line items, amount phrases,
+question-class keywords, intent keywords) plus the fiscal year and percent
+patterns into ONE regex, built once. A single scan of the lowercased
+question finds every vocabulary occurrence, the fiscal year and any
+percentage; parse_filters, is_amount_question, classify_question and the
+intent fallback in main.py all read from the same ParsedQuestion.
+
+The vocabulary is compiled as a character trie, so at each position the
+regex follows one branch instead of trying every phrase. Because the trie
+always returns the longest phrase starting at a position, shorter phrases
+that are prefixes of it (e.g. "total" inside "total budget") are recovered
+from a precomputed prefix table, so the result matches running every
+pattern separately.
+
+Usage:
+    from app.question_parser import parse_question
+    parsed = parse_question("How much for Public Works in FY25?")
+    parsed.filters()  # {"fiscal_year": 2025, "department": "PUBLIC WORKS", "line_item": None}
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Department patterns for filtering (matching actual database values)
+DEPT_PATTERNS = [
+    r"PUBLIC WORKS", r"POLICE DEPARTMENT", r"PARKS", r"FINANCE", r"ADMINISTRATION",
+    r"FIRE", r"TRANSPORTATION", r"ROADS", r"STREETS", r"WATER", r"SEWER",
+    r"SEWAGE", r"SANITATION", r"GENERAL GOVERNMENT", r"PLANNING", r"RECREATION",
+    r"LIBRARY", r"HEALTH", r"SOCIAL SERVICES", r"EMERGENCY", r"UTILITIES",
+    r"PUBLIC SAFETY", r"COMMUNITY DEVELOPMENT", r"HUMAN RESOURCES",
+    r"GENERAL OFFICE", r"GENERAL GOVT. INSURANCE", r"MAYOR & COUNCIL",
+    r"MAYOR AND COUNCIL", r"PROFESSIONAL SERVICES", r"PUBLIC ASSOCIATIONS",
+    r"ENFORCEMENT FEES", r"ELECTIONS", r"COMMUNITY PROMOTIONS", r"ANNEXATION",
+    r"LICENSE FEES", r"MISC. REVENUES", r"MISCELLANEOUS GRANTS",
+    r"MUNICIPAL BUILDING", r"MUNICIPAL BUILDING GRANT", r"POLICE GRANTS",
+    r"TAXES", r"TRASH REMOVAL", r"GRANTS"
+]
+
+# Common names for departments, checked before DEPT_PATTERNS
+DEPARTMENT_ALIASES = {
+    "police": "POLICE DEPARTMENT",
+    "police department": "POLICE DEPARTMENT",
+    "public works": "PUBLIC WORKS",
+    "administration": "ADMINISTRATION",
+    "taxes": "TAXES",
+    "grants": "GRANTS",
+    "professional services": "PROFESSIONAL SERVICES",
+    "general office": "GENERAL OFFICE",
+    "enforcement fees": "ENFORCEMENT FEES",
+    "license fees": "LICENSE FEES",
+    "trash removal": "TRASH REMOVAL",
+    "misc revenues": "MISC. REVENUES",
+    "miscellaneous grants": "MISCELLANEOUS GRANTS"
+}
+
+# Amount question patterns
+AMOUNT_PATTERNS = [
+    r"how much",
+    r"what is the total",
+    r"total amount",
+    r"budget for",
+    r"allocated to",
+    r"spent on",
+    r"cost of",
+    r"expense for",
+    r"funding for",
+    r"dollar amount",
+    r"dollars",
+    r"budget",
+    r"allocation",
+    r"expenditure"
+]
+
+# Currency/number hints that also mark an amount question
+AMOUNT_HINTS = ["$", "dollar", "amount", "total", "budget"]
+
+# Line item patterns
+LINE_ITEM_PATTERNS = [
+    r"road repairs", r"overtime", r"equipment", r"salaries", r"benefits",
+    r"maintenance", r"utilities", r"supplies", r"training", r"travel",
+    r"contracts", r"services", r"materials", r"fuel", r"insurance"
+]
+
+# Question classes from the ai_assistant_budget_questions.json framework, in priority order
+QUESTION_CLASS_KEYWORDS: List[Tuple[str, List[str]]] = [
+    ("totals_and_aggregates", ['total budget', 'total', 'sum', 'aggregate', 'combined']),
+    ("category_comparisons", ['compare', 'which category', 'rank', 'most funding', 'highest', 'lowest']),
+    ("line_item_details", ['line item', 'allocated to', 'largest line item', 'show me all line items']),
+    ("trend_analysis", ['change from', 'grew the most', 'decreased from', 'trend', 'over time']),
+    ("cross_year_comparisons", ['increased in', 'year-over-year', 'disappear', 'compared to']),
+    ("breakdowns_shares", ['percentage', 'share', 'top 5', 'breakdown']),
+    ("partial_fy26_data", ['fy26', '2026', 'partial', 'currently available']),
+    ("custom_filters", ['over $', 'more than', 'under $', 'list categories', 'show me all expenditures']),
+    ("natural_language_trends", ['biggest drivers', 'summarize', 'plain english', 'why does', 'tell me']),
+    ("what_if_hypothetical", ['if', 'would', 'hypothetical', 'what if']),
+]
+
+# Phrases the deterministic intent fallback (main.get_intent_from_question)
+# and the /ask answer branches switch on
+INTENT_KEYWORDS = [
+    "total budget", "total for", "difference", "percentage", "make up",
+    "most funding", "highest", "show me", "spending", "percent change",
+    "change from", "cut", "reduce", "budget cut", "all departments", "across",
+    "if ", "what if", "increase", "decrease", "lose", "gain", "hypothetical",
+    "public works",
+    "how did", "change", "grew the most", "decreased", "compare", "rank", "share", "top 5",
+]
+
+# Fiscal year patterns in priority order; the first pattern that matches anywhere wins
+YEAR_PATTERNS = [
+    r"fy\s*(\d{2,4})",
+    r"fiscal\s+year\s+(\d{2,4})",
+    r"(\d{4})\s*budget",
+    r"(\d{4})\s*fiscal",
+    r"budget\s+(\d{4})",
+    r"in\s+(\d{4})",
+    r"for\s+(\d{4})",
+]
+
+
+def normalize_year(year: int) -> int:
+    """Expand a 2-digit year (25 -> 2025, 99 -> 1999)."""
+    if year < 100:
+        return 2000 + year if year < 50 else 1900 + year
+    return year
+
+
+def _trie_pattern(node: Dict) -> str:
+    """Regex for a character trie; greedy, so it matches the longest phrase."""
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    return "(?:" + body + ")?" if "" in node else body
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+def _at_boundary(text: str, i: int) -> bool:
+    """Same test as regex \\b at position i."""
+    before = i > 0 and _is_word(text[i - 1])
+    after = i < len(text) and _is_word(text[i])
+    return before != after
+
+
+class ParsedQuestion:
+    """Everything the deterministic handlers need from one question."""
+
+    __slots__ = ("text", "vocabulary", "phrases", "bounded", "keywords", "fiscal_year", "fy_labels", "percent",
+                 "department", "department_phrase", "line_item", "departments", "line_items", "is_amount",
+                 "question_class")
+
+    def has(self, phrase: str) -> bool:
+        """True if phrase occurs anywhere in the question (substring semantics)."""
+        if phrase in self.vocabulary:
+            return phrase in self.phrases
+        return phrase in self.text
+
+    def filters(self) -> Dict[str, Optional[str]]:
+        return {
+            "fiscal_year": self.fiscal_year,
+            "department": self.department,
+            "line_item": self.line_item,
+        }
+
+
+class QuestionMatcher:
+    """Compiled single-pass matcher over a fixed vocabulary."""
+
+    def __init__(
+        self,
+        department_aliases: Dict[str, str] = DEPARTMENT_ALIASES,
+        department_patterns: Sequence[str] = DEPT_PATTERNS,
+        extra_department_aliases: Optional[Dict[str, str]] = None,
+        line_item_patterns: Sequence[str] = LINE_ITEM_PATTERNS,
+        line_item_aliases: Optional[Dict[str, str]] = None,
+        amount_patterns: Sequence[str] = AMOUNT_PATTERNS,
+        question_classes: Sequence[Tuple[str, Sequence[str]]] = QUESTION_CLASS_KEYWORDS,
+        intent_keywords: Sequence[str] = INTENT_KEYWORDS,
+    ):
+        # lowercased phrase -> (priority, value); matched on \b boundaries, lowest priority wins
+        self.departments: Dict[str, Tuple[int, str]] = {}
+        for key, value in department_aliases.items():
+            self.departments.setdefault(key.lower(), (len(self.departments), value))
+        for pattern in department_patterns:
+            self.departments.setdefault(pattern.lower(), (len(self.departments), pattern))
+        for key, value in (extra_department_aliases or {}).items():
+            self.departments.setdefault(key.lower(), (len(self.departments), value))
+        self.line_items: Dict[str, Tuple[int, str]] = {}
+        for pattern in line_item_patterns:
+            self.line_items.setdefault(pattern.lower(), (len(self.line_items), pattern))
+        for key, value in (line_item_aliases or {}).items():
+            self.line_items.setdefault(key.lower(), (len(self.line_items), value))
+        self.amount_phrases = [p.lower() for p in amount_patterns] + AMOUNT_HINTS
+        self.question_classes = [(name, [k.lower() for k in keywords]) for name, keywords in question_classes]
+
+        self.vocabulary = set(self.departments) | set(self.line_items)
+        self.vocabulary.update(self.amount_phrases)
+        self.vocabulary.update(k for _, keywords in self.question_classes for k in keywords)
+        self.vocabulary.update(k.lower() for k in intent_keywords)
+
+        trie: Dict = {}
+        for phrase in self.vocabulary:
+            node = trie
+            for ch in phrase:
+                node = node.setdefault(ch, {})
+            node[""] = {}
+        # Every vocabulary phrase that is a prefix of (or equal to) a longest match
+        self._prefixes = {
+            phrase: [phrase[:i] for i in range(1, len(phrase) + 1) if phrase[:i] in self.vocabulary]
+            for phrase in self.vocabulary
+        }
+
+        years = "|".join(
+            pattern.replace("(", f"(?P<y{i}>", 1) for i, pattern in enumerate(YEAR_PATTERNS)
+        )
+        self.pattern = re.compile(
+            f"(?=(?P<kw>{_trie_pattern(trie)}))?"
+            f"(?=(?P<year>{years}))?"
+            r"(?=(?P<pct>\d+)%)?"
+            r"(?(kw)|(?(year)|(?(pct)|(?!))))"
+        )
+
+    @staticmethod
+    def _best(ranked: Dict[str, Tuple[int, str]], found) -> Tuple[Optional[str], Optional[str]]:
+        """(phrase, value) of the highest-priority phrase in found."""
+        best = None
+        for phrase in found:
+            entry = ranked.get(phrase)
+            if entry is not None and (best is None or entry[0] < best[1][0]):
+                best = (phrase, entry)
+        return (best[0], best[1][1]) if best else (None, None)
+
+    def parse(self, question: str) -> ParsedQuestion:
+        text = question.lower()
+        phrases = set()
+        # dict rather than set: keeps the order phrases occur in the question
+        bounded: Dict[str, None] = {}
+        year_hits: Dict[int, int] = {}
+        fy_labels: List[Tuple[str, int]] = []
+        percent = None
+
+        for m in self.pattern.finditer(text):
+            start = m.start()
+            longest = m.group("kw")
+            if longest is not None:
+                for phrase in self._prefixes[longest]:
+                    phrases.add(phrase)
+                    if _at_boundary(text, start) and _at_boundary(text, start + len(phrase)):
+                        bounded.setdefault(phrase)
+            if m.group("year") is not None:
+                for i in range(len(YEAR_PATTERNS)):
+                    digits = m.group(f"y{i}")
+                    if digits is not None:
+                        year_hits.setdefault(i, int(digits))
+                        if i == 0 and text[start + 2].isdigit() and (not fy_labels or fy_labels[-1][1] <= start):
+                            fy_labels.append((f"FY{digits}", start + 2 + len(digits)))
+                        break
+            if percent is None and m.group("pct") is not None:
+                percent = float(m.group("pct"))
+
+        parsed = ParsedQuestion()
+        parsed.text = text
+        parsed.vocabulary = self.vocabulary
+        parsed.phrases = frozenset(phrases)
+        parsed.bounded = frozenset(bounded)
+        # Matched phrases other than department / line-item names
+        parsed.keywords = frozenset(p for p in phrases if p not in self.departments and p not in self.line_items)
+        parsed.fiscal_year = normalize_year(year_hits[min(year_hits)]) if year_hits else None
+        parsed.fy_labels = [label for label, _ in fy_labels]
+        parsed.percent = percent
+        parsed.department_phrase, parsed.department = self._best(self.departments, bounded)
+        parsed.line_item = self._best(self.line_items, bounded)[1]
+        # Every department / line item named, in question order
+        parsed.departments = tuple(dict.fromkeys(self.departments[p][1] for p in bounded if p in self.departments))
+        parsed.line_items = tuple(dict.fromkeys(self.line_items[p][1] for p in bounded if p in self.line_items))
+        parsed.is_amount = any(phrase in phrases for phrase in self.amount_phrases)
+        parsed.question_class = next(
+            (name for name, keywords in self.question_classes if any(k in phrases for k in keywords)),
+            "general",
+        )
+        return parsed
+
+
+_default_matcher = QuestionMatcher()
+
+
+def set_matcher(matcher: QuestionMatcher):
+    """Publish a matcher built from a new vocabulary and forget cached parses."""
+    global _default_matcher
+    _default_matcher = matcher
+    parse_question.cache_clear()
+
+
+@lru_cache(maxsize=1024)
+def parse_question(question: str) -> ParsedQuestion:
+    """
+    Parse a question in one pass over its lowercased text.
+
+    Args:
+        question: The user's question
+
+    Returns:
+        ParsedQuestion with filters, amount intent, question class, FY labels
+        and the vocabulary phrases found; cached per question string
+    """
+    return _default_matcher.parse(question)
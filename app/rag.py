@@ -1,14 +1,37 @@
 from sqlalchemy import text, bindparam, Integer
+import os
 import re
-from .db import engine
+from typing import Optional
+from .db import read_connection
+from .log import get_logger
+from .metrics import stage_timer
 from .llm import embed_texts
-from .qa import get_direct_answer
+from .qa import get_direct_answer, get_year_over_year_comparison
+from .question_parser import parse_question
 from pgvector.sqlalchemy import Vector as VectorType  # <-- SQLAlchemy type
 
-DEPT_HINTS = [
-    "Public Works","Police","Parks","Finance","Administration","Fire",
-    "Transportation","Roads","Streets","Water","Sewer","Sanitation","General Government"
-]
+logger = get_logger(__name__)
+
+# ANN search knobs, overridable per call to retrieve()
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+
+# "vector" (full-text search only as a fallback) or "hybrid" (both, fused)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector").lower()
+# Hybrid mode pulls k * this many candidates from each retriever before fusing
+HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", "4"))
+# Reciprocal rank fusion damping constant (60 is the usual choice)
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+def set_ann_params(conn, probes: Optional[int] = None, ef_search: Optional[int] = None):
+    """Set ivfflat.probes / hnsw.ef_search for the current transaction only."""
+    conn.execute(text("""
+        SELECT set_config('ivfflat.probes', :probes, true),
+               set_config('hnsw.ef_search', :ef_search, true)
+    """), {
+        "probes": str(probes or IVFFLAT_PROBES),
+        "ef_search": str(ef_search or HNSW_EF_SEARCH)
+    })
 
 def _extract_year(q: str):
     m = re.search(r'(?i)\bFY\s*([0-9]{2,4})\b', q)
@@ -19,46 +42,85 @@ def _extract_year(q: str):
     return int(m.group(1)) if m else None
 
 def _extract_dept(q: str):
-    for d in DEPT_HINTS:
-        if re.search(rf'(?i)\b{re.escape(d)}\b', q):
-            return d
-    return None
+    # Department vocabulary comes from the budget data (see app/vocabulary.py);
+    # the question's own wording is what appears in chunk text
+    return parse_question(q).department_phrase
 
-def retrieve(question: str, k: int = 5):
-    # 1) try vector similarity (NO ::vector cast here)
+_CHUNK_COLUMNS = """
+    c.id,
+    c.chunk_text,
+    d.id          AS document_id,
+    d.file_name   AS file_name,
+    d.fiscal_year AS fiscal_year,
+    d.department  AS department
+"""
+
+def embed_query(question: str) -> Optional[list]:
+    """The question's embedding for retrieve(), or None if the embeddings API is unavailable."""
     try:
-        qvec = embed_texts([question])[0]
-        stmt = text("""
-            SELECT
-              c.id,
-              c.chunk_text,
-              d.id          AS document_id,
-              d.file_name   AS file_name,
-              d.fiscal_year AS fiscal_year,
-              d.department  AS department
+        return embed_texts([question])[0]
+    except Exception as e:
+        logger.warning("Question embedding failed, vector search skipped: %s", e)
+        return None
+
+def _vector_retrieve(qvec: list, k: int, probes: Optional[int], ef_search: Optional[int]):
+    # NO ::vector cast here; <=> is cosine distance, matching the
+    # vector_cosine_ops index on chunks.embedding
+    stmt = text(f"""
+        SELECT {_CHUNK_COLUMNS}
+        FROM public.chunks c
+        LEFT JOIN public.documents d ON d.id = c.document_id
+        ORDER BY c.embedding <=> :q
+        LIMIT :k
+    """).bindparams(
+        bindparam("q", type_=VectorType(1536)),
+        bindparam("k", type_=Integer())
+    )
+    with stage_timer("ann_search"), read_connection() as conn:
+        set_ann_params(conn, probes, ef_search)
+        return conn.execute(stmt, {"q": qvec, "k": int(k)}).mappings().all()
+
+def _search_terms(question: str):
+    """Words worth searching for: year / department hints first, then the rest of the question."""
+    terms = []
+    year = _extract_year(question)
+    if year:
+        terms.append(str(year))
+    dept = _extract_dept(question)
+    if dept:
+        terms.extend(re.findall(r"[^\W_]+", dept))
+    # Letters and digits only, so every term is a valid to_tsquery operand
+    terms.extend(t for t in re.findall(r"[^\W_]+", question) if len(t) > 3 or t.isdigit())
+    return list(dict.fromkeys(t.lower() for t in terms))
+
+def lexical_retrieve(question: str, k: int = 5):
+    """
+    Full-text search over chunks.chunk_tsv (db/migrations/005_chunks_fulltext_search.sql).
+
+    Chunks matching any search term are ranked by ts_rank_cd, so the ones
+    covering more of the question, closer together, come first.
+    """
+    terms = _search_terms(question)
+    if not terms:
+        return []
+    with stage_timer("fulltext_search"), read_connection() as conn:
+        return conn.execute(text(f"""
+            SELECT {_CHUNK_COLUMNS}
             FROM public.chunks c
+            CROSS JOIN to_tsquery('english', :query) q
             LEFT JOIN public.documents d ON d.id = c.document_id
-            ORDER BY c.embedding <-> :q
+            WHERE c.chunk_tsv @@ q
+            ORDER BY ts_rank_cd(c.chunk_tsv, q) DESC
             LIMIT :k
-        """).bindparams(
-            bindparam("q", type_=VectorType(1536)),
-            bindparam("k", type_=Integer())
-        )
-        with engine.begin() as conn:
-            rows = conn.execute(stmt, {"q": qvec, "k": int(k)}).mappings().all()
-        if rows:
-            return rows
-    except Exception as e:
-        print("Vector retrieve failed:", e)
+        """), {"query": " | ".join(terms), "k": int(k)}).mappings().all()
 
-    # 2) tokenized text fallback
+def _ilike_retrieve(question: str, k: int = 5):
+    """Substring search, for databases without the chunk_tsv column."""
     year = _extract_year(question)
     dept = _extract_dept(question)
 
-    sql = """
-      SELECT
-        c.id, c.chunk_text,
-        d.id AS document_id, d.file_name, d.fiscal_year, d.department
+    sql = f"""
+      SELECT {_CHUNK_COLUMNS}
       FROM public.chunks c
       LEFT JOIN public.documents d ON d.id = c.document_id
       WHERE 1=1
@@ -69,16 +131,75 @@ def retrieve(question: str, k: int = 5):
     if year:
         sql += " AND c.chunk_text ILIKE :year"; params["year"] = f"%{year}%"
     if not dept and not year:
-        import re as _re
-        tokens = [t for t in _re.findall(r"\\w+", question) if len(t) > 3][:4]
+        tokens = [t for t in re.findall(r"\w+", question) if len(t) > 3][:4]
         for i, tok in enumerate(tokens):
             sql += f" AND c.chunk_text ILIKE :tok{i}"
             params[f"tok{i}"] = f"%{tok}%"
     sql += " LIMIT :k"; params["k"] = int(k)
 
-    with engine.begin() as conn:
+    with read_connection() as conn:
         return conn.execute(text(sql), params).mappings().all()
 
+def _text_retrieve(question: str, k: int):
+    try:
+        return lexical_retrieve(question, k)
+    except Exception as e:
+        logger.warning("Full-text retrieve failed, using ILIKE: %s", e)
+        return _ilike_retrieve(question, k)
+
+def reciprocal_rank_fusion(rankings, k: int, rrf_k: int = RRF_K):
+    """
+    Merge ranked row lists by reciprocal rank fusion.
+
+    Each row scores sum(1 / (rrf_k + rank)) over the lists it appears in,
+    so rows ranked well by both retrievers rise to the top without having
+    to put cosine distances and ts_rank_cd scores on one scale.
+    """
+    scores, rows = {}, {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row["id"]] = scores.get(row["id"], 0.0) + 1.0 / (rrf_k + rank)
+            rows.setdefault(row["id"], row)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [rows[chunk_id] for chunk_id in best]
+
+def retrieve(question: str, k: int = 5, probes: Optional[int] = None, ef_search: Optional[int] = None,
+             mode: Optional[str] = None, query_vector: Optional[list] = None, embed: bool = True):
+    """
+    Evidence chunks for a question.
+
+    mode (default RETRIEVAL_MODE):
+      - "vector": cosine search; full-text search only if that fails or finds nothing
+      - "hybrid": both, merged by reciprocal rank fusion
+
+    probes / ef_search trade recall for latency on ivfflat / hnsw respectively.
+
+    query_vector is the question's embedding (embed_query). Inside
+    request_unit_of_work, compute it beforehand with the connection released
+    so the embeddings call doesn't hold it; with embed=False a missing vector
+    skips vector search instead of embedding here.
+    """
+    mode = mode or RETRIEVAL_MODE
+    candidates = max(int(k) * HYBRID_CANDIDATE_FACTOR, int(k)) if mode == "hybrid" else int(k)
+
+    if query_vector is None and embed:
+        query_vector = embed_query(question)
+
+    vector_rows = []
+    if query_vector is not None:
+        try:
+            vector_rows = _vector_retrieve(query_vector, candidates, probes, ef_search)
+        except Exception as e:
+            logger.warning("Vector retrieve failed: %s", e)
+
+    if mode != "hybrid" and vector_rows:
+        return vector_rows
+
+    text_rows = _text_retrieve(question, candidates)
+    if mode == "hybrid":
+        return reciprocal_rank_fusion([vector_rows, text_rows], int(k))
+    return text_rows
+
 def get_aggregated_answer(question: str):
     """
     Get aggregated answer for amount questions.
@@ -96,50 +217,16 @@ def get_comparison_data(question: str):
     if not filters.get("fiscal_year") or not filters.get("department"):
         return None
     
-    fiscal_year = filters["fiscal_year"]
-    department = filters["department"]
+    comparison = get_year_over_year_comparison(filters["department"], filters["fiscal_year"])
+    if comparison is None:
+        return None
     
-    with engine.begin() as conn:
-        # Get current year total
-        current_query = """
-            SELECT SUM(amount) as total
-            FROM budget_facts
-            WHERE department = :department AND fiscal_year = :fiscal_year
-        """
-        current_result = conn.execute(text(current_query), {
-            "department": department,
-            "fiscal_year": fiscal_year
-        }).scalar_one()
-        
-        # Get previous year total
-        prev_year = fiscal_year - 1
-        prev_query = """
-            SELECT SUM(amount) as total
-            FROM budget_facts
-            WHERE department = :department AND fiscal_year = :fiscal_year
-        """
-        prev_result = conn.execute(text(prev_query), {
-            "department": department,
-            "fiscal_year": prev_year
-        }).scalar_one()
-        
-        if current_result is None or prev_result is None:
-            return None
-        
-        current_total = float(current_result)
-        prev_total = float(prev_result)
-        
-        if prev_total == 0:
-            change_pct = 0
-        else:
-            change_pct = (current_total - prev_total) / prev_total
-        
-        return {
-            "department": department,
-            "current_year": fiscal_year,
-            "previous_year": prev_year,
-            "current_total": current_total,
-            "previous_total": prev_total,
-            "difference": current_total - prev_total,
-            "change_pct": change_pct
-        }
+    return {
+        "department": comparison["department"],
+        "current_year": comparison["current_year"],
+        "previous_year": comparison["previous_year"],
+        "current_total": comparison["current_total"],
+        "previous_total": comparison["previous_total"],
+        "difference": comparison["change_amount"],
+        "change_pct": comparison["change_pct"]
+    }
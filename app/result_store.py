@@ -0,0 +1,92 @@
+"""
+Short-Lived Result Store for /ask -> /insights
+
+The chat widget calls /ask and then, when the user expands a message,
+/insights for the same question. Both need the same aggregate lookup and
+evidence retrieval, so /ask stores what it computed under a random handle
+(returned as `insights_handle`) and /insights picks it up instead of
+re-running the SQL and the question embedding.
+
+A handle is only honoured for the same data version and the same parsed
+question (app.answer_cache.intent_key), and expires after
+RESULT_STORE_TTL seconds. The store is per process; a handle that lands on
+another worker, or has expired, just means /insights recomputes.
+
+Usage:
+    from app.result_store import result_store
+    handle = result_store.put(version, question, {"evidence": [...], "total": 12.5})
+    inputs = result_store.get(handle, version, question)
+"""
+
+import copy
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from .answer_cache import intent_key
+
+RESULT_STORE_SIZE = int(os.getenv("RESULT_STORE_SIZE", "1024"))
+RESULT_STORE_TTL = float(os.getenv("RESULT_STORE_TTL", "300"))
+
+
+class StoredResult:
+    """Computed /ask inputs plus what a handle must match to be reused."""
+
+    __slots__ = ("version", "key", "inputs", "expires_at")
+
+    def __init__(self, version: str, key: tuple, inputs: Dict):
+        self.version = version
+        self.key = key
+        self.inputs = inputs
+        self.expires_at = time.monotonic() + RESULT_STORE_TTL
+
+
+class ResultStore:
+    """Bounded, TTL-limited map of handle -> computed results."""
+
+    def __init__(self, max_entries: int = RESULT_STORE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, StoredResult]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, version: Optional[str], question: str, inputs: Dict) -> Optional[str]:
+        """
+        Store computed results for question.
+
+        Returns:
+            A handle for get(), or None when the data version is unknown
+        """
+        if version is None:
+            return None
+        handle = secrets.token_urlsafe(16)
+        entry = StoredResult(version, intent_key("ask", question)[0], copy.deepcopy(inputs))
+        with self._lock:
+            self._entries[handle] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return handle
+
+    def get(self, handle: str, version: Optional[str], question: str) -> Optional[Dict]:
+        """Stored results for handle if it is live and matches version and question, else None."""
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                del self._entries[handle]
+                entry = None
+            if entry is None or entry.version != version or entry.key != intent_key("ask", question)[0]:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return copy.deepcopy(entry.inputs)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+result_store = ResultStore()
@@ -0,0 +1,201 @@
+"""
+Prepared Statement Registry
+
+Named SQL statements for the fixed queries behind the budget endpoints and
+the aggregation helpers. On Postgres each statement is PREPAREd once per
+pooled connection and then run with EXECUTE, so the server parses and
+analyzes it once and, after a few executions, reuses a generic plan
+instead of planning every call (see plan_cache_mode).
+
+psycopg2 has no driver-side auto-prepare, so this uses SQL-level
+PREPARE/EXECUTE. Which statements a connection has prepared is tracked in
+the pool's per-connection info dict, so a recycled or reconnected
+connection prepares again. Prepared plans survive the loader's table swap:
+Postgres re-analyzes a cached statement when a table it references is
+renamed or dropped, so it follows the new budget_facts.
+
+Statements run as plain text() queries instead when PREPARED_STATEMENTS=0,
+behind PgBouncer in transaction mode (DB_PGBOUNCER=1, where a session's
+prepared statements aren't pinned to one server connection), and on
+non-Postgres databases.
+
+Usage:
+    from app.statements import statements
+    statements.register("year_totals", "SELECT fiscal_year, total FROM v_year_totals WHERE fiscal_year = :year")
+    rows = statements.fetch_all("year_totals", {"year": "FY25"})
+
+    with read_connection() as conn:
+        result = statements.execute(conn, "year_totals", {"year": "FY25"})
+"""
+
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+from .db import DB_PGBOUNCER, read_connection
+
+PREPARED_STATEMENTS = os.getenv("PREPARED_STATEMENTS", "1") == "1"
+
+# :name binds, but not ::type casts
+_PARAM_RE = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+_NAME_RE = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+class Statement:
+    """A named query in SQLAlchemy text() form plus its PREPARE / EXECUTE forms."""
+
+    __slots__ = ("name", "sql", "params", "text", "prepare_sql", "execute_sql")
+
+    def __init__(self, name: str, sql: str, types: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            name: Statement name (lower-case SQL identifier)
+            sql: Query with :name bind parameters
+            types: Optional Postgres types for parameters whose type can't
+                be inferred from the query; the rest are left to inference
+        """
+        if not _NAME_RE.match(name):
+            raise ValueError(f"Invalid statement name: {name!r}")
+        params: List[str] = []
+
+        def positional(match) -> str:
+            if match.group(1) not in params:
+                params.append(match.group(1))
+            return f"${params.index(match.group(1)) + 1}"
+
+        body = _PARAM_RE.sub(positional, sql)
+        types = types or {}
+        self.name = name
+        self.sql = sql
+        self.params = params
+        self.text = text(sql)
+        # Undeclared ("unknown") parameter types are inferred by the server
+        declared = f" ({', '.join(types.get(p, 'unknown') for p in params)})" if types else ""
+        self.prepare_sql = f"PREPARE {name}{declared} AS {body}"
+        # psycopg2 pyformat placeholders for the EXECUTE arguments
+        self.execute_sql = f"EXECUTE {name}" + (f" ({', '.join(f'%({p})s' for p in params)})" if params else "")
+
+
+class StatementRegistry:
+    """Process-wide map of statement name -> Statement, with per-connection preparation."""
+
+    def __init__(self, enabled: bool = PREPARED_STATEMENTS):
+        self.enabled = enabled and not DB_PGBOUNCER
+        self._statements: Dict[str, Statement] = {}
+        self._lock = threading.Lock()
+        self.prepares = 0
+        self.executions = 0
+
+    def register(self, name: str, sql: str, types: Optional[Dict[str, str]] = None) -> Statement:
+        """
+        Add a statement, or return the existing one with that name.
+
+        Raises:
+            ValueError: name is already registered with different SQL
+        """
+        with self._lock:
+            existing = self._statements.get(name)
+            if existing is not None:
+                if existing.sql != sql:
+                    raise ValueError(f"Statement {name!r} is already registered with different SQL")
+                return existing
+            statement = Statement(name, sql, types)
+            self._statements[name] = statement
+            return statement
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._statements
+
+    def get(self, name: str) -> Statement:
+        return self._statements[name]
+
+    def _prepares(self, conn) -> bool:
+        return self.enabled and conn.dialect.name == "postgresql"
+
+    def prepare(self, conn, name: str) -> bool:
+        """
+        PREPARE a registered statement on conn unless this connection already has.
+
+        Returns:
+            False if statements run unprepared on this connection
+        """
+        if not self._prepares(conn):
+            return False
+        prepared = conn.connection.info.setdefault("prepared_statements", set())
+        if name not in prepared:
+            conn.exec_driver_sql(self._statements[name].prepare_sql)
+            prepared.add(name)
+            self.prepares += 1
+        return True
+
+    def execute(self, conn, name: str, params: Optional[Dict[str, Any]] = None):
+        """
+        Run a registered statement on conn, preparing it first if this
+        connection hasn't yet.
+
+        Returns:
+            The CursorResult, as conn.execute() would
+        """
+        statement = self._statements[name]
+        params = params or {}
+        self.executions += 1
+        if not self.prepare(conn, name):
+            return conn.execute(statement.text, params)
+        if not statement.params:
+            return conn.exec_driver_sql(statement.execute_sql)
+        return conn.exec_driver_sql(statement.execute_sql, {p: params[p] for p in statement.params})
+
+    def fetch_all(self, name: str, params: Optional[Dict[str, Any]] = None) -> List[dict]:
+        """Run a registered read query and return its rows as dicts."""
+        with read_connection() as conn:
+            return [dict(row) for row in self.execute(conn, name, params).mappings().all()]
+
+    def fetch_one(self, name: str, params: Optional[Dict[str, Any]] = None) -> Optional[dict]:
+        """Run a registered read query and return the first row as a dict, or None."""
+        with read_connection() as conn:
+            row = self.execute(conn, name, params).mappings().first()
+            return dict(row) if row else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "statements": len(self._statements),
+            "prepares": self.prepares,
+            "executions": self.executions,
+        }
+
+
+statements = StatementRegistry()
+
+# Budget view lookups behind the /api/budget/* endpoints. The aggregate
+# helpers register theirs in app/aggregates.py and app/qa.py.
+statements.register("year_totals", "SELECT fiscal_year, total FROM v_year_totals ORDER BY fiscal_year")
+statements.register("year_yoy", "SELECT fiscal_year, total, yoy_change FROM v_year_yoy ORDER BY fiscal_year")
+statements.register("category_ranking", """
+    SELECT category, total
+    FROM v_category_totals
+    WHERE fiscal_year = :year
+    ORDER BY total DESC
+    LIMIT :limit
+""")
+statements.register("category_shares", """
+    SELECT category, total, pct_of_year
+    FROM v_category_shares
+    WHERE fiscal_year = :year
+    ORDER BY total DESC
+""")
+statements.register("line_item_total", """
+    SELECT total
+    FROM v_line_items
+    WHERE fiscal_year = :year
+    AND category = :category
+    AND line_item = :line_item
+""")
+statements.register("category_yoy", """
+    SELECT fiscal_year, category, total, prev_total, change_amount, change_percentage
+    FROM v_category_yoy
+    WHERE fiscal_year = :year2 AND category = :category
+""")
@@ -0,0 +1,197 @@
+"""
+Streaming Response Helpers
+
+Serializers that turn batches of row dicts into JSON array, NDJSON or
+Arrow IPC byte chunks, plus Accept-Encoding negotiation and incremental
+gzip/brotli compression. Each batch is flushed as soon as it is encoded,
+so memory and time-to-first-byte don't grow with the result size.
+
+Also encodes named events (meta / token / done) as Server-Sent Events or
+NDJSON for the streaming /ask and /insights responses.
+
+Arrow output needs the optional pyarrow package and brotli the optional
+brotli package; both degrade gracefully when missing.
+
+Usage:
+    from app.streaming import encode_rows, negotiate_encoding, compress_chunks
+    from app.streaming import negotiate_event_format, encode_event
+"""
+
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Optional
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "sse": "text/event-stream",
+}
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj) -> str:
+    return json.dumps(obj, default=_default, separators=(",", ":"))
+
+
+def json_array_chunks(batches: Iterable[List[Dict]]) -> Iterator[bytes]:
+    """Encode batches as one JSON array, emitted incrementally."""
+    yield b"["
+    first = True
+    for batch in batches:
+        if not batch:
+            continue
+        body = ",".join(dumps(row) for row in batch)
+        yield (body if first else "," + body).encode()
+        first = False
+    yield b"]"
+
+
+def ndjson_chunks(batches: Iterable[List[Dict]]) -> Iterator[bytes]:
+    """Encode batches as newline-delimited JSON, one row per line."""
+    for batch in batches:
+        if batch:
+            yield "".join(dumps(row) + "\n" for row in batch).encode()
+
+
+def arrow_chunks(batches: Iterable[List[Dict]], arrow_types: Dict[str, str]) -> Iterator[bytes]:
+    """
+    Encode batches as an Arrow IPC stream.
+
+    Args:
+        batches: Row dict batches, all with the keys of arrow_types
+        arrow_types: Column name -> pyarrow type name ("int64", "float64", "string")
+    """
+    import pyarrow as pa
+
+    schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in arrow_types.items()])
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+
+    def drain() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    yield drain()  # schema message
+    for batch in batches:
+        if not batch:
+            continue
+        columns = []
+        for name, type_name in arrow_types.items():
+            values = [row[name] for row in batch]
+            if type_name == "float64":
+                values = [None if v is None else float(v) for v in values]
+            columns.append(values)
+        writer.write_batch(pa.record_batch(columns, schema=schema))
+        yield drain()
+    writer.close()
+    yield drain()
+
+
+def encode_rows(batches: Iterable[List[Dict]], fmt: str, arrow_types: Optional[Dict[str, str]] = None) -> Iterator[bytes]:
+    """Dispatch to the serializer for fmt ("json", "ndjson" or "arrow")."""
+    if fmt == "ndjson":
+        return ndjson_chunks(batches)
+    if fmt == "arrow":
+        return arrow_chunks(batches, arrow_types or {})
+    return json_array_chunks(batches)
+
+
+def arrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Pick a content coding from an Accept-Encoding header.
+
+    Returns:
+        "br" (when brotli is installed), "gzip", or None for identity
+    """
+    offered = {}
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[token.strip().lower()] = q
+
+    candidates = ["gzip"]
+    if brotli is not None:
+        candidates.insert(0, "br")
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = offered.get(coding, offered.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress_chunks(chunks: Iterable[bytes], encoding: Optional[str]) -> Iterator[bytes]:
+    """Compress a chunk stream, flushing after every chunk so bytes go out immediately."""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=5)
+        for chunk in chunks:
+            out = compressor.process(chunk) + compressor.flush()
+            if out:
+                yield out
+        yield compressor.finish()
+    elif encoding == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            out = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if out:
+                yield out
+        yield compressor.flush()
+    else:
+        yield from chunks
+
+
+def negotiate_event_format(accept: Optional[str]) -> Optional[str]:
+    """
+    Pick an event stream format from an Accept header.
+
+    Returns:
+        "sse" for text/event-stream, "ndjson" for application/x-ndjson, or
+        None when the client wants a plain JSON response
+    """
+    accept = (accept or "").lower()
+    if MEDIA_TYPES["sse"] in accept:
+        return "sse"
+    if MEDIA_TYPES["ndjson"] in accept:
+        return "ndjson"
+    return None
+
+
+def encode_event(fmt: str, event: str, data) -> bytes:
+    """Encode one named event as an SSE frame or an NDJSON line."""
+    if fmt == "sse":
+        return f"event: {event}\ndata: {dumps(data)}\n\n".encode()
+    return (dumps({"event": event, "data": data}) + "\n").encode()
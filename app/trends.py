@@ -0,0 +1,144 @@
+"""
+Vectorized Trend Engine
+
+Pivots (fiscal_year, department, total) rows into a year x department
+NumPy matrix in one pass, then computes trend figures for every
+department at once:
+
+  - year-over-year deltas and percentage changes between consecutive years
+  - change and CAGR between the first and last year
+  - per-year ranks (1 = largest) and rank movement
+
+Departments with no rows in a year hold NaN for that year. A NULL
+department (budget_facts.department is nullable) is its own column,
+labelled None and placed last. Any number of
+years is supported; app.qa.get_trend_analysis compares the first and the
+last year the question mentions.
+
+Usage:
+    from app.trends import TrendMatrix
+    matrix = TrendMatrix.from_rows(rows)
+    matrix.changes()
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class TrendMatrix:
+    """Year x department totals with vectorized trend calculations."""
+
+    def __init__(self, years: Sequence[int], departments: Sequence[str], totals: np.ndarray):
+        """
+        Args:
+            years: Fiscal years, ascending (matrix rows)
+            departments: Department names (matrix columns)
+            totals: float64 array of shape (len(years), len(departments)), NaN where missing
+        """
+        self.years = list(years)
+        self.departments = list(departments)
+        self.totals = totals
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[int, str, Any]]) -> "TrendMatrix":
+        """
+        Pivot (fiscal_year, department, total) rows into a matrix.
+
+        Repeated (year, department) pairs are summed; None departments are
+        grouped into one trailing None column.
+        """
+        rows = list(rows)
+        if not rows:
+            return cls([], [], np.empty((0, 0)))
+        year_col, dept_col, total_col = zip(*rows)
+        years, year_idx = np.unique(np.asarray(year_col, dtype=np.int64), return_inverse=True)
+        # factorize, not np.unique: sorting None against str raises TypeError
+        dept_idx, labels = pd.factorize(np.asarray(dept_col, dtype=object), sort=True)
+        departments = list(labels)
+        if (dept_idx < 0).any():
+            dept_idx = np.where(dept_idx < 0, len(departments), dept_idx)
+            departments.append(None)
+        amounts = np.asarray([float(t) if t is not None else 0.0 for t in total_col], dtype=np.float64)
+
+        flat = year_idx * len(departments) + dept_idx
+        size = len(years) * len(departments)
+        sums = np.bincount(flat, weights=amounts, minlength=size)
+        present = np.bincount(flat, minlength=size) > 0
+        totals = np.where(present, sums, np.nan).reshape(len(years), len(departments))
+        return cls([int(y) for y in years], departments, totals)
+
+    def _row(self, year: Optional[int], default: int) -> int:
+        return default if year is None else self.years.index(year)
+
+    def yoy_delta(self) -> np.ndarray:
+        """Change between consecutive years, shape (years - 1, departments)."""
+        return np.diff(self.totals, axis=0)
+
+    def yoy_percent(self) -> np.ndarray:
+        """Percent change between consecutive years; 0 where the earlier total isn't positive."""
+        previous, delta = self.totals[:-1], self.yoy_delta()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = np.where(previous > 0, delta / previous * 100, 0.0)
+        return np.where(np.isnan(delta), np.nan, pct)
+
+    def cagr(self, start: Optional[int] = None, end: Optional[int] = None) -> np.ndarray:
+        """
+        Compound annual growth rate between two years (fractions, not percent).
+
+        NaN where either total is missing or not positive, or the years are equal.
+        """
+        first, last = self._row(start, 0), self._row(end, len(self.years) - 1)
+        periods = self.years[last] - self.years[first]
+        old, new = self.totals[first], self.totals[last]
+        if periods <= 0:
+            return np.full(len(self.departments), np.nan)
+        valid = (old > 0) & (new > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rate = np.power(new / old, 1.0 / periods) - 1
+        return np.where(valid, rate, np.nan)
+
+    def ranks(self) -> np.ndarray:
+        """Rank of each department within each year (1 = largest total, NaN where missing)."""
+        filled = np.where(np.isnan(self.totals), -np.inf, self.totals)
+        order = np.argsort(-filled, axis=1, kind="stable")
+        ranks = np.argsort(order, axis=1, kind="stable") + 1
+        return np.where(np.isnan(self.totals), np.nan, ranks.astype(np.float64))
+
+    def changes(self, start: Optional[int] = None, end: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Per-department change between two years (default: first and last).
+
+        Only departments with totals in both years are included, sorted by
+        absolute change amount, largest first.
+        """
+        if len(self.years) < 2 or any(y is not None and y not in self.years for y in (start, end)):
+            return []
+        first, last = self._row(start, 0), self._row(end, len(self.years) - 1)
+        old, new = self.totals[first], self.totals[last]
+        both = ~np.isnan(old) & ~np.isnan(new)
+
+        delta = new - old
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = np.where(old > 0, delta / old * 100, 0.0)
+        cagr = self.cagr(self.years[first], self.years[last])
+        ranks = self.ranks()
+        old_rank, new_rank = ranks[first], ranks[last]
+
+        idx = np.flatnonzero(both)
+        idx = idx[np.argsort(-np.abs(delta[idx]), kind="stable")]
+        return [
+            {
+                "department": self.departments[i],
+                "old_amount": float(old[i]),
+                "new_amount": float(new[i]),
+                "change_amount": float(delta[i]),
+                "change_percentage": float(pct[i]),
+                "cagr": None if np.isnan(cagr[i]) else float(cagr[i]),
+                "old_rank": int(old_rank[i]),
+                "new_rank": int(new_rank[i]),
+                "rank_change": int(old_rank[i] - new_rank[i]),
+            }
+            for i in idx
+        ]
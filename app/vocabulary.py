@@ -0,0 +1,116 @@
+"""
+Budget Vocabulary Index
+
+Builds the department and line-item vocabulary for the question parser
+from the data itself (SELECT DISTINCT department, line_item FROM
+budget_facts) instead of relying only on the hardcoded lists, so questions
+about any category in the budget resolve on the deterministic fast path.
+
+Each name is registered under a few normalised forms ("MAYOR & COUNCIL"
+-> "mayor and council", "MISC. REVENUES" -> "misc revenues", "POLICE
+DEPARTMENT" -> "police"). The curated lists in app.question_parser keep
+priority over generated entries, so existing answers don't change.
+
+The vocabulary is rebuilt whenever the data version moves; the new matcher
+is swapped in with question_parser.set_matcher.
+
+Usage:
+    from app.vocabulary import load_vocabulary
+    load_vocabulary()
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from .db import engine, get_data_version, current_data_version
+from .question_parser import (
+    DEPARTMENT_ALIASES, DEPT_PATTERNS, LINE_ITEM_PATTERNS, QuestionMatcher, set_matcher,
+)
+
+# Trailing words people usually leave out when naming a department
+DEPARTMENT_SUFFIXES = ("department", "dept")
+
+# Line items shorter than this are too generic to match on ("Misc", "Other")
+MIN_LINE_ITEM_LENGTH = 5
+
+_version: Optional[str] = None
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase, spell out '&', drop punctuation and collapse whitespace."""
+    name = name.lower().replace("&", " and ")
+    name = re.sub(r"[^\w\s-]", " ", name)
+    return re.sub(r"\s+", " ", name).strip()
+
+
+def name_forms(name: str) -> List[str]:
+    """Distinct lowercase forms a question might use for a department or line item."""
+    forms = [name.strip().lower(), normalize_name(name)]
+    words = forms[-1].split(" ")
+    if len(words) > 1 and words[-1] in DEPARTMENT_SUFFIXES:
+        forms.append(" ".join(words[:-1]))
+    return [form for form in dict.fromkeys(forms) if form]
+
+
+def build_matcher(rows: List[Tuple[Optional[str], Optional[str]]]) -> QuestionMatcher:
+    """
+    Build a QuestionMatcher from (department, line_item) pairs.
+
+    Args:
+        rows: Distinct department / line item pairs from budget_facts
+
+    Returns:
+        Matcher covering the curated vocabulary plus every name in rows
+    """
+    departments = sorted({d.strip() for d, _ in rows if d and d.strip()})
+    line_items = sorted({li.strip() for _, li in rows if li and len(li.strip()) >= MIN_LINE_ITEM_LENGTH})
+
+    # Ranked after DEPARTMENT_ALIASES and DEPT_PATTERNS by the matcher
+    department_aliases: Dict[str, str] = {}
+    for department in departments:
+        for form in name_forms(department):
+            department_aliases.setdefault(form, department)
+
+    line_item_aliases: Dict[str, str] = {}
+    for line_item in line_items:
+        for form in name_forms(line_item):
+            line_item_aliases.setdefault(form, line_item)
+
+    return QuestionMatcher(
+        department_aliases=DEPARTMENT_ALIASES,
+        department_patterns=DEPT_PATTERNS,
+        extra_department_aliases=department_aliases,
+        line_item_patterns=LINE_ITEM_PATTERNS,
+        line_item_aliases=line_item_aliases,
+    )
+
+
+def load_vocabulary() -> QuestionMatcher:
+    """Read the distinct departments and line items and publish a new matcher."""
+    global _version
+    with engine.begin() as conn:
+        version = get_data_version(conn)
+        rows = conn.execute(text("""
+            SELECT DISTINCT department, line_item
+            FROM budget_facts
+        """)).fetchall()
+
+    matcher = build_matcher([tuple(row) for row in rows])
+    set_matcher(matcher)
+    _version = version
+    return matcher
+
+
+def refresh_vocabulary_if_stale() -> bool:
+    """
+    Rebuild the vocabulary if the data version moved since it was loaded.
+
+    Returns:
+        True if a new matcher was published
+    """
+    if _version is not None and _version == current_data_version():
+        return False
+    load_vocabulary()
+    return True
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Planning-time benchmark for the prepared statement registry
+
+For every statement in app.statements (the /api/budget/* view lookups and
+the aggregate helpers behind /ask), with parameters taken from the live
+data, compares:
+  - text():  the statement sent as a plain query, parsed and planned per call
+  - prepared: PREPARE once on the connection, then EXECUTE
+
+Latency is measured client-side over --iterations calls. Planning time is
+read from EXPLAIN (ANALYZE, SUMMARY) after the warm-up, when Postgres has had
+the five executions it needs before it considers a cached generic plan.
+Under the default plan_cache_mode it keeps custom plans (and keeps planning)
+for a statement whose generic plan costs more; --force-generic shows the
+floor with plan_cache_mode = force_generic_plan.
+
+The last line adds up planning time per question for the statements one
+/ask answer runs.
+
+Usage:
+    python -m benchmarks.bench_prepared_statements
+    python -m benchmarks.bench_prepared_statements --iterations 500 --force-generic
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from app import qa  # noqa: F401 (registers its statements)
+from app.aggregates import totals_statement
+from app.db import engine
+from app.statements import statements
+
+# Statements run while answering one amount question: the direct answer,
+# its year-over-year comparison and a department breakdown
+PER_QUESTION = ("totals_with_evidence_department_fiscal_year", "year_pair_totals", "year_total", "department_totals")
+
+
+def sample_params(conn) -> Dict[str, Dict[str, Any]]:
+    """Bind parameters for each registered statement, from rows that exist."""
+    fact = conn.execute(text("""
+        SELECT fiscal_year, department
+        FROM budget_facts
+        WHERE fiscal_year IS NOT NULL AND department IS NOT NULL
+        LIMIT 1
+    """)).mappings().first()
+    view = conn.execute(text("SELECT fiscal_year, category, line_item FROM v_line_items LIMIT 1")).mappings().first()
+    if fact is None or view is None:
+        sys.exit("budget_facts / v_line_items have no rows to build sample parameters from")
+
+    fiscal_year = fact["fiscal_year"]
+    evidence_name, evidence = totals_statement({"fiscal_year": fiscal_year, "department": fact["department"].lower()})
+    evidence["top_n"] = 5
+    return {
+        "year_totals": {},
+        "year_yoy": {},
+        "category_ranking": {"year": view["fiscal_year"], "limit": 10},
+        "category_shares": {"year": view["fiscal_year"]},
+        "line_item_total": {"year": view["fiscal_year"], "category": view["category"], "line_item": view["line_item"]},
+        "category_yoy": {"year2": view["fiscal_year"], "category": view["category"]},
+        evidence_name: evidence,
+        "year_pair_totals": {"department": fact["department"], "fiscal_year": fiscal_year, "previous_year": fiscal_year - 1},
+        "top_departments": {"fiscal_year": fiscal_year},
+        "department_totals_by_year": {"years": [fiscal_year - 1, fiscal_year]},
+        "year_total": {"fiscal_year": fiscal_year},
+        "department_totals": {"fiscal_year": fiscal_year},
+    }
+
+
+def planning_ms(conn, name: str, params: Dict[str, Any], prepared: bool) -> float:
+    statement = statements.get(name)
+    if prepared:
+        result = conn.exec_driver_sql(f"EXPLAIN (ANALYZE, SUMMARY, FORMAT JSON) {statement.execute_sql}", params or None)
+    else:
+        result = conn.execute(text(f"EXPLAIN (ANALYZE, SUMMARY, FORMAT JSON) {statement.sql}"), params)
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Planning Time"]
+
+
+def run(conn, name: str, params: Dict[str, Any], iterations: int, prepared: bool) -> Tuple[List[float], float]:
+    """(per-call latencies in ms, planning time in ms) for one statement."""
+    statement = statements.get(name)
+    latencies: List[float] = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        if prepared:
+            statements.execute(conn, name, params).fetchall()
+        else:
+            conn.execute(statement.text, params).fetchall()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, planning_ms(conn, name, params, prepared)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--force-generic", action="store_true", help="SET plan_cache_mode = force_generic_plan")
+    args = parser.parse_args()
+
+    if not statements.enabled:
+        sys.exit("Prepared statements are disabled (PREPARED_STATEMENTS=0 or DB_PGBOUNCER=1)")
+
+    with engine.connect() as conn:
+        if engine.dialect.name != "postgresql":
+            sys.exit("This benchmark needs PostgreSQL")
+        if args.force_generic:
+            conn.exec_driver_sql("SET plan_cache_mode = force_generic_plan")
+        samples = sample_params(conn)
+
+        planning: Dict[str, Tuple[float, float]] = {}
+        print(f"{'statement':<44} {'text mean':>10} {'p95':>8} {'plan':>7}   {'prep mean':>10} {'p95':>8} {'plan':>7}")
+        for name, params in samples.items():
+            text_lat, text_plan = run(conn, name, params, args.iterations, prepared=False)
+            prep_lat, prep_plan = run(conn, name, params, args.iterations, prepared=True)
+            planning[name] = (text_plan, prep_plan)
+            print(f"{name:<44} {np.mean(text_lat):>10.3f} {np.percentile(text_lat, 95):>8.3f} {text_plan:>7.3f}"
+                  f"   {np.mean(prep_lat):>10.3f} {np.percentile(prep_lat, 95):>8.3f} {prep_plan:>7.3f}")
+        conn.rollback()
+
+    text_total = sum(planning[name][0] for name in PER_QUESTION)
+    prep_total = sum(planning[name][1] for name in PER_QUESTION)
+    print(f"\nPlanning per amount question ({len(PER_QUESTION)} statements): "
+          f"{text_total:.3f} ms with text(), {prep_total:.3f} ms prepared")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for question parsing
+
+Compares the per-call regex loops that parse_filters, is_amount_question
+and classify_question used to run (reproduced below as the baseline) with
+the single-pass compiled matcher in app.question_parser. Both paths are
+first checked for identical results on every benchmark question.
+
+The compiled path is timed without its per-question LRU cache, so the
+numbers show the cost of one scan; in the API repeated parses of the same
+question are free.
+
+Usage:
+    python -m benchmarks.bench_question_parser --repeat 2000
+"""
+
+import argparse
+import re
+import time
+from typing import Dict, Optional
+
+from app.question_parser import (
+    AMOUNT_PATTERNS, DEPARTMENT_ALIASES, DEPT_PATTERNS, LINE_ITEM_PATTERNS,
+    QUESTION_CLASS_KEYWORDS, _default_matcher,
+)
+
+QUESTIONS = [
+    "How much for Public Works in 2024?",
+    "Total road repairs FY25",
+    "Police overtime 2025",
+    "What is the budget for Administration?",
+    "How much was spent on equipment?",
+    "What is the total budget for FY25?",
+    "How much did the budget change from FY24 to FY25?",
+    "Which category got the most funding in FY26?",
+    "What percentage of FY25 came from Taxes?",
+    "Compare police department salaries and benefits between fiscal year 2024 and fiscal year 2025",
+    "If we cut the trash removal budget by 10% in FY26, what would we save?",
+    "Show me all line items for misc revenues in the 2025 budget",
+    "Summarize the biggest drivers of change year-over-year",
+    "What are the main priorities?",
+    "Who approved this budget?",
+    "List categories with more than $50,000 in fiscal 2024 for general office supplies and insurance",
+]
+
+
+# --- Baseline: the previous implementations ---
+
+_LEGACY_YEAR_PATTERNS = [
+    r"fy\s*(\d{2,4})", r"fiscal\s+year\s+(\d{2,4})", r"(\d{4})\s*budget", r"(\d{4})\s*fiscal",
+    r"budget\s+(\d{4})", r"in\s+(\d{4})", r"for\s+(\d{4})", r"fy(\d{2})", r"fiscal\s+year\s+(\d{2})",
+]
+
+
+def legacy_is_amount_question(question: str) -> bool:
+    question_lower = question.lower()
+    for pattern in AMOUNT_PATTERNS:
+        if re.search(pattern, question_lower):
+            return True
+    if re.search(r'\$|dollars?|amount|total|budget', question_lower):
+        return True
+    return False
+
+
+def legacy_parse_filters(question: str) -> Dict[str, Optional[str]]:
+    filters = {"fiscal_year": None, "department": None, "line_item": None}
+    question_lower = question.lower()
+    for pattern in _LEGACY_YEAR_PATTERNS:
+        match = re.search(pattern, question_lower)
+        if match:
+            year = int(match.group(1))
+            if year < 100:
+                year = 2000 + year if year < 50 else 1900 + year
+            filters["fiscal_year"] = year
+            break
+    for key, value in DEPARTMENT_ALIASES.items():
+        if re.search(rf'\b{re.escape(key)}\b', question_lower):
+            filters["department"] = value
+            break
+    if not filters["department"]:
+        for pattern in DEPT_PATTERNS:
+            if re.search(rf'\b{re.escape(pattern.lower())}\b', question_lower):
+                filters["department"] = pattern
+                break
+    for pattern in LINE_ITEM_PATTERNS:
+        if re.search(rf'\b{re.escape(pattern)}\b', question_lower):
+            filters["line_item"] = pattern
+            break
+    return filters
+
+
+def legacy_classify_question(question: str) -> str:
+    question_lower = question.lower()
+    for name, keywords in QUESTION_CLASS_KEYWORDS:
+        if any(keyword in question_lower for keyword in keywords):
+            return name
+    return "general"
+
+
+def legacy(question: str):
+    return legacy_parse_filters(question), legacy_is_amount_question(question), legacy_classify_question(question)
+
+
+def compiled(question: str):
+    parsed = _default_matcher.parse(question)
+    return parsed.filters(), parsed.is_amount, parsed.question_class
+
+
+def bench(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for question in QUESTIONS:
+            fn(question)
+    return (time.perf_counter() - start) / (repeat * len(QUESTIONS)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    for question in QUESTIONS:
+        assert legacy(question) == compiled(question), f"Mismatch for {question!r}: {legacy(question)} != {compiled(question)}"
+    print(f"Results identical on {len(QUESTIONS)} questions")
+
+    baseline = bench(legacy, args.repeat)
+    single_pass = bench(compiled, args.repeat)
+    print(f"{'parser':<28} {'us/question':>12}")
+    print(f"{'per-call regex loops':<28} {baseline:>12.1f}")
+    print(f"{'single-pass matcher':<28} {single_pass:>12.1f}")
+    print(f"speedup: {baseline / single_pass:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
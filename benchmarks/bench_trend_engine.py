@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the trend calculation in get_trend_analysis
+
+Compares the previous per-department loop (reproduced below as the
+baseline), which rescans every row for every department, with the
+vectorized TrendMatrix in app.trends on synthetic (year, department,
+total) rows. Both are first checked for identical changes on a small
+data set that includes a NULL department. The baseline is quadratic in departments, so it is skipped
+above --legacy-max departments.
+
+Usage:
+    python -m benchmarks.bench_trend_engine --departments 1000 5000 10000 50000 --years 2
+"""
+
+import argparse
+import random
+import time
+from typing import Dict, List
+
+from app.trends import TrendMatrix
+
+
+def synthetic_rows(departments: int, years: List[int], seed: int = 7) -> List[Dict]:
+    """(fiscal_year, department, total_amount) rows; ~5% of departments skip a year."""
+    rng = random.Random(seed)
+    rows = []
+    for d in range(departments):
+        for year in years:
+            if rng.random() < 0.05:
+                continue
+            rows.append({"fiscal_year": year, "department": f"DEPT {d:06d}", "total_amount": round(rng.uniform(1e3, 5e6), 2)})
+    return rows
+
+
+# --- Baseline: the previous implementation ---
+
+def legacy_changes(data: List[Dict], years: List[int]) -> List[Dict]:
+    changes = []
+    for dept in set(row["department"] for row in data):
+        dept_data = [row for row in data if row["department"] == dept]
+        if len(dept_data) == 2:
+            old_amount = next(row["total_amount"] for row in dept_data if row["fiscal_year"] == years[0])
+            new_amount = next(row["total_amount"] for row in dept_data if row["fiscal_year"] == years[1])
+            change_pct = ((new_amount - old_amount) / old_amount * 100) if old_amount > 0 else 0
+
+            changes.append({
+                "department": dept,
+                "old_amount": old_amount,
+                "new_amount": new_amount,
+                "change_amount": new_amount - old_amount,
+                "change_percentage": change_pct
+            })
+    changes.sort(key=lambda x: abs(x["change_amount"]), reverse=True)
+    return changes
+
+
+def vectorized_changes(data: List[Dict], years: List[int]) -> List[Dict]:
+    rows = [(row["fiscal_year"], row["department"], row["total_amount"]) for row in data]
+    return TrendMatrix.from_rows(rows).changes(years[0], years[-1])
+
+
+def check_equivalence():
+    years = [2024, 2025]
+    data = synthetic_rows(300, years)
+    # budget_facts.department is nullable; GROUP BY returns a None department
+    data += [{"fiscal_year": year, "department": None, "total_amount": 1234.5 * (i + 1)} for i, year in enumerate(years)]
+    expected = {c["department"]: c for c in legacy_changes(data, years)}
+    actual = {c["department"]: c for c in vectorized_changes(data, years)}
+    assert expected.keys() == actual.keys(), "Different departments"
+    assert None in actual, "NULL department missing"
+    for dept, change in expected.items():
+        for key in ("old_amount", "new_amount", "change_amount", "change_percentage"):
+            assert abs(change[key] - actual[dept][key]) < 1e-6, f"{dept} {key}: {change[key]} != {actual[dept][key]}"
+    print(f"Results identical on {len(expected)} departments")
+
+
+def timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--departments", type=int, nargs="+", default=[1000, 5000, 10000, 50000])
+    parser.add_argument("--years", type=int, default=2, help="Number of fiscal years (the baseline only handles 2)")
+    parser.add_argument("--legacy-max", type=int, default=10000, help="Largest department count to run the baseline at")
+    args = parser.parse_args()
+
+    check_equivalence()
+    years = list(range(2026 - args.years, 2026))
+
+    print(f"{'departments':>12} {'rows':>9} {'loop ms':>10} {'vectorized ms':>14} {'speedup':>8}")
+    for departments in args.departments:
+        data = synthetic_rows(departments, years)
+        vectorized = timed(vectorized_changes, data, years)
+        if args.years == 2 and departments <= args.legacy_max:
+            loop = timed(legacy_changes, data, years)
+            print(f"{departments:>12} {len(data):>9} {loop:>10.1f} {vectorized:>14.1f} {loop / vectorized:>7.1f}x")
+        else:
+            print(f"{departments:>12} {len(data):>9} {'-':>10} {vectorized:>14.1f} {'-':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Recall vs latency benchmark for chunk vector search
+
+Loads a synthetic, clustered corpus into a scratch table, then compares:
+  - the old retrieve() query (L2 <->), which cannot use a cosine index
+  - cosine <=> over an ivfflat index at several ivfflat.probes values
+  - cosine <=> over an HNSW index at several hnsw.ef_search values
+
+Recall@k is measured against exact cosine neighbours computed in NumPy.
+The scratch table is dropped at the end.
+
+Usage:
+    python -m benchmarks.bench_vector_search --rows 20000 --dim 256
+"""
+
+import argparse
+import time
+from typing import List
+
+import numpy as np
+from sqlalchemy import text
+
+from app.db import engine
+
+TABLE = "bench_chunks"
+
+
+def synthetic_corpus(rows: int, dim: int, clusters: int, seed: int = 7) -> np.ndarray:
+    """Unit vectors drawn around random cluster centres, like topical chunks."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assign = rng.integers(0, clusters, size=rows)
+    vectors = centres[assign] + 0.35 * rng.standard_normal((rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def to_literal(vector: np.ndarray) -> str:
+    return "[" + ",".join(f"{x:.6f}" for x in vector) + "]"
+
+
+def load_table(raw, corpus: np.ndarray):
+    import io
+
+    with raw.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        cur.execute(f"CREATE UNLOGGED TABLE {TABLE} (id INT PRIMARY KEY, embedding VECTOR({corpus.shape[1]}))")
+        buf = io.StringIO()
+        for i, vector in enumerate(corpus):
+            buf.write(f"{i}\t{to_literal(vector)}\n")
+        buf.seek(0)
+        cur.copy_expert(f"COPY {TABLE} (id, embedding) FROM STDIN", buf)
+    raw.commit()
+
+
+def run_queries(raw, queries: np.ndarray, k: int, operator: str, setting: str = None, value: int = None):
+    ids: List[List[int]] = []
+    latencies: List[float] = []
+    with raw.cursor() as cur:
+        for q in queries:
+            literal = to_literal(q)
+            start = time.perf_counter()
+            if setting:
+                cur.execute("SELECT set_config(%s, %s, true)", (setting, str(value)))
+            cur.execute(f"SELECT id FROM {TABLE} ORDER BY embedding {operator} %s::vector LIMIT %s", (literal, k))
+            ids.append([row[0] for row in cur.fetchall()])
+            latencies.append((time.perf_counter() - start) * 1000)
+            raw.commit()
+    return ids, latencies
+
+
+def recall(found: List[List[int]], truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t.tolist())) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def report(label: str, found, latencies, truth):
+    print(f"{label:<28} {recall(found, truth):>8.3f} {np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 95):>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    clusters = max(8, args.rows // 500)
+    corpus = synthetic_corpus(args.rows + args.queries, args.dim, clusters)
+    corpus, queries = corpus[:args.rows], corpus[args.rows:]
+    truth = np.argsort(-(queries @ corpus.T), axis=1)[:, :args.k]
+
+    raw = engine.raw_connection()
+    try:
+        # Index builds can outlast the API's DB_STATEMENT_TIMEOUT_MS
+        with raw.cursor() as cur:
+            cur.execute("SET statement_timeout = 0")
+        print(f"Loading {args.rows} x {args.dim} synthetic chunks...")
+        load_table(raw, corpus)
+        lists = max(10, int(np.sqrt(args.rows)))
+
+        with raw.cursor() as cur:
+            cur.execute(f"CREATE INDEX ON {TABLE} USING ivfflat (embedding vector_cosine_ops) WITH (lists = {lists})")
+            cur.execute(f"ANALYZE {TABLE}")
+        raw.commit()
+
+        print(f"{'query':<28} {'recall@' + str(args.k):>8} {'p50 ms':>8} {'p95 ms':>8}")
+        found, lat = run_queries(raw, queries, args.k, "<->")
+        report("L2 <-> (old, seq scan)", found, lat, truth)
+        for probes in (1, 5, 10, 20, 40):
+            found, lat = run_queries(raw, queries, args.k, "<=>", "ivfflat.probes", probes)
+            report(f"ivfflat probes={probes}", found, lat, truth)
+
+        with raw.cursor() as cur:
+            cur.execute(f"DROP INDEX IF EXISTS {TABLE}_embedding_idx")
+            cur.execute(f"CREATE INDEX ON {TABLE} USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64)")
+        raw.commit()
+        for ef_search in (10, 20, 40, 80, 160):
+            found, lat = run_queries(raw, queries, args.k, "<=>", "hnsw.ef_search", ef_search)
+            report(f"hnsw ef_search={ef_search}", found, lat, truth)
+    finally:
+        with raw.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        raw.commit()
+        raw.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+EXPLAIN regression check for the hot budget_facts queries
+
+Runs EXPLAIN (FORMAT JSON) on the hot statements registered by app.aggregates
+and app.qa, with filters taken from the live data, and fails if any of them
+scans budget_facts sequentially instead of using the indexes from
+db/migrations/004_budget_facts_predicate_indexes.sql. Each statement is
+PREPAREd through app.statements and explained as EXECUTE, so a statement
+whose parameter types the server can't resolve fails here too.
+
+On a small table a sequential scan is legitimately the cheapest plan, so
+by default the check runs with enable_seqscan = off. That asks whether an
+index *can* serve each predicate, which is what breaks when a query's
+expression and an index's stop matching. Pass --natural to see the
+planner's unforced choice instead.
+
+Usage:
+    python -m benchmarks.check_query_plans
+    python -m benchmarks.check_query_plans --natural
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import text
+
+from app import qa  # noqa: F401 (registers its statements)
+from app.aggregates import totals_statement
+from app.db import engine
+from app.statements import statements
+
+UPPER_DEPARTMENT_INDEX = "idx_budget_facts_upper_department_year"
+LINE_ITEM_TRGM_INDEX = "idx_budget_facts_lower_line_item_trgm"
+YEAR_DEPARTMENT_INDEX = "idx_budget_facts_year_department"
+
+
+def sample_values(conn) -> Dict[str, Any]:
+    """A fiscal year, department and line-item substring that exist in budget_facts."""
+    row = conn.execute(text("""
+        SELECT fiscal_year, department, line_item
+        FROM budget_facts
+        WHERE fiscal_year IS NOT NULL AND department IS NOT NULL AND length(line_item) >= 3
+        LIMIT 1
+    """)).mappings().first()
+    if row is None:
+        sys.exit("budget_facts has no rows to build sample filters from")
+    word = max(row["line_item"].split(), key=len)
+    return {
+        "fiscal_year": row["fiscal_year"],
+        "department": row["department"],
+        # Trigram indexes need at least 3 characters to search on
+        "line_item": word if len(word) >= 3 else row["line_item"],
+    }
+
+
+def cases(sample: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any], Tuple[str, ...]]]:
+    """(label, statement name, params, acceptable indexes) for each hot query shape."""
+    shapes = [
+        # Lower-cased so the case-insensitive match is what gets exercised
+        ("direct answer: department", {"department": sample["department"].lower()}, (UPPER_DEPARTMENT_INDEX,)),
+        ("direct answer: year + department",
+         {"fiscal_year": sample["fiscal_year"], "department": sample["department"].lower()},
+         (UPPER_DEPARTMENT_INDEX,)),
+        ("direct answer: line item", {"line_item": sample["line_item"]}, (LINE_ITEM_TRGM_INDEX,)),
+    ]
+    result = []
+    for label, filters, indexes in shapes:
+        name, params = totals_statement(filters)
+        params["top_n"] = 5
+        result.append((label, name, params, indexes))
+
+    result.append((
+        "year over year",
+        "year_pair_totals",
+        {"department": sample["department"], "fiscal_year": sample["fiscal_year"],
+         "previous_year": sample["fiscal_year"] - 1},
+        (YEAR_DEPARTMENT_INDEX, "idx_budget_facts_department"),
+    ))
+    result.append((
+        "trend: departments by year",
+        "department_totals_by_year",
+        {"years": [sample["fiscal_year"] - 1, sample["fiscal_year"]]},
+        (YEAR_DEPARTMENT_INDEX, "idx_budget_facts_fiscal_year"),
+    ))
+    return result
+
+
+def plan_nodes(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    nodes = [plan]
+    for child in plan.get("Plans", []):
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+
+def explain(conn, name: str, params: Dict[str, Any]):
+    """EXPLAIN of the registered statement, as EXECUTE of its prepared form when prepared statements are on."""
+    statement = statements.get(name)
+    if not statements.prepare(conn, name):
+        return conn.execute(text(f"EXPLAIN (FORMAT JSON) {statement.sql}"), params).scalar()
+    return conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement.execute_sql}", params or None).scalar()
+
+
+def check(conn, label: str, name: str, params: Dict[str, Any], indexes: Tuple[str, ...]) -> bool:
+    plan = explain(conn, name, params)
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes = plan_nodes(plan[0]["Plan"])
+
+    seq_scans = [n for n in nodes if n["Node Type"] == "Seq Scan" and n.get("Relation Name") == "budget_facts"]
+    used = sorted({n["Index Name"] for n in nodes if "Index Name" in n})
+    ok = not seq_scans and any(ix in used for ix in indexes)
+
+    print(f"{'ok  ' if ok else 'FAIL'} {label}: {', '.join(used) or 'no index'}"
+          f"{' (seq scan on budget_facts)' if seq_scans else ''}")
+    if not ok:
+        print(f"     expected one of: {', '.join(indexes)}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--natural", action="store_true", help="Don't disable sequential scans")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        if not args.natural:
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+        sample = sample_values(conn)
+        results = [check(conn, *case) for case in cases(sample)]
+
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
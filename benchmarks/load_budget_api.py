@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Load test for the /api/budget/* endpoints
+
+Fires the budget view routes at increasing concurrency against a running
+server and reports p50/p95/p99 latency per level. A /health probe runs
+alongside the load: if the event loop is blocked by a slow query, the probe
+latency climbs with concurrency; with the DB work offloaded it stays flat.
+
+Usage:
+    uvicorn app.main:app --port 8000
+    python benchmarks/load_budget_api.py --base-url http://127.0.0.1:8000
+"""
+
+import argparse
+import asyncio
+import time
+from typing import List
+
+import httpx
+
+ROUTES = [
+    "/api/budget/year-totals",
+    "/api/budget/yoy",
+    "/api/budget/category?year=FY25&limit=10",
+    "/api/budget/shares?year=FY25",
+    "/api/budget/line-item?year=FY24&category=ADMINISTRATION&line_item=Payroll%20Taxes",
+    "/api/budget/category-yoy?year1=FY24&year2=FY25&category=TAXES",
+]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def worker(client: httpx.AsyncClient, requests_per_worker: int, latencies: List[float], errors: List[int]):
+    for i in range(requests_per_worker):
+        route = ROUTES[i % len(ROUTES)]
+        start = time.perf_counter()
+        try:
+            response = await client.get(route)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+        except httpx.HTTPError:
+            errors.append(0)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def health_probe(client: httpx.AsyncClient, stop: asyncio.Event, latencies: List[float]):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/health")
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def run_level(base_url: str, concurrency: int, requests_per_worker: int):
+    limits = httpx.Limits(max_connections=concurrency + 1, max_keepalive_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        latencies: List[float] = []
+        probe_latencies: List[float] = []
+        errors: List[int] = []
+        stop = asyncio.Event()
+
+        probe = asyncio.create_task(health_probe(client, stop, probe_latencies))
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client, requests_per_worker, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await probe
+
+    print(
+        f"{concurrency:>5} {len(latencies) / elapsed:>9.1f} "
+        f"{percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f} {percentile(latencies, 99):>8.1f} "
+        f"{percentile(probe_latencies, 99):>10.1f} {len(errors):>6}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--levels", default="1,4,16,32,64", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=30, help="Requests per worker at each level")
+    args = parser.parse_args()
+
+    print(f"Load testing {args.base_url}")
+    print(f"{'conc':>5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'health p99':>10} {'errors':>6}")
+    for level in [int(x) for x in args.levels.split(",")]:
+        await run_level(args.base_url, level, args.requests)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
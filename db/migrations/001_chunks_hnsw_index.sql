@@ -0,0 +1,18 @@
+-- Optional: HNSW index for chunk embeddings (pgvector >= 0.5.0)
+--
+-- retrieve() orders by cosine distance (<=>), which both this index and the
+-- ivfflat idx_chunks_embedding from schema.sql can serve. HNSW gives better
+-- recall at the same latency and needs no training data, at the cost of a
+-- slower build. Tune recall per query with HNSW_EF_SEARCH (hnsw.ef_search).
+--
+-- CONCURRENTLY cannot run inside a transaction block; run this file with
+-- psql directly rather than through a migration tool that wraps it.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_embedding_hnsw
+  ON chunks USING hnsw (embedding vector_cosine_ops)
+  WITH (m = 16, ef_construction = 64);
+
+-- Once the HNSW index is built, the ivfflat index is redundant:
+-- DROP INDEX CONCURRENTLY IF EXISTS idx_chunks_embedding;
+
+ANALYZE chunks;
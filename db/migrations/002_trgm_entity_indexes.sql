@@ -0,0 +1,18 @@
+-- Trigram indexes for fuzzy category / line-item resolution
+--
+-- app/entity_index.py resolves typo'd names in memory. For vocabularies
+-- above ENTITY_INDEX_MEMORY_LIMIT it switches to pg_trgm, whose % and <%
+-- operators can use these GIN indexes instead of scanning budget_facts.
+--
+-- CONCURRENTLY cannot run inside a transaction block; run this file with
+-- psql directly rather than through a migration tool that wraps it.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_budget_facts_department_trgm
+  ON budget_facts USING gin (department gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_budget_facts_line_item_trgm
+  ON budget_facts USING gin (line_item gin_trgm_ops);
+
+ANALYZE budget_facts;
@@ -0,0 +1,212 @@
+-- Materialized budget views
+--
+-- Replaces the plain v_* views, which re-aggregated budget_facts on every
+-- query, with materialized views of the same names and columns. Each one
+-- has a unique covering index, so the /api/budget/* reads and the cube
+-- load are index lookups, and REFRESH ... CONCURRENTLY can update them
+-- without blocking readers.
+--
+-- The views read budget_facts through budget_line_item_totals(). A
+-- function body is resolved by name when it runs, so the views keep
+-- following budget_facts after the loader swaps a new table in by rename.
+-- A direct reference would stay bound to the retired table. The loader
+-- (app/loader.py) calls refresh_budget_views() after the swap, in the
+-- transaction that bumps the data version, so the refreshed views and the
+-- new version commit together.
+--
+-- The definitions below are written from the documented columns
+-- (fiscal_year as 'FY' plus two digits, category = budget_facts.department)
+-- rather than copied from the live views. Before anything is dropped, a
+-- guard checks that they return exactly the rows the existing views
+-- return, and aborts the migration otherwise. The replaced definitions
+-- are kept in replaced_budget_views.
+--
+-- Run with psql. Privileges granted on the old views are not carried
+-- over; re-grant SELECT to the API's role if it is not the owner.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION budget_line_item_totals()
+RETURNS TABLE (fiscal_year TEXT, category TEXT, line_item TEXT, total NUMERIC)
+LANGUAGE sql STABLE AS $$
+  SELECT 'FY' || lpad((bf.fiscal_year % 100)::text, 2, '0'),
+         bf.department,
+         bf.line_item,
+         SUM(bf.amount)
+  FROM budget_facts bf
+  GROUP BY 1, 2, 3
+$$;
+
+-- The replacement definitions as temporary views, for the guard
+CREATE TEMP VIEW new_v_line_items AS
+  SELECT fiscal_year, category, line_item, total FROM budget_line_item_totals();
+CREATE TEMP VIEW new_v_category_totals AS
+  SELECT fiscal_year, category, SUM(total) AS total FROM new_v_line_items GROUP BY fiscal_year, category;
+CREATE TEMP VIEW new_v_year_totals AS
+  SELECT fiscal_year, SUM(total) AS total FROM new_v_category_totals GROUP BY fiscal_year;
+CREATE TEMP VIEW new_v_year_yoy AS
+  SELECT fiscal_year, total, total - LAG(total) OVER (ORDER BY fiscal_year) AS yoy_change
+  FROM new_v_year_totals;
+CREATE TEMP VIEW new_v_category_shares AS
+  SELECT c.fiscal_year, c.category, c.total, ROUND(c.total / NULLIF(y.total, 0) * 100, 2) AS pct_of_year
+  FROM new_v_category_totals c
+  JOIN new_v_year_totals y ON y.fiscal_year = c.fiscal_year;
+CREATE TEMP VIEW new_v_category_yoy AS
+  SELECT fiscal_year, category, total, prev_total,
+         total - prev_total AS change_amount,
+         ROUND((total - prev_total) / NULLIF(prev_total, 0) * 100, 2) AS change_percentage
+  FROM (
+    SELECT fiscal_year, category, total,
+           LAG(total) OVER (PARTITION BY category ORDER BY fiscal_year) AS prev_total
+    FROM new_v_category_totals
+  ) t;
+
+-- Guard: every existing view must match its replacement row for row
+-- (a missing or renamed column fails here too)
+DO $$
+DECLARE
+  spec RECORD;
+  differing BIGINT;
+BEGIN
+  FOR spec IN
+    SELECT * FROM (VALUES
+      ('v_line_items', 'fiscal_year, category, line_item, total'),
+      ('v_category_totals', 'fiscal_year, category, total'),
+      ('v_year_totals', 'fiscal_year, total'),
+      ('v_year_yoy', 'fiscal_year, total, yoy_change'),
+      ('v_category_shares', 'fiscal_year, category, total, pct_of_year'),
+      ('v_category_yoy', 'fiscal_year, category, total, prev_total, change_amount, change_percentage')
+    ) AS v (view_name, columns)
+  LOOP
+    CONTINUE WHEN to_regclass(spec.view_name) IS NULL;
+    EXECUTE format(
+      'SELECT count(*) FROM ((SELECT %2$s FROM %1$I EXCEPT ALL SELECT %2$s FROM %3$I)
+                             UNION ALL
+                             (SELECT %2$s FROM %3$I EXCEPT ALL SELECT %2$s FROM %1$I)) d',
+      spec.view_name, spec.columns, 'new_' || spec.view_name)
+    INTO differing;
+    IF differing > 0 THEN
+      RAISE EXCEPTION '% returns % rows that differ from its replacement definition; nothing was changed',
+        spec.view_name, differing
+        USING HINT = format('Compare pg_get_viewdef(%L) with this migration.', spec.view_name);
+    END IF;
+  END LOOP;
+END;
+$$;
+
+DROP VIEW new_v_category_yoy, new_v_category_shares, new_v_year_yoy,
+          new_v_category_totals, new_v_year_totals, new_v_line_items;
+
+-- Keep the replaced definitions, for rollback
+CREATE TABLE IF NOT EXISTS replaced_budget_views (
+  name TEXT PRIMARY KEY,
+  definition TEXT NOT NULL,
+  replaced_at TIMESTAMP DEFAULT NOW()
+);
+INSERT INTO replaced_budget_views (name, definition)
+  SELECT relname, pg_get_viewdef(oid)
+  FROM pg_class
+  WHERE relkind = 'v'
+    AND oid IN (SELECT to_regclass(name) FROM unnest(ARRAY[
+      'v_line_items', 'v_category_totals', 'v_year_totals',
+      'v_year_yoy', 'v_category_shares', 'v_category_yoy']) AS name)
+ON CONFLICT (name) DO NOTHING;
+
+-- Dependents first
+DROP VIEW IF EXISTS v_category_yoy;
+DROP VIEW IF EXISTS v_category_shares;
+DROP VIEW IF EXISTS v_year_yoy;
+DROP VIEW IF EXISTS v_category_totals;
+DROP VIEW IF EXISTS v_year_totals;
+DROP VIEW IF EXISTS v_line_items;
+
+-- fiscal_year x category x line_item (the cube's source)
+CREATE MATERIALIZED VIEW IF NOT EXISTS v_line_items AS
+  SELECT fiscal_year, category, line_item, total
+  FROM budget_line_item_totals();
+
+CREATE UNIQUE INDEX IF NOT EXISTS v_line_items_key
+  ON v_line_items (fiscal_year, category, line_item) INCLUDE (total);
+
+-- fiscal_year x category
+CREATE MATERIALIZED VIEW IF NOT EXISTS v_category_totals AS
+  SELECT fiscal_year, category, SUM(total) AS total
+  FROM v_line_items
+  GROUP BY fiscal_year, category;
+
+CREATE UNIQUE INDEX IF NOT EXISTS v_category_totals_key
+  ON v_category_totals (fiscal_year, category) INCLUDE (total);
+-- /api/budget/category: WHERE fiscal_year = ? ORDER BY total DESC LIMIT n
+CREATE INDEX IF NOT EXISTS v_category_totals_rank
+  ON v_category_totals (fiscal_year, total DESC) INCLUDE (category);
+
+-- fiscal_year
+CREATE MATERIALIZED VIEW IF NOT EXISTS v_year_totals AS
+  SELECT fiscal_year, SUM(total) AS total
+  FROM v_category_totals
+  GROUP BY fiscal_year;
+
+CREATE UNIQUE INDEX IF NOT EXISTS v_year_totals_key
+  ON v_year_totals (fiscal_year) INCLUDE (total);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS v_year_yoy AS
+  SELECT fiscal_year,
+         total,
+         total - LAG(total) OVER (ORDER BY fiscal_year) AS yoy_change
+  FROM v_year_totals;
+
+CREATE UNIQUE INDEX IF NOT EXISTS v_year_yoy_key
+  ON v_year_yoy (fiscal_year) INCLUDE (total, yoy_change);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS v_category_shares AS
+  SELECT c.fiscal_year,
+         c.category,
+         c.total,
+         ROUND(c.total / NULLIF(y.total, 0) * 100, 2) AS pct_of_year
+  FROM v_category_totals c
+  JOIN v_year_totals y ON y.fiscal_year = c.fiscal_year;
+
+CREATE UNIQUE INDEX IF NOT EXISTS v_category_shares_key
+  ON v_category_shares (fiscal_year, category) INCLUDE (total, pct_of_year);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS v_category_yoy AS
+  SELECT fiscal_year,
+         category,
+         total,
+         prev_total,
+         total - prev_total AS change_amount,
+         ROUND((total - prev_total) / NULLIF(prev_total, 0) * 100, 2) AS change_percentage
+  FROM (
+    SELECT fiscal_year,
+           category,
+           total,
+           LAG(total) OVER (PARTITION BY category ORDER BY fiscal_year) AS prev_total
+    FROM v_category_totals
+  ) t;
+
+CREATE UNIQUE INDEX IF NOT EXISTS v_category_yoy_key
+  ON v_category_yoy (fiscal_year, category) INCLUDE (total, prev_total, change_amount, change_percentage);
+
+-- Refresh in dependency order. CONCURRENTLY keeps the views readable
+-- throughout; it needs the unique indexes above.
+CREATE OR REPLACE FUNCTION refresh_budget_views()
+RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+  REFRESH MATERIALIZED VIEW CONCURRENTLY v_line_items;
+  REFRESH MATERIALIZED VIEW CONCURRENTLY v_category_totals;
+  REFRESH MATERIALIZED VIEW CONCURRENTLY v_year_totals;
+  REFRESH MATERIALIZED VIEW CONCURRENTLY v_year_yoy;
+  REFRESH MATERIALIZED VIEW CONCURRENTLY v_category_shares;
+  REFRESH MATERIALIZED VIEW CONCURRENTLY v_category_yoy;
+END;
+$$;
+
+COMMIT;
+
+ANALYZE v_line_items;
+ANALYZE v_category_totals;
+ANALYZE v_year_totals;
+ANALYZE v_year_yoy;
+ANALYZE v_category_shares;
+ANALYZE v_category_yoy;
@@ -0,0 +1,32 @@
+-- Indexes matching the budget_facts predicates in app/aggregates.py
+--
+-- Amount questions filter on UPPER(department) = UPPER(:department) and
+-- LOWER(line_item) LIKE '%...%'. The plain btree indexes on department
+-- and line_item can serve neither, and the trigram index from
+-- 002_trgm_entity_indexes.sql is on line_item, not lower(line_item), so
+-- each of these questions scanned the whole table. Expression indexes on
+-- the same expressions fix that.
+--
+-- The loader builds its shadow table with LIKE ... INCLUDING ALL, so these
+-- indexes carry over to every newly loaded budget_facts.
+--
+-- Check the plans with: python -m benchmarks.check_query_plans
+--
+-- CONCURRENTLY cannot run inside a transaction block; run this file with
+-- psql directly rather than through a migration tool that wraps it.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- UPPER(department) = ..., optionally with fiscal_year = ...
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_budget_facts_upper_department_year
+  ON budget_facts (upper(department), fiscal_year);
+
+-- LOWER(line_item) LIKE '%...%'
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_budget_facts_lower_line_item_trgm
+  ON budget_facts USING gin (lower(line_item) gin_trgm_ops);
+
+-- fiscal_year IN (...) AND department = ... (year_pair_totals)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_budget_facts_year_department
+  ON budget_facts (fiscal_year, department);
+
+ANALYZE budget_facts;
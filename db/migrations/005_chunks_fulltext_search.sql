@@ -0,0 +1,22 @@
+-- Full-text search over chunk text
+--
+-- retrieve() in app/rag.py falls back to lexical search when vector search
+-- fails, and fuses both rankings when RETRIEVAL_MODE=hybrid. It matches
+-- and ranks on this generated tsvector column (@@ and ts_rank_cd), which
+-- the GIN index below serves. Without the column it falls back to the
+-- old ILIKE scans.
+--
+-- Adding a STORED generated column rewrites chunks and holds an exclusive
+-- lock for the duration; run it off-peak. The index is then built
+-- CONCURRENTLY, which cannot run inside a transaction block, so run this
+-- file with psql directly rather than through a migration tool that
+-- wraps it.
+
+ALTER TABLE chunks
+  ADD COLUMN IF NOT EXISTS chunk_tsv tsvector
+  GENERATED ALWAYS AS (to_tsvector('english', coalesce(chunk_text, ''))) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_tsv
+  ON chunks USING gin (chunk_tsv);
+
+ANALYZE chunks;
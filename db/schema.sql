@@ -50,6 +50,15 @@ CREATE TABLE IF NOT EXISTS summaries (
   UNIQUE(department, fiscal_year)
 );
 
+-- Data version counter, bumped by the upload scripts after every load.
+-- The API keys its response cache and in-memory budget cube on it.
+CREATE TABLE IF NOT EXISTS data_version (
+  id INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  version BIGINT NOT NULL DEFAULT 1,
+  updated_at TIMESTAMP DEFAULT NOW()
+);
+INSERT INTO data_version (id, version) VALUES (1, 1) ON CONFLICT DO NOTHING;
+
 -- Indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_documents_fiscal_year ON documents(fiscal_year);
 CREATE INDEX IF NOT EXISTS idx_documents_department ON documents(department);
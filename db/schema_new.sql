@@ -54,6 +54,15 @@ CREATE TABLE IF NOT EXISTS summaries (
   UNIQUE(department, fiscal_year)
 );
 
+-- Data version counter, bumped by the upload scripts after every load.
+-- The API keys its response cache and in-memory budget cube on it.
+CREATE TABLE IF NOT EXISTS data_version (
+  id INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  version BIGINT NOT NULL DEFAULT 1,
+  updated_at TIMESTAMP DEFAULT NOW()
+);
+INSERT INTO data_version (id, version) VALUES (1, 1) ON CONFLICT DO NOTHING;
+
 -- Create indexes for performance
 CREATE INDEX IF NOT EXISTS idx_documents_fiscal_year ON documents(fiscal_year);
 CREATE INDEX IF NOT EXISTS idx_documents_department ON documents(department);
@@ -679,6 +679,7 @@ class BudgetAssistant {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
+                    'Accept': 'application/x-ndjson',
                 },
                 body: JSON.stringify({ question: message })
             });
@@ -687,14 +688,34 @@ class BudgetAssistant {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             
-            const data = await response.json();
-            this.hideLoading();
-            
-            // Debug logging for API responses
-            console.log('DEBUG API Response:', data);
-            
-            // Add assistant response
-            this.addMessage('assistant', data.answer, data);
+            // Numbers and sources arrive first (meta), then the answer text
+            // token by token; servers that don't stream send plain JSON
+            let messageDiv = null;
+            let bubble = null;
+            let answer = '';
+            await this.readEvents(response, (event, data) => {
+                if (event === 'meta') {
+                    this.hideLoading();
+                    answer = data.answer || '';
+                    messageDiv = this.addMessage('assistant', answer, data);
+                    bubble = messageDiv.querySelector('.budget-assistant-message-bubble');
+                } else if (event === 'token') {
+                    answer += data;
+                    bubble.textContent = answer;
+                    const messagesContainer = document.getElementById('budget-assistant-messages');
+                    messagesContainer.scrollTop = messagesContainer.scrollHeight;
+                } else if (event === 'done') {
+                    // Debug logging for API responses
+                    console.log('DEBUG API Response:', data);
+                    if (!messageDiv) {
+                        this.hideLoading();
+                        this.addMessage('assistant', data.answer, data);
+                    } else {
+                        bubble.textContent = data.answer;
+                        this.updateLastMessage(data.answer, data);
+                    }
+                }
+            });
             
         } catch (error) {
             this.hideLoading();
@@ -702,6 +723,44 @@ class BudgetAssistant {
         }
     }
     
+    async readEvents(response, onEvent) {
+        // Dispatch NDJSON events ({event, data} per line) from a streamed
+        // response; a plain JSON response is delivered as a single 'done'
+        const contentType = response.headers.get('Content-Type') || '';
+        if (!contentType.includes('application/x-ndjson') || !response.body) {
+            onEvent('done', await response.json());
+            return;
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            buffered += decoder.decode(value || new Uint8Array(), { stream: !done });
+            let newline;
+            while ((newline = buffered.indexOf('\n')) >= 0) {
+                const line = buffered.slice(0, newline).trim();
+                buffered = buffered.slice(newline + 1);
+                if (line) {
+                    const message = JSON.parse(line);
+                    onEvent(message.event, message.data);
+                }
+            }
+            if (done) break;
+        }
+    }
+    
+    updateLastMessage(content, data) {
+        // Replace the content of the last (streamed) message once it is complete
+        const last = this.conversation[this.conversation.length - 1];
+        if (last) {
+            last.content = content;
+            last.data = data;
+            this.saveConversationToStorage();
+        }
+    }
+    
     addMessage(sender, content, data = null) {
         // Add to conversation array
         this.conversation.push({
@@ -715,12 +774,14 @@ class BudgetAssistant {
         this.saveConversationToStorage();
         
         // Add to DOM
-        this.addMessageToDOM(sender, content, data);
+        const messageDiv = this.addMessageToDOM(sender, content, data);
         
         // Show notification if minimized
         if (this.isMinimized) {
             this.showNotification();
         }
+        
+        return messageDiv;
     }
     
     addMessageToDOM(sender, content, data = null) {
@@ -824,6 +885,7 @@ class BudgetAssistant {
         
         messagesContainer.appendChild(messageDiv);
         messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        return messageDiv;
         
         } catch (error) {
             console.error('Error adding message to DOM:', error);
@@ -833,6 +895,7 @@ class BudgetAssistant {
             fallbackDiv.className = `budget-assistant-message ${sender}`;
             fallbackDiv.innerHTML = `<div class="budget-assistant-message-bubble">${content}</div>`;
             messagesContainer.appendChild(fallbackDiv);
+            return fallbackDiv;
         }
     }
     
@@ -854,30 +917,47 @@ class BudgetAssistant {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json',
+                        'Accept': 'application/x-ndjson',
                     },
-                    body: JSON.stringify({ question: this.getQuestionFromMessage(messageDiv) })
+                    // The handle lets the server reuse the evidence /ask already computed
+                    body: JSON.stringify({
+                        question: this.getQuestionFromMessage(messageDiv),
+                        insights_handle: data ? data.insights_handle : undefined
+                    })
                 });
                 
                 if (!response.ok) {
                     throw new Error(`HTTP error! status: ${response.status}`);
                 }
                 
-                const insightsData = await response.json();
-                
                 // Create insights div
                 const insightsDiv = document.createElement('div');
                 insightsDiv.className = 'budget-assistant-insights';
                 insightsDiv.innerHTML = `
                     <div class="budget-assistant-insights-content">
                         <h4>Detailed Insights</h4>
-                        <div class="budget-assistant-insights-text">${this.formatInsights(insightsData.insights)}</div>
+                        <div class="budget-assistant-insights-text"></div>
                     </div>
                 `;
+                const insightsText = insightsDiv.querySelector('.budget-assistant-insights-text');
                 
                 // Insert after the message bubble
                 const bubble = messageDiv.querySelector('.budget-assistant-message-bubble');
                 bubble.parentNode.insertBefore(insightsDiv, bubble.nextSibling);
                 
+                // Render insights as they stream in
+                let insights = '';
+                await this.readEvents(response, (event, data) => {
+                    if (event === 'token') {
+                        insights += data;
+                    } else if (event === 'done') {
+                        insights = data.insights || '';
+                    } else {
+                        return;
+                    }
+                    insightsText.innerHTML = this.formatInsights(insights);
+                });
+                
                 button.textContent = 'Hide Insights';
                 button.disabled = false;
                 
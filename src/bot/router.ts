@@ -5,19 +5,30 @@ const USD = (n: number | null | undefined) =>
 
 const PARTIAL_NOTE = 'Note: FY26 data is partial.';
 
+// Budget view responses carry strong ETags; revalidate instead of re-downloading.
+const etagCache = new Map<string, { etag: string; body: any }>();
+
+async function fetchJson(url: string): Promise<any> {
+  const cached = etagCache.get(url);
+  const res = await fetch(url, cached ? { headers: { 'If-None-Match': cached.etag } } : undefined);
+  if (res.status === 304 && cached) return cached.body;
+  const body = await res.json();
+  const etag = res.headers.get('ETag');
+  if (etag) etagCache.set(url, { etag, body });
+  return body;
+}
+
 export async function handleIntent(intent: Intent): Promise<string> {
   switch (intent.action) {
     case 'year_total': {
-      const res = await fetch('http://127.0.0.1:8000/api/budget/year-totals');
-      const rows: { fiscal_year: Year; total: number }[] = await res.json();
+      const rows: { fiscal_year: Year; total: number }[] = await fetchJson('http://127.0.0.1:8000/api/budget/year-totals');
       const row = rows.find(r => r.fiscal_year === intent.year);
       const msg = `Total ${intent.year} budget: ${USD(row?.total)}. Source: v_year_totals(${intent.year}).`;
       return intent.year === 'FY26' ? `${msg} ${PARTIAL_NOTE}` : msg;
     }
 
     case 'yoy_difference': {
-      const res = await fetch('http://127.0.0.1:8000/api/budget/yoy');
-      const rows: { fiscal_year: Year; total: number; yoy_change: number|null }[] = await res.json();
+      const rows: { fiscal_year: Year; total: number; yoy_change: number|null }[] = await fetchJson('http://127.0.0.1:8000/api/budget/yoy');
       const toRow = rows.find(r => r.fiscal_year === intent.year_to);
       const fromRow = rows.find(r => r.fiscal_year === intent.year_from);
       if (!toRow || !fromRow) return 'I could not find the requested years.';
@@ -27,8 +38,7 @@ export async function handleIntent(intent: Intent): Promise<string> {
     }
 
     case 'yoy_all': {
-      const res = await fetch('http://127.0.0.1:8000/api/budget/yoy');
-      const rows: { fiscal_year: Year; total: number; yoy_change: number|null }[] = await res.json();
+      const rows: { fiscal_year: Year; total: number; yoy_change: number|null }[] = await fetchJson('http://127.0.0.1:8000/api/budget/yoy');
       const lines = rows.map(r => {
         if (r.yoy_change == null) return `${r.fiscal_year}: base ${USD(r.total)}`;
         const sign = r.yoy_change >= 0 ? '+' : '−';
@@ -40,8 +50,7 @@ export async function handleIntent(intent: Intent): Promise<string> {
 
     case 'category_rank': {
       const limit = intent.top_n ?? 10;
-      const res = await fetch(`http://127.0.0.1:8000/api/budget/category?year=${encodeURIComponent(intent.year)}&limit=${limit}`);
-      const json = await res.json();
+      const json = await fetchJson(`http://127.0.0.1:8000/api/budget/category?year=${encodeURIComponent(intent.year)}&limit=${limit}`);
       const rows: { category: string; total: number }[] = json.data;
       if (!rows?.length) return `No categories found for ${intent.year}.`;
       const list = rows.map((r, i) => `${i+1}. ${r.category}: ${USD(r.total)}`).join('\n');
@@ -50,8 +59,7 @@ export async function handleIntent(intent: Intent): Promise<string> {
     }
 
     case 'category_share': {
-      const res = await fetch(`http://127.0.0.1:8000/api/budget/shares?year=${encodeURIComponent(intent.year)}`);
-      const json = await res.json();
+      const json = await fetchJson(`http://127.0.0.1:8000/api/budget/shares?year=${encodeURIComponent(intent.year)}`);
       const rows: { category: string; total: number; pct_of_year: number }[] = json.data;
       const row = rows.find(r => r.category.toUpperCase() === intent.category.toUpperCase());
       if (!row) return `No data for ${intent.category} in ${intent.year}.`;
@@ -61,8 +69,7 @@ export async function handleIntent(intent: Intent): Promise<string> {
 
     case 'line_item_total': {
       const url = `http://127.0.0.1:8000/api/budget/line-item?year=${encodeURIComponent(intent.year)}&category=${encodeURIComponent(intent.category)}&lineItem=${encodeURIComponent(intent.line_item)}`;
-      const res = await fetch(url);
-      const json = await res.json();
+      const json = await fetchJson(url);
       const msg = `${intent.year} ${intent.category} → ${intent.line_item}: ${USD(json.total)}. Source: v_line_items.`;
       return json.partial ? `${msg} ${PARTIAL_NOTE}` : msg;
     }
@@ -7,6 +7,7 @@ import os
 import pandas as pd
 from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
+from app.loader import normalize_frame, load_budget_frame
 
 # Load environment variables
 load_dotenv()
@@ -25,72 +26,42 @@ def upload_all_budget_data():
         print("Connecting to Supabase...")
         engine = create_engine(database_url)
         
-        # Clear existing data
-        with engine.connect() as conn:
-            print("Clearing existing budget data...")
-            conn.execute(text("DELETE FROM budget_facts"))
-            conn.commit()
-        
-        all_data = []
+        frames = []
         
         # Load FY24 data
         fy24_path = "/Users/shishirporeddy/ECON432/Resume/FY24_Cleaned_CSV - FY24 Amended Budget Ordinance.csv"
         if os.path.exists(fy24_path):
             print("Loading FY24 data...")
-            df24 = pd.read_csv(fy24_path)
-            for _, row in df24.iterrows():
-                if pd.notna(row.get('Amount')) and row.get('Amount', 0) > 0:
-                    all_data.append({
-                        'fiscal_year': 2024,
-                        'department': row.get('Category', 'Unknown'),
-                        'line_item': row.get('Line_Item', 'Unknown'),
-                        'amount': float(row.get('Amount', 0))
-                    })
-            print(f"Loaded {len([d for d in all_data if d['fiscal_year'] == 2024])} FY24 records")
+            frames.append(normalize_frame(pd.read_csv(fy24_path), 2024, 'Category', 'Line_Item', 'Amount'))
+            print(f"Loaded {len(frames[-1])} FY24 records")
         
         # Load FY25 data
         fy25_path = "/Users/shishirporeddy/ECON432/Resume/FY25_Cleaned_CSV - Sheet1.csv"
         if os.path.exists(fy25_path):
             print("Loading FY25 data...")
-            df25 = pd.read_csv(fy25_path)
-            for _, row in df25.iterrows():
-                if pd.notna(row.get('Amount')) and row.get('Amount', 0) > 0:
-                    all_data.append({
-                        'fiscal_year': 2025,
-                        'department': row.get('Category', 'Unknown'),
-                        'line_item': row.get('Line_Item', 'Unknown'),
-                        'amount': float(row.get('Amount', 0))
-                    })
-            print(f"Loaded {len([d for d in all_data if d['fiscal_year'] == 2025])} FY25 records")
+            frames.append(normalize_frame(pd.read_csv(fy25_path), 2025, 'Category', 'Line_Item', 'Amount'))
+            print(f"Loaded {len(frames[-1])} FY25 records")
         
         # Load FY26 data
         fy26_path = "/Users/shishirporeddy/ECON432/Resume/FY26_Budget.csv"
         if os.path.exists(fy26_path):
             print("Loading FY26 data...")
-            df26 = pd.read_csv(fy26_path)
-            for _, row in df26.iterrows():
-                if pd.notna(row.get('FY26 Amount')) and row.get('FY26 Amount', 0) > 0:
-                    all_data.append({
-                        'fiscal_year': 2026,
-                        'department': row.get('Category', 'Unknown'),
-                        'line_item': row.get('Line Item', 'Unknown'),
-                        'amount': float(row.get('FY26 Amount', 0))
-                    })
-            print(f"Loaded {len([d for d in all_data if d['fiscal_year'] == 2026])} FY26 records")
+            frames.append(normalize_frame(pd.read_csv(fy26_path), 2026, 'Category', 'Line Item', 'FY26 Amount'))
+            print(f"Loaded {len(frames[-1])} FY26 records")
         
+        if not frames:
+            print("No budget CSVs found, nothing to upload")
+            return
+        
+        all_data = pd.concat(frames, ignore_index=True)
         print(f"Total records to upload: {len(all_data)}")
         
-        # Upload all data
-        with engine.connect() as conn:
-            print("Uploading all budget data...")
-            for record in all_data:
-                conn.execute(text("""
-                    INSERT INTO budget_facts (fiscal_year, department, line_item, amount)
-                    VALUES (:fiscal_year, :department, :line_item, :amount)
-                """), record)
-            conn.commit()
+        # Replace all budget data in one COPY-based load
+        print("Uploading all budget data...")
+        stats = load_budget_frame(engine, all_data, replace_all=True)
         
-        print(f"Successfully uploaded {len(all_data)} records to Supabase!")
+        print(f"Successfully uploaded {stats['rows']} records to Supabase "
+              f"in {stats['seconds']:.2f}s ({stats['rows_per_sec']:,.0f} rows/sec)!")
         
         # Verify upload
         with engine.connect() as conn:
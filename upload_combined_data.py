@@ -6,6 +6,7 @@ import os
 import pandas as pd
 from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
+from app.loader import normalize_frame, load_budget_frame
 import re
 
 load_dotenv()
@@ -50,21 +51,13 @@ def upload_combined_data():
         # Extract fiscal year as integer
         df['fiscal_year'] = df['Fiscal Year'].apply(extract_fiscal_year)
         
-        # Rename columns to match database schema
-        df = df.rename(columns={
-            'Category': 'department',
-            'Line Item': 'line_item',
-            'Amount': 'amount'
-        })
-        
-        # Ensure amount is numeric
-        df['amount'] = pd.to_numeric(df['amount'], errors='coerce').fillna(0)
-        
-        # Select and reorder columns
-        df = df[['fiscal_year', 'department', 'line_item', 'amount']]
+        # Map columns onto the budget_facts schema (zero amounts are kept)
+        df = normalize_frame(df, None, 'Category', 'Line Item', 'Amount', positive_only=False)
+        df['amount'] = df['amount'].fillna(0)
         
         # Remove any rows with missing fiscal year
         df = df.dropna(subset=['fiscal_year'])
+        df['fiscal_year'] = df['fiscal_year'].astype(int)
         
         print(f"📈 Data summary:")
         print(f"   Total records: {len(df)}")
@@ -72,20 +65,12 @@ def upload_combined_data():
         print(f"   Departments: {len(df['department'].unique())}")
         print(f"   Total budget: ${df['amount'].sum():,.2f}")
         
-        # Connect to database and upload
+        # Replace budget_facts in one COPY-based load
+        print("📤 Uploading data to budget_facts table...")
+        stats = load_budget_frame(engine, df, replace_all=True)
+        print(f"   Loaded {stats['rows']} rows in {stats['seconds']:.2f}s ({stats['rows_per_sec']:,.0f} rows/sec)")
+        
         with engine.connect() as connection:
-            print("🗄️  Connecting to Supabase database...")
-            
-            # Clear existing data
-            print("🧹 Clearing existing budget data...")
-            connection.execute(text("DELETE FROM budget_facts"))
-            connection.commit()
-            
-            # Insert new data
-            print("📤 Uploading data to budget_facts table...")
-            df.to_sql('budget_facts', con=connection, if_exists='append', index=False)
-            connection.commit()
-            
             # Verify upload
             result = connection.execute(text("SELECT COUNT(*) as count FROM budget_facts"))
             count = result.fetchone()[0]
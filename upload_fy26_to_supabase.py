@@ -7,6 +7,7 @@ import os
 import pandas as pd
 from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
+from app.loader import normalize_frame, load_budget_frame
 
 # Load environment variables
 load_dotenv()
@@ -35,35 +36,16 @@ def upload_fy26_data():
         df = pd.read_csv(fy26_path)
         
         # Clean and prepare data
-        data_to_insert = []
-        for _, row in df.iterrows():
-            if pd.notna(row.get('FY26 Amount')) and row.get('FY26 Amount', 0) > 0:
-                data_to_insert.append({
-                    'fiscal_year': 2026,
-                    'department': row.get('Category', 'Unknown'),
-                    'line_item': row.get('Line Item', 'Unknown'),
-                    'amount': float(row.get('FY26 Amount', 0))
-                })
+        data_to_insert = normalize_frame(df, 2026, 'Category', 'Line Item', 'FY26 Amount')
         
         print(f"Prepared {len(data_to_insert)} records for upload")
         
-        # Clear existing FY26 data (optional)
-        with engine.connect() as conn:
-            print("Clearing existing FY26 data...")
-            conn.execute(text("DELETE FROM budget_facts WHERE fiscal_year = 2026"))
-            conn.commit()
-        
-        # Insert new data
-        with engine.connect() as conn:
-            print("Uploading FY26 data...")
-            for record in data_to_insert:
-                conn.execute(text("""
-                    INSERT INTO budget_facts (fiscal_year, department, line_item, amount)
-                    VALUES (:fiscal_year, :department, :line_item, :amount)
-                """), record)
-            conn.commit()
+        # Replace existing FY26 data in one COPY-based load
+        print("Uploading FY26 data...")
+        stats = load_budget_frame(engine, data_to_insert, replace_all=False)
         
-        print(f"Successfully uploaded {len(data_to_insert)} FY26 records to Supabase!")
+        print(f"Successfully uploaded {stats['rows']} FY26 records to Supabase "
+              f"in {stats['seconds']:.2f}s ({stats['rows_per_sec']:,.0f} rows/sec)!")
         
         # Verify upload
         with engine.connect() as conn: